@@ -0,0 +1,168 @@
+"""
+Minute-resolution history of what Stay Awake did each day.
+
+For every day the worker keeps three bitmaps of 1,440 bits, one bit per minute
+of local time: the machine was kept awake, the schedule said to stay off, or a
+running excluded app suppressed Stay Awake. A bit is set when any tick during
+that minute was in the state. Minutes the machine was asleep or Stay Awake was
+not running stay clear.
+
+The bitmaps are Python ints, so rollups are whole-day bit operations: the
+minutes in a state are a popcount, the minutes of an hour a mask and a popcount,
+minutes in two states at once an AND. A year of history is about 200 KB and
+loads and sums in milliseconds.
+
+The file is a small header with the first recorded day, followed by one record
+per day from then on (three little-endian 180 byte bitmaps), so any day is at a
+fixed offset and only the current day's record is ever rewritten.
+"""
+import os
+import struct
+import threading
+from datetime import date, datetime, timedelta
+
+HISTORY_FILE = os.path.join(os.path.expanduser("~"), ".stay_awake_history")
+
+# Bitmaps per day, in record order
+KEPT_AWAKE = 0
+SCHEDULE_OFF = 1
+APP_SUPPRESSED = 2
+STATE_NAMES = ("Kept awake", "Schedule off", "App suppressed")
+
+MINUTES_PER_DAY = 24 * 60
+BITMAP_SIZE = MINUTES_PER_DAY // 8
+RECORD_SIZE = BITMAP_SIZE * len(STATE_NAMES)
+MAGIC = b"SAH1"
+HEADER = struct.Struct("<4sI")  # Magic, ordinal of the first recorded day
+FLUSH_INTERVAL = 300  # Seconds between writes of the current day
+HOUR_MASK = (1 << 60) - 1
+EMPTY_DAY = (0, 0, 0)
+
+
+def minutes(bitmap):
+    """Return the number of minutes set in a day bitmap"""
+    return bitmap.bit_count()
+
+
+def hourly_minutes(bitmap):
+    """Return the minutes set in each of the 24 hours of a day bitmap"""
+    return [((bitmap >> (hour * 60)) & HOUR_MASK).bit_count() for hour in range(24)]
+
+
+class ActivityHistory:
+    """Per-day state bitmaps, recorded by the worker thread and read by the GUI"""
+
+    def __init__(self, path=HISTORY_FILE, clock=datetime.now):
+        self.path = path
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._day = None     # Date of the bitmaps being recorded
+        self._bits = None    # [kept awake, schedule off, app suppressed] of that day
+        self._dirty = False
+        self._flushed_at = None
+
+    def record(self, kept_awake, schedule_off, app_suppressed):
+        """Mark the current minute with the states seen by a worker tick"""
+        moment = self.clock()
+        with self._lock:
+            if moment.date() != self._day:
+                self._flush()
+                self._day = moment.date()
+                # Continue a day that was partly recorded before a restart
+                self._bits = list(self._read_days(self._day, self._day).get(self._day, EMPTY_DAY))
+                self._flushed_at = moment
+            bit = 1 << (moment.hour * 60 + moment.minute)
+            for state, present in ((KEPT_AWAKE, kept_awake), (SCHEDULE_OFF, schedule_off),
+                                   (APP_SUPPRESSED, app_suppressed)):
+                if present and not self._bits[state] & bit:
+                    self._bits[state] |= bit
+                    self._dirty = True
+            if self._dirty and (moment - self._flushed_at).total_seconds() >= FLUSH_INTERVAL:
+                self._flush()
+                self._flushed_at = moment
+
+    def flush(self):
+        """Write the current day to disk"""
+        with self._lock:
+            self._flush()
+
+    def days(self, first, last):
+        """Return {date: (kept awake, schedule off, app suppressed)} for the recorded days in a range"""
+        with self._lock:
+            days = self._read_days(first, last)
+            if self._day is not None and first <= self._day <= last:
+                days[self._day] = tuple(self._bits)
+        return days
+
+    def _read_days(self, first, last):
+        try:
+            with open(self.path, "rb") as f:
+                header = f.read(HEADER.size)
+                if len(header) < HEADER.size:
+                    return {}
+                magic, first_recorded = HEADER.unpack(header)
+                if magic != MAGIC:
+                    print(f"Ignoring unknown history file {self.path}")
+                    return {}
+                start = max(first.toordinal(), first_recorded)
+                count = last.toordinal() - start + 1
+                if count <= 0:
+                    return {}
+                f.seek(HEADER.size + (start - first_recorded) * RECORD_SIZE)
+                data = f.read(count * RECORD_SIZE)
+        except FileNotFoundError:
+            return {}
+        except OSError as e:
+            print(f"Error reading history {self.path}: {str(e)}")
+            return {}
+        days = {}
+        for index in range(len(data) // RECORD_SIZE):
+            record = data[index * RECORD_SIZE:(index + 1) * RECORD_SIZE]
+            bitmaps = tuple(int.from_bytes(record[offset:offset + BITMAP_SIZE], "little")
+                            for offset in range(0, RECORD_SIZE, BITMAP_SIZE))
+            if any(bitmaps):
+                days[date.fromordinal(start + index)] = bitmaps
+        return days
+
+    def _flush(self):
+        if not self._dirty:
+            return
+        record = b"".join(bitmap.to_bytes(BITMAP_SIZE, "little") for bitmap in self._bits)
+        try:
+            try:
+                f = open(self.path, "r+b")
+            except FileNotFoundError:
+                f = open(self.path, "w+b")
+            with f:
+                header = f.read(HEADER.size)
+                if len(header) == HEADER.size and HEADER.unpack(header)[0] == MAGIC:
+                    first_recorded = HEADER.unpack(header)[1]
+                else:
+                    first_recorded = self._day.toordinal()
+                    f.seek(0)
+                    f.truncate()
+                    f.write(HEADER.pack(MAGIC, first_recorded))
+                if self._day.toordinal() < first_recorded:
+                    # The clock went back before the first recorded day: prepend empty days
+                    f.seek(HEADER.size)
+                    rest = f.read()
+                    padding = bytes((first_recorded - self._day.toordinal()) * RECORD_SIZE)
+                    first_recorded = self._day.toordinal()
+                    f.seek(0)
+                    f.write(HEADER.pack(MAGIC, first_recorded) + padding + rest)
+                # Days without records in between read back as empty
+                f.seek(HEADER.size + (self._day.toordinal() - first_recorded) * RECORD_SIZE)
+                f.write(record)
+            self._dirty = False
+        except OSError as e:
+            print(f"Error writing history {self.path}: {str(e)}")
+
+
+def week_start(day):
+    """Return the Monday of the week containing a date"""
+    return day - timedelta(days=day.weekday())
+
+
+def totals(days):
+    """Return the minutes in each state summed over {date: bitmaps}"""
+    return [sum(minutes(bitmaps[state]) for bitmaps in days.values()) for state in range(len(STATE_NAMES))]
@@ -0,0 +1,354 @@
+"""
+Record-and-replay traces of what happens on a machine running Stay Awake.
+
+A running instance records a compact trace of the things the keep-awake decision
+depends on: the running processes, user input (from the OS idle time), the
+battery state and the user turning Stay Awake on and off. It also records its
+own decisions and injections, which the replay compares against.
+
+The replayer runs several policies (variations of the recorded config) side by
+side against the same trace in shadow mode, on the simulation engine: nothing is
+injected, and each policy reports the input it would have injected, the time the
+machine would have been kept awake and the keep-awake windows it would have
+missed, i.e. times the live instance kept the machine awake and the policy would
+have let it sleep.
+
+Trace files are JSON lines. The first line is a header object; every other line
+is [milliseconds since the start, kind, values...]:
+
+    P {pid: name}     the running processes (when tracking starts)
+    + pid name        a process started
+    - pid             a process exited
+    I duration        user input from this moment for a number of milliseconds
+    B percent plugged the battery state, percent null without a battery
+    A active          Stay Awake was turned on or off
+    K keeping_awake   the live decision changed
+    J                 the live instance injected input
+    E                 the recording ended
+
+Usage:
+    python activity_trace.py start PATH           Start recording in the running instance
+    python activity_trace.py stop                 Stop recording
+    python activity_trace.py replay PATH [--policy NAME:key.path=value,...] [--sleep-after 15]
+"""
+import sys
+import copy
+import json
+import time
+import argparse
+import threading
+
+TRACE_FORMAT = 1
+INPUT_MERGE_GAP = 60.0    # Seconds between inputs still counted as one span
+INJECTION_MARGIN = 1.0    # Idle readings this close to an injection are the injection
+
+
+def read_user_idle_seconds():
+    """Return the seconds since the last keyboard or mouse input, or None where unknown"""
+    if sys.platform != "win32":
+        return None
+    import win32api
+    # Tick counts wrap around after 49.7 days
+    return ((win32api.GetTickCount() - win32api.GetLastInputInfo()) & 0xFFFFFFFF) / 1000.0
+
+
+class TraceRecorder:
+    """Writes a trace file; called from the worker, process event and GUI threads"""
+
+    def __init__(self, path, config=None, clock=time.time):
+        self.path = path
+        self.clock = clock
+        self.start = clock()
+        self.event_count = 0
+        self._lock = threading.Lock()
+        self._file = open(path, "w", encoding="utf-8", buffering=1)
+        self._input = None  # [start, end] of the user input span being collected
+        self._last_input = None
+        self._last_injection = None
+        self._state = {}  # Last written value per kind, to only write changes
+        header = {"trace": TRACE_FORMAT, "start": self.start, "config": config}
+        self._file.write(json.dumps(header, separators=(",", ":")) + "\n")
+
+    def _write(self, moment, kind, *values):
+        if self._file is None:
+            return
+        offset = int(round((moment - self.start) * 1000))
+        self._file.write(json.dumps([max(offset, 0), kind, *values], separators=(",", ":")) + "\n")
+        self.event_count += 1
+
+    def _changed(self, moment, kind, *values):
+        if self._state.get(kind, ()) != values:
+            self._state[kind] = values
+            self._write(moment, kind, *values)
+
+    def processes(self, snapshot):
+        """The process table, {pid: (ppid, name)} as in ProcessTracker"""
+        with self._lock:
+            self._write(self.clock(), "P", {str(pid): name for pid, (_, name) in snapshot.items()})
+
+    def process_started(self, pid, ppid, name):
+        with self._lock:
+            self._write(self.clock(), "+", pid, name)
+
+    def process_exited(self, pid):
+        with self._lock:
+            self._write(self.clock(), "-", pid)
+
+    def injected(self):
+        """The live instance injected input"""
+        with self._lock:
+            self._last_injection = self.clock()
+            self._write(self._last_injection, "J")
+
+    def sample(self, active, keeping_awake, idle_seconds=None, battery=None):
+        """Record the state seen by one worker tick"""
+        with self._lock:
+            now = self.clock()
+            self._changed(now, "A", bool(active))
+            self._changed(now, "K", bool(keeping_awake))
+            if battery is None:
+                self._changed(now, "B", None, False)
+            else:
+                self._changed(now, "B", int(round(battery[0])), bool(battery[1]))
+            if idle_seconds is not None:
+                self._input_seen(now - idle_seconds)
+
+    def _input_seen(self, moment):
+        if self._last_input is not None and moment <= self._last_input + 0.5:
+            return  # No input since the previous sample
+        self._last_input = moment
+        if self._last_injection is not None and abs(moment - self._last_injection) <= INJECTION_MARGIN:
+            return  # Our own injection, not the user
+        if self._input is not None and moment - self._input[1] <= INPUT_MERGE_GAP:
+            self._input[1] = moment
+            return
+        self._flush_input()
+        self._input = [moment, moment]
+
+    def _flush_input(self):
+        if self._input is not None:
+            start, end = self._input
+            self._write(start, "I", int(round((end - start) * 1000)))
+            self._input = None
+
+    def close(self):
+        with self._lock:
+            if self._file is None:
+                return
+            self._flush_input()
+            self._write(self.clock(), "E")
+            self._file.close()
+            self._file = None
+
+
+class Trace:
+    """A trace file read back as a simulation Scenario plus what the live instance did"""
+
+    def __init__(self, path):
+        from simulation import Scenario
+
+        with open(path, "r", encoding="utf-8") as f:
+            lines = [line for line in f if line.strip()]
+        if not lines:
+            raise ValueError(f"{path} is empty")
+        self.header = json.loads(lines[0])
+        if self.header.get("trace") != TRACE_FORMAT:
+            raise ValueError(f"{path} is not a trace file this version can read")
+        self.start = self.header["start"]
+        self.config = self.header.get("config")
+        # A trace cut short (e.g. by a crash) is read up to its last complete line
+        events = []
+        for line in lines[1:]:
+            try:
+                events.append(json.loads(line))
+            except ValueError:
+                break
+        events.sort(key=lambda event: event[0])
+        self.end = self.start + (events[-1][0] / 1000.0 if events else 0)
+
+        self.scenario = Scenario(self.start, days=(self.end - self.start) / 86400)
+        self.keep_awake = []  # (start, end) windows the live instance kept the machine awake
+        self.injections = 0
+        running = None  # pid -> name the replay knows to be running
+        awake_since = None
+        for event in events:
+            moment, kind, values = self.start + event[0] / 1000.0, event[1], event[2:]
+            if kind == "P":
+                snapshot = {int(pid): name for pid, name in values[0].items()}
+                if running is None:
+                    self.scenario.processes = dict(snapshot)
+                else:
+                    for pid in set(running) - set(snapshot):
+                        self.scenario.process_exit(moment, pid)
+                    for pid in set(snapshot) - set(running):
+                        self.scenario.process_start(moment, snapshot[pid], pid)
+                running = snapshot
+            elif kind == "+":
+                running = running if running is not None else {}
+                running[values[0]] = values[1]
+                self.scenario.process_start(moment, values[1], values[0])
+            elif kind == "-":
+                if running is not None:
+                    running.pop(values[0], None)
+                self.scenario.process_exit(moment, values[0])
+            elif kind == "I":
+                self.scenario.user_input(moment, values[0] / 60000.0)
+            elif kind == "B":
+                self.scenario.battery(moment, values[0], values[1])
+            elif kind == "A":
+                self.scenario.set_active(moment, values[0])
+            elif kind == "K":
+                if values[0] and awake_since is None:
+                    awake_since = moment
+                elif not values[0] and awake_since is not None:
+                    self.keep_awake.append((awake_since, moment))
+                    awake_since = None
+            elif kind == "J":
+                self.injections += 1
+        if awake_since is not None:
+            self.keep_awake.append((awake_since, self.end))
+
+
+def apply_overrides(config, overrides):
+    """Return a copy of a config with dotted key paths replaced, e.g. activity_settings.interval"""
+    config = copy.deepcopy(config)
+    for path, value in overrides.items():
+        keys = path.split(".")
+        target = config
+        for key in keys[:-1]:
+            target = target[key]
+        target[keys[-1]] = value
+    return config
+
+
+def parse_policy(text):
+    """Parse NAME:key.path=value,... into (name, overrides); values are JSON or plain strings"""
+    name, _, assignments = text.partition(":")
+    overrides = {}
+    for assignment in filter(None, assignments.split(",")):
+        path, separator, value = assignment.partition("=")
+        if not separator:
+            raise ValueError(f"Expected key.path=value, got '{assignment}'")
+        try:
+            overrides[path.strip()] = json.loads(value)
+        except ValueError:
+            overrides[path.strip()] = value
+    return name, overrides
+
+
+def missed_windows(simulation, windows):
+    """Return (windows missed, seconds missed): live keep-awake time the simulation spent asleep"""
+    from simulation import ASLEEP
+
+    asleep = []
+    timeline = simulation.timeline
+    for index, (moment, state, _) in enumerate(timeline):
+        if state == ASLEEP:
+            end = timeline[index + 1][0] if index + 1 < len(timeline) else simulation.end
+            asleep.append((moment, end))
+    missed = 0
+    seconds = 0.0
+    for start, end in windows:
+        overlap = sum(max(0.0, min(end, sleep_end) - max(start, sleep_start))
+                      for sleep_start, sleep_end in asleep)
+        if overlap > 0:
+            missed += 1
+            seconds += overlap
+    return missed, seconds
+
+
+def replay(trace, policies, sleep_after, timezone=None):
+    """Run every (name, config, sleep_after) policy in shadow mode, returns result rows"""
+    import config_schema
+    from simulation import Simulation, SimulatedIdleSource, settings_from_config, AWAKE, ASLEEP
+
+    trace.scenario.timezone = timezone
+    rows = []
+    for name, config, policy_sleep_after in policies:
+        config, _ = config_schema.load(config)
+        if policy_sleep_after is None:
+            policy_sleep_after = sleep_after
+        simulation = Simulation(settings_from_config(config), trace.scenario,
+                                idle_source=SimulatedIdleSource(trace.start, policy_sleep_after),
+                                power_settings=config["power_policy"])
+        simulation.run()
+        missed, missed_seconds = missed_windows(simulation, trace.keep_awake)
+        rows.append((name, simulation.injector.count, simulation.seconds[AWAKE] / 3600,
+                     simulation.seconds[ASLEEP] / 3600, missed, missed_seconds / 60))
+    return rows
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="Record traces and replay them against policies")
+    commands = parser.add_subparsers(dest="command", required=True)
+    start = commands.add_parser("start", help="Start recording in the running instance")
+    start.add_argument("path", help="Trace file to write")
+    commands.add_parser("stop", help="Stop recording")
+    replay_parser = commands.add_parser("replay", help="Compare policies against a trace")
+    replay_parser.add_argument("path", help="Trace file to replay")
+    replay_parser.add_argument("--config", help="Config file for the baseline instead of the recorded one")
+    replay_parser.add_argument("--policy", action="append", default=[],
+                               help="NAME:key.path=value,... applied to the baseline; sleep_after=MINUTES "
+                                    "changes the OS idle timeout")
+    replay_parser.add_argument("--sleep-after", type=float, default=15,
+                               help="OS idle timeout in minutes, 0 for never")
+    replay_parser.add_argument("--timezone", default="local", help="IANA time zone the trace was recorded in")
+    args = parser.parse_args(argv)
+
+    if args.command in ("start", "stop"):
+        import os
+        from instance import call_method
+        try:
+            if args.command == "start":
+                result = call_method("trace.start", {"path": os.path.abspath(args.path)})
+                print(f"Recording to {result['path']}")
+            else:
+                result = call_method("trace.stop")
+                if result["path"] is None:
+                    print("Not recording")
+                else:
+                    print(f"Recorded {result['events']} events to {result['path']}")
+        except (ConnectionError, RuntimeError) as e:
+            print(str(e), file=sys.stderr)
+            return 1
+        return 0
+
+    trace = Trace(args.path)
+    if args.config:
+        with open(args.config, "r") as f:
+            baseline = json.load(f)
+    elif trace.config is not None:
+        baseline = trace.config
+    else:
+        import config_schema
+        baseline = config_schema.default_config()
+    timezone = None
+    if args.timezone != "local":
+        from zoneinfo import ZoneInfo
+        timezone = ZoneInfo(args.timezone)
+
+    policies = [("baseline", baseline, None)]
+    for text in args.policy:
+        name, overrides = parse_policy(text)
+        sleep_after = overrides.pop("sleep_after", None)
+        policies.append((name, apply_overrides(baseline, overrides),
+                         None if sleep_after is None else float(sleep_after) * 60))
+
+    began = time.perf_counter()
+    rows = replay(trace, policies, args.sleep_after * 60, timezone)
+    elapsed = time.perf_counter() - began
+
+    live_hours = sum(end - start for start, end in trace.keep_awake) / 3600
+    print(f"Trace of {(trace.end - trace.start) / 3600:.1f} h: live instance injected "
+          f"{trace.injections} times and kept the machine awake for {live_hours:.1f} h "
+          f"in {len(trace.keep_awake)} windows")
+    width = max(len(row[0]) for row in rows)
+    print(f"{'policy':{width}}  injections  awake h  asleep h  missed windows  missed min")
+    for name, injections, awake, asleep, missed, missed_minutes in rows:
+        print(f"{name:{width}}  {injections:10}  {awake:7.1f}  {asleep:8.1f}  {missed:14}  {missed_minutes:10.1f}")
+    print(f"Replayed {len(rows)} policies in {elapsed * 1000:.1f} ms")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,181 @@
+"""
+Matcher for excluded application names.
+
+Entries in the excluded app list can be exact names ("notepad.exe"), glob patterns
+("chrome*", "*.vshost.exe") or regular expressions prefixed with "re:"
+("re:^python3?\\.exe$"). Matching is case-insensitive. Literal names live in a frozen
+set and all wildcard patterns are combined into one regular expression, so the cost
+of matching a process name does not grow with the number of entries.
+
+Regular expressions with groups (whose backreferences would be renumbered) or
+global inline flags such as "(?i)" cannot be combined with others; they are
+compiled and matched on their own.
+"""
+import re
+import fnmatch
+
+REGEX_PREFIX = "re:"
+GLOB_CHARACTERS = "*?["
+
+# Upper bound for the per-name result cache
+NAME_CACHE_SIZE = 4096
+
+
+def is_pattern(entry):
+    """Check if an excluded app entry is a glob or regex pattern rather than a name"""
+    return entry.startswith(REGEX_PREFIX) or any(char in entry for char in GLOB_CHARACTERS)
+
+
+def _pattern_to_regex(entry):
+    """Translate a single glob or regex entry to (regex source, combinable), raises re.error"""
+    if entry.startswith(REGEX_PREFIX):
+        source = entry[len(REGEX_PREFIX):]
+        compiled = re.compile(source, re.IGNORECASE)  # Raise re.error early for an invalid expression
+        try:
+            re.compile(f"(?:{source})")
+        except re.error:
+            return source, False
+        return source, compiled.groups == 0
+    return fnmatch.translate(entry.casefold()), True
+
+
+def entry_error(entry):
+    """Return why an excluded app entry is invalid, or None if it is fine"""
+    if entry.startswith(REGEX_PREFIX):
+        try:
+            _pattern_to_regex(entry)
+        except re.error as e:
+            return f"invalid regular expression: {str(e)}"
+    return None
+
+
+class AppMatcher:
+    """Compiled set of excluded application names and patterns"""
+
+    def __init__(self, entries=None):
+        self._entries = []      # Entries in the order they were added
+        self._literals = set()  # Casefolded exact names
+        self._patterns = {}     # Pattern entry -> (regex source, combinable)
+        self.literals = frozenset()
+        self.regex = None       # Combined regex of the combinable patterns
+        self.separate = ()      # Compiled patterns that have to be matched on their own
+        self._name_cache = {}
+        for entry in entries or []:
+            self._add(entry)
+        self._compile_literals()
+        self._compile_patterns()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, entry):
+        return entry in self._entries
+
+    def __iter__(self):
+        return iter(self._entries)
+
+    def copy(self):
+        """Return an independent matcher with the same entries, without recompiling"""
+        other = AppMatcher.__new__(AppMatcher)
+        other._entries = list(self._entries)
+        other._literals = set(self._literals)
+        other._patterns = dict(self._patterns)
+        other.literals = self.literals
+        other.regex = self.regex
+        other.separate = self.separate
+        other._name_cache = {}
+        return other
+
+    def __getstate__(self):
+        # The per-name results are rebuilt on demand, do not pickle them
+        state = dict(self.__dict__)
+        state["_name_cache"] = {}
+        return state
+
+    @property
+    def entries(self):
+        """Return the entries of the matcher as a list"""
+        return list(self._entries)
+
+    def _add(self, entry):
+        """Add an entry without recompiling, returns True for a pattern entry"""
+        if not entry or entry in self._entries:
+            return None
+        if is_pattern(entry):
+            self._patterns[entry] = _pattern_to_regex(entry)
+            self._entries.append(entry)
+            return True
+        self._entries.append(entry)
+        self._literals.add(entry.casefold())
+        return False
+
+    def _compile_literals(self):
+        self.literals = frozenset(self._literals)
+        self._name_cache.clear()
+
+    @staticmethod
+    def _build_patterns(patterns):
+        """Return (combined regex, separately matched regexes) for pattern sources"""
+        combined = [f"(?:{source})" for source, combinable in patterns.values() if combinable]
+        regex = re.compile("|".join(combined), re.IGNORECASE) if combined else None
+        separate = tuple(re.compile(source, re.IGNORECASE)
+                         for source, combinable in patterns.values() if not combinable)
+        return regex, separate
+
+    def _compile_patterns(self):
+        self.regex, self.separate = self._build_patterns(self._patterns)
+        self._name_cache.clear()
+
+    def add(self, entry):
+        """Add a name or pattern, recompiling only the part of the matcher it affects
+
+        Raises re.error for an invalid pattern, leaving the matcher unchanged.
+        """
+        if not entry or entry in self._entries:
+            return False
+        if is_pattern(entry):
+            # Compile everything before touching any state
+            patterns = dict(self._patterns)
+            patterns[entry] = _pattern_to_regex(entry)
+            self.regex, self.separate = self._build_patterns(patterns)
+            self._patterns = patterns
+            self._entries.append(entry)
+            self._name_cache.clear()
+        else:
+            self._add(entry)
+            self._compile_literals()
+        return True
+
+    def remove(self, entry):
+        """Remove a name or pattern, recompiling only the part of the matcher it affects"""
+        if entry not in self._entries:
+            return False
+        self._entries.remove(entry)
+        if entry in self._patterns:
+            del self._patterns[entry]
+            self._compile_patterns()
+        else:
+            key = entry.casefold()
+            # Another entry may differ only in case and still need the literal
+            if not any(other.casefold() == key for other in self._entries if other not in self._patterns):
+                self._literals.discard(key)
+            self._compile_literals()
+        return True
+
+    def matches(self, name):
+        """Check if a process name matches any excluded entry"""
+        if not name:
+            return False
+        cached = self._name_cache.get(name)
+        if cached is not None:
+            return cached
+
+        key = name.casefold()
+        result = key in self.literals or (self.regex is not None and self.regex.match(key) is not None) \
+            or any(regex.match(key) is not None for regex in self.separate)
+
+        # Process names repeat a lot (svchost.exe, chrome.exe), so remember results
+        if len(self._name_cache) >= NAME_CACHE_SIZE:
+            self._name_cache.clear()
+        self._name_cache[name] = result
+        return result
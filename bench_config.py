@@ -0,0 +1,101 @@
+"""
+Benchmark for loading configs: migration of legacy formats and validation.
+
+Generates a mix of legacy configs (the single daily schedule, the old
+weekly_schedule object, and unversioned configs from before the schema), then
+times parsing, migrating and validating all of them, loading the migrated
+result again (validation only), and loading each current text a second time,
+which config_schema.load_text() only parses.
+
+Usage: python bench_config.py [--count 10000] [--seed 1]
+"""
+import sys
+import json
+import time
+import random
+import argparse
+
+import config_schema
+
+
+def _period(rng):
+    start = rng.randrange(0, 20)
+    return {"enabled": rng.random() < 0.9, "start_hour": start, "start_minute": rng.choice([0, 15, 30, 45]),
+            "end_hour": rng.randrange(start, 24), "end_minute": rng.choice([0, 15, 30, 45])}
+
+
+def generate_legacy_config(rng):
+    """Return one config in a randomly chosen legacy format"""
+    kind = rng.randrange(3)
+    config = {
+        "active": rng.random() < 0.8,
+        "app_monitoring": {"enabled": rng.random() < 0.5,
+                           "apps": [f"app{rng.randrange(1000)}.exe" for _ in range(rng.randrange(8))]},
+        "activity_settings": {"type": rng.choice(config_schema.ACTIVITY_TYPES),
+                              "interval": rng.randrange(config_schema.MIN_INTERVAL, config_schema.MAX_INTERVAL)}
+    }
+    if kind == 0:
+        # Single daily schedule
+        config["schedule"] = dict(_period(rng), enabled=True)
+    else:
+        schedules = config_schema.default_weekly_schedules()
+        for name in schedules:
+            schedules[name]["periods"] = [_period(rng) for _ in range(rng.randrange(1, 4))]
+        if kind == 1:
+            # Old weekly_schedule object
+            config["schedule"] = {"enabled": False}
+            config["weekly_schedule"] = {"enabled": rng.random() < 0.5, "schedules": schedules}
+        else:
+            # Unversioned config with weekly_schedules but no later sections
+            config["schedule"] = {"enabled": rng.random() < 0.5}
+            config["weekly_schedules"] = schedules
+            config["activity_settings"]["custom_key"] = f"{rng.randrange(1, 0xFE):X}"
+    return config
+
+
+def _time(texts):
+    start = time.perf_counter()
+    results = [config_schema.load(json.loads(text)) for text in texts]
+    return time.perf_counter() - start, results
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="Benchmark config migration and validation")
+    parser.add_argument("--count", type=int, default=10000, help="Number of configs to generate")
+    parser.add_argument("--seed", type=int, default=1, help="Random seed")
+    args = parser.parse_args(argv)
+
+    rng = random.Random(args.seed)
+    legacy = [json.dumps(generate_legacy_config(rng)) for _ in range(args.count)]
+
+    elapsed, results = _time(legacy)
+    migrated = sum(1 for _, was_migrated in results if was_migrated)
+    print(f"Legacy:  {args.count} configs in {elapsed * 1000:.1f} ms "
+          f"({elapsed / args.count * 1e6:.1f} us each, {migrated} migrated)")
+
+    current = [json.dumps(config) for config, _ in results]
+    start = time.perf_counter()
+    for text in current:
+        json.loads(text)
+    elapsed = time.perf_counter() - start
+    print(f"Parsing: {args.count} configs in {elapsed * 1000:.1f} ms (JSON parsing alone, for reference)")
+
+    elapsed, results = _time(current)
+    migrated = sum(1 for _, was_migrated in results if was_migrated)
+    print(f"Current: {args.count} configs in {elapsed * 1000:.1f} ms "
+          f"({elapsed / args.count * 1e6:.1f} us each, {migrated} migrated)")
+
+    # Each text is loaded once to be remembered as valid, then timed when it comes back
+    elapsed = 0
+    for text in current:
+        config_schema.load_text(text)
+        start = time.perf_counter()
+        config_schema.load_text(text)
+        elapsed += time.perf_counter() - start
+    print(f"Reload:  {args.count} configs in {elapsed * 1000:.1f} ms "
+          f"({elapsed / args.count * 1e6:.1f} us each, unchanged texts already validated)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
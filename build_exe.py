@@ -84,6 +84,9 @@ def build_exe():
     else:
         print("No icon specified")
     
+    # Time zone database for calendar TZIDs; Windows has none of its own
+    args.append('--collect-data=tzdata')
+    
     # Add data files if needed (configs, etc.)
     if os.path.exists('default_config.json'):
         args.append('--add-data=default_config.json;.')
@@ -0,0 +1,175 @@
+"""
+Weekly schedules compiled into per-day minute intervals.
+
+The weekly schedule config is a nested dict of days, a global schedule and periods
+with start and end times. Evaluating it directly means walking that structure on
+every check. CompiledSchedule resolves it once into one entry per weekday:
+
+- None when the day has no opinion (day disabled, or it uses a disabled global
+  schedule), so Stay Awake behaves as if there were no schedule
+- otherwise a sorted tuple of merged, half-open (start, end) minute intervals
+  during which the schedule allows keeping the machine awake
+
+A period applies to the day it is configured on; an overnight period such as
+22:00-06:00 covers the start and the end of that same day, like before.
+
+Date overrides (see date_overrides.py) replace the weekday's entry for single
+dates. They are kept in a dict keyed by datetime.date, so looking one up costs
+one hash lookup per check whatever the number of overrides.
+
+The compiled form is plain tuples, so it can be pickled into the startup cache.
+"""
+from bisect import bisect_right
+from datetime import date, datetime
+
+DAYS_OF_WEEK = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+MINUTES_PER_DAY = 24 * 60
+
+
+def _period_intervals(period):
+    """Return the minute intervals a single enabled period covers within its day"""
+    start = period["start_hour"] * 60 + period["start_minute"]
+    end = period["end_hour"] * 60 + period["end_minute"]
+    if start <= end:
+        return [(start, end)]
+    # Over midnight: the evening part and the morning part of the same day
+    return [(start, MINUTES_PER_DAY), (0, end)]
+
+
+def _merge(intervals):
+    merged = []
+    for start, end in sorted(intervals):
+        if start >= end:
+            continue
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return tuple(merged)
+
+
+def _override_intervals(override):
+    """Return the minute intervals of one date override"""
+    mode = override.get("mode")
+    if mode == "off":
+        return ()
+    if mode == "on":
+        return ((0, MINUTES_PER_DAY),)
+    intervals = []
+    for period in override.get("periods", []):
+        if period.get("enabled", True):
+            intervals.extend(_period_intervals(period))
+    return _merge(intervals)
+
+
+class CompiledSchedule:
+    """A weekly schedule resolved into per-day active minute intervals"""
+
+    def __init__(self, weekly_schedules, date_overrides=None):
+        days = []
+        schedules = weekly_schedules or {}
+        for day in DAYS_OF_WEEK:
+            day_schedule = schedules.get(day)
+            if not day_schedule or not day_schedule.get("enabled"):
+                days.append(None)
+                continue
+            if day_schedule.get("use_global"):
+                global_schedule = schedules.get("global") or {}
+                if not global_schedule.get("enabled"):
+                    days.append(None)
+                    continue
+                periods = global_schedule.get("periods", [])
+            else:
+                periods = day_schedule.get("periods", [])
+            intervals = []
+            for period in periods:
+                if period.get("enabled"):
+                    intervals.extend(_period_intervals(period))
+            days.append(_merge(intervals))
+        self.days = tuple(days)
+        # Interval starts per day, for bisecting
+        self._starts = tuple(None if intervals is None else tuple(start for start, _ in intervals)
+                             for intervals in self.days)
+        # date -> (intervals, interval starts) for dates that override their weekday
+        self.overrides = {}
+        for key, override in (date_overrides or {}).items():
+            intervals = _override_intervals(override)
+            self.overrides[date.fromisoformat(key)] = (intervals, tuple(start for start, _ in intervals))
+
+    def __eq__(self, other):
+        return isinstance(other, CompiledSchedule) and self.days == other.days \
+            and self.overrides == other.overrides
+
+    def is_empty(self):
+        """Check if the schedule has no opinion on any day"""
+        return all(intervals is None for intervals in self.days) and not self.overrides
+
+    def day_intervals(self, day):
+        """Return the active intervals of a date, None when the schedule has no opinion"""
+        override = self.overrides.get(day) if self.overrides else None
+        if override is not None:
+            return override[0]
+        return self.days[day.weekday()]
+
+    def suspends(self, moment):
+        """Check if the schedule says to stay inactive at a datetime"""
+        override = self.overrides.get(moment.date()) if self.overrides else None
+        if override is not None:
+            intervals, starts = override
+        else:
+            weekday = moment.weekday()
+            intervals = self.days[weekday]
+            if intervals is None:
+                return False
+            starts = self._starts[weekday]
+        minute = moment.hour * 60 + moment.minute
+        index = bisect_right(starts, minute) - 1
+        if index >= 0 and minute < intervals[index][1]:
+            return False
+        # The end minute itself still counts while its first second lasts
+        if index >= 0 and minute == intervals[index][1] and moment.second == 0 and moment.microsecond == 0:
+            return False
+        return True
+
+    def suspends_at(self, timestamp, timezone=None):
+        """Check if the schedule says to stay inactive at a timestamp, in local time by default"""
+        return self.suspends(datetime.fromtimestamp(timestamp, timezone))
+
+
+def summarize(weekly_schedules):
+    """Return (weekday text, weekend text, custom day lines) for the schedule summary"""
+    schedules = weekly_schedules or {}
+
+    # Format for displaying time periods
+    def format_time_periods(periods):
+        times = []
+        for p in periods:
+            if p.get("enabled", False):
+                times.append(f"{p['start_hour']}:{p['start_minute']:02d}-{p['end_hour']}:{p['end_minute']:02d}")
+        # An enabled schedule without an enabled period keeps Stay Awake inactive all day
+        return ", ".join(times) if times else "Off all day"
+
+    def summarize_days(names, none_text, joiner):
+        # Check if all days use the same schedule (global or identical custom)
+        all_use_global = all(
+            day in schedules and
+            schedules[day]["enabled"] and
+            schedules[day]["use_global"]
+            for day in names
+        )
+        if all_use_global and schedules.get("global", {}).get("enabled", False):
+            return f"Global schedule: {format_time_periods(schedules['global']['periods'])}"
+        enabled = [day for day in names if day in schedules and schedules[day]["enabled"]]
+        if not enabled:
+            return none_text
+        return f"Enabled for: {', '.join(joiner(day) for day in enabled)}"
+
+    weekday_text = summarize_days(DAYS_OF_WEEK[:5], "No weekdays enabled", lambda day: day[:3])
+    weekend_text = summarize_days(DAYS_OF_WEEK[5:], "No weekend days enabled", lambda day: day)
+
+    # Custom day schedules
+    custom_days = []
+    for day, schedule in schedules.items():
+        if day != "global" and schedule.get("enabled", False) and not schedule.get("use_global", True):
+            custom_days.append(f"{day}: {format_time_periods(schedule['periods'])}")
+    return weekday_text, weekend_text, custom_days
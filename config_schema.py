@@ -0,0 +1,452 @@
+"""
+Versioned configuration schema: defaults, migrations and validation.
+
+Every saved config carries a "schema_version". Configs written by older versions
+of Stay Awake are brought up to date by running the registered migration steps
+in order, once; the caller persists the result so later starts need no
+migration. Skipping migration alone saves little, as validation dominates the
+cost of loading; load_text() therefore remembers the digests of the last texts
+that validated at SCHEMA_VERSION and only parses them when they come back, e.g.
+when the watched config file is reloaded unchanged.
+
+validate() checks the whole config up front and reports every problem with its
+location, e.g. "weekly_schedules.Monday.periods[0].end_hour: must be an integer
+between 0 and 23 (got 24)", instead of letting malformed values fail later inside
+the worker.
+
+This module imports neither Qt nor the monitors (their defaults come from
+monitor_defaults.py), so configs can be migrated and checked headless (see
+bench_config.py).
+"""
+import copy
+import json
+import hashlib
+from datetime import date
+from collections import OrderedDict
+
+from monitor_defaults import (DEFAULT_LOAD_SETTINGS, DEFAULT_NETWORK_SETTINGS, DEFAULT_POWER_SETTINGS,
+                              BATTERY_NORMAL, BATTERY_LONGER_INTERVAL, BATTERY_INHIBIT_ONLY,
+                              DEFAULT_LOCK_SETTINGS, WHEN_LOCKED_PAUSE, WHEN_LOCKED_INHIBIT,
+                              DEFAULT_CALENDAR_SETTINGS)
+from app_matcher import REGEX_PREFIX, entry_error
+
+SCHEMA_VERSION = 5
+
+DAYS_OF_WEEK = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+ACTIVITY_TYPES = ("mouse_movement", "key_press", "both", "custom_key")
+# Range of the activity interval slider, in seconds
+MIN_INTERVAL = 10
+MAX_INTERVAL = 300
+VALIDATED_CACHE_SIZE = 16  # Digests of config texts remembered as valid
+
+
+class ConfigError(ValueError):
+    """A config failed validation; errors lists every problem found"""
+
+    def __init__(self, errors):
+        self.errors = errors
+        super().__init__("; ".join(errors))
+
+
+def default_period():
+    return {"enabled": True, "start_hour": 9, "start_minute": 0, "end_hour": 17, "end_minute": 0}
+
+
+def default_weekly_schedules():
+    """Weekdays 9:00 to 17:00 through the global schedule, weekends off"""
+    schedules = {}
+    for day in DAYS_OF_WEEK:
+        schedules[day] = {
+            "enabled": day not in ("Saturday", "Sunday"),
+            "use_global": True,
+            "periods": [default_period()]
+        }
+    schedules["global"] = {"enabled": True, "periods": [default_period()]}
+    return schedules
+
+
+def default_config():
+    """Return a new config holding the built-in defaults"""
+    return {
+        "schema_version": SCHEMA_VERSION,
+        "active": True,
+        "schedule": {
+            "enabled": True  # Enable scheduling by default
+        },
+        "weekly_schedules": default_weekly_schedules(),
+        "date_overrides": {},  # ISO date -> holiday or one-off day replacing its weekday
+        "app_monitoring": {
+            "enabled": False,
+            "apps": []
+        },
+        "foreground_monitoring": {
+            "enabled": False,
+            "only_apps": [],  # Stay awake only while one of these is in the foreground
+            "suspend_apps": []  # Stay inactive while one of these is in the foreground
+        },
+        "load_monitoring": dict(DEFAULT_LOAD_SETTINGS),  # Stay awake while the system is busy
+        "network_monitoring": copy.deepcopy(DEFAULT_NETWORK_SETTINGS),  # Stay awake during network sessions
+        "process_holds": {
+            "enabled": False,
+            "patterns": []  # Stay awake while these processes or their descendants run
+        },
+        "power_policy": dict(DEFAULT_POWER_SETTINGS),  # Battery aware behaviour
+        "session_lock": dict(DEFAULT_LOCK_SETTINGS),  # Behaviour while locked or the screen is off
+        "calendar": dict(DEFAULT_CALENDAR_SETTINGS),  # Stay awake during meetings from an .ics file
+        "activity_settings": {
+            "type": "mouse_movement",
+            "interval": 50,
+            "custom_key": "7E"  # F15 key by default (in hex)
+        },
+        "ui_settings": {
+            "start_minimized": False  # Start minimized to tray
+        }
+    }
+
+
+# Migrations
+
+MIGRATIONS = []  # (version, step) in ascending order; step(config) upgrades in place
+
+
+def migration(version):
+    """Register a step that upgrades a config from version - 1 to version"""
+    def register(step):
+        if MIGRATIONS and MIGRATIONS[-1][0] >= version:
+            raise ValueError(f"Migration to version {version} registered out of order")
+        MIGRATIONS.append((version, step))
+        return step
+    return register
+
+
+@migration(1)
+def _weekly_schedules(config):
+    """Replace the single daily schedule and the old weekly_schedule object"""
+    old_weekly = config.pop("weekly_schedule", None)
+    schedule = config.setdefault("schedule", {})
+    if isinstance(old_weekly, dict) and "schedules" in old_weekly:
+        config["weekly_schedules"] = old_weekly["schedules"]
+        schedule["enabled"] = old_weekly.get("enabled", schedule.get("enabled", True))
+    elif "start_hour" in schedule:
+        # Very old configs only had one daily period; use it for every day
+        times = {key: schedule.pop(key) for key in ("start_hour", "start_minute", "end_hour", "end_minute")
+                 if key in schedule}
+        schedules = default_weekly_schedules()
+        for name in DAYS_OF_WEEK + ["global"]:
+            schedules[name]["periods"][0].update(times)
+        config["weekly_schedules"] = schedules
+    config.setdefault("weekly_schedules", default_weekly_schedules())
+    schedule.setdefault("enabled", True)
+
+
+@migration(2)
+def _activity_and_ui_settings(config):
+    """Custom key presses and the UI settings section"""
+    defaults = default_config()
+    activity = config.setdefault("activity_settings", defaults["activity_settings"])
+    activity.setdefault("custom_key", defaults["activity_settings"]["custom_key"])
+    config.setdefault("ui_settings", defaults["ui_settings"])
+
+
+@migration(3)
+def _monitoring_sections(config):
+    """Foreground, load, network, process, power and session lock monitoring"""
+    defaults = default_config()
+    for section in ("app_monitoring", "foreground_monitoring", "load_monitoring", "network_monitoring",
+                    "process_holds", "power_policy", "session_lock"):
+        config.setdefault(section, defaults[section])
+
+
+@migration(4)
+def _date_overrides(config):
+    """Date-specific overrides of the weekly schedule"""
+    config.setdefault("date_overrides", {})
+
+
+@migration(5)
+def _calendar(config):
+    """Meetings from a local iCalendar file"""
+    config.setdefault("calendar", default_config()["calendar"])
+
+
+def migrate(config):
+    """Bring a config up to SCHEMA_VERSION in place, returns True if anything ran"""
+    version = config.get("schema_version", 0)
+    if version == SCHEMA_VERSION:
+        return False
+    if not isinstance(version, int) or version < 0:
+        raise ConfigError([f"schema_version: must be a non-negative integer (got {version!r})"])
+    if version > SCHEMA_VERSION:
+        raise ConfigError([f"schema_version: {version} is newer than this version of Stay Awake "
+                           f"supports ({SCHEMA_VERSION})"])
+    for target, step in MIGRATIONS:
+        if target > version:
+            try:
+                step(config)
+            except (AttributeError, KeyError, TypeError) as e:
+                raise ConfigError([f"Could not migrate from schema version {target - 1}: {str(e)}"])
+    config["schema_version"] = SCHEMA_VERSION
+    return True
+
+
+# Validation
+#
+# Paths are passed down as (parent, key) pairs and only turned into text such as
+# "weekly_schedules.Monday.periods[0]" when there is an error to report, so a
+# valid config is checked without building any strings.
+
+def _format_path(path):
+    parts = []
+    while path is not None:
+        path, key = path
+        parts.append(f"[{key}]" if isinstance(key, int) else f".{key}")
+    return "".join(reversed(parts)).lstrip(".") or "config"
+
+
+class Type:
+    """A value of a plain JSON type (parsed JSON never holds subclasses)"""
+
+    def __init__(self, kind):
+        self.kinds = (kind,)
+        self.low = self.high = None
+
+    def check(self, value, path, errors):
+        if type(value) not in self.kinds:
+            errors.append(f"{_format_path(path)}: must be {self.kinds[0].__name__} (got {type(value).__name__})")
+
+
+class Range:
+    """A number between low and high, inclusive"""
+
+    def __init__(self, low, high, integer=False):
+        self.low = low
+        self.high = high
+        self.kinds = (int,) if integer else (int, float)
+
+    def check(self, value, path, errors):
+        if type(value) not in self.kinds or not self.low <= value <= self.high:
+            kind = "an integer" if self.kinds == (int,) else "a number"
+            errors.append(f"{_format_path(path)}: must be {kind} between {self.low} and {self.high} "
+                          f"(got {value!r})")
+
+
+class OneOf:
+    """One of a fixed set of values"""
+
+    def __init__(self, *values):
+        self.values = values
+
+    def check(self, value, path, errors):
+        if value not in self.values:
+            choices = ", ".join(repr(choice) for choice in self.values)
+            errors.append(f"{_format_path(path)}: must be one of {choices} (got {value!r})")
+
+
+class ListOf:
+    """A list whose items all match a spec"""
+
+    def __init__(self, item):
+        self.item = item
+
+    def check(self, value, path, errors):
+        if type(value) is not list:
+            errors.append(f"{_format_path(path)}: must be a list (got {type(value).__name__})")
+            return
+        check = self.item.check
+        for index, item in enumerate(value):
+            check(item, (path, index), errors)
+
+
+class Fields:
+    """An object with known fields; unknown fields are allowed and kept
+
+    ordered lists (low, high) pairs of number fields where low must not be above
+    high; a missing field counts with its value in defaults, as the monitors
+    fill in their defaults the same way.
+    """
+
+    def __init__(self, fields, required=(), ordered=(), defaults=None):
+        self.ordered = ordered
+        self.defaults = defaults or {}
+        fields = [(name, _spec(spec)) for name, spec in fields.items()]
+        # Plain types and ranges are checked inline; the spec only runs to report an error
+        self.scalars = [(name, spec.kinds, spec.low, spec.high, spec) for name, spec in fields
+                        if isinstance(spec, (Type, Range))]
+        self.nested = [(name, spec) for name, spec in fields if not isinstance(spec, (Type, Range))]
+        self.required = required
+
+    def check(self, value, path, errors):
+        if type(value) is not dict:
+            errors.append(f"{_format_path(path)}: must be an object (got {type(value).__name__})")
+            return
+        for name in self.required:
+            if name not in value:
+                errors.append(f"{_format_path((path, name))}: is required")
+        for name, kinds, low, high, spec in self.scalars:
+            if name in value:
+                item = value[name]
+                if type(item) not in kinds or (low is not None and not low <= item <= high):
+                    spec.check(item, (path, name), errors)
+        for name, spec in self.nested:
+            if name in value:
+                spec.check(value[name], (path, name), errors)
+        for low_name, high_name in self.ordered:
+            low = value.get(low_name, self.defaults.get(low_name))
+            high = value.get(high_name, self.defaults.get(high_name))
+            # Values of the wrong type were reported above
+            if type(low) in (int, float) and type(high) in (int, float) and low > high:
+                errors.append(f"{_format_path((path, low_name))}: must not be above {high_name} "
+                              f"(got {low!r} > {high!r})")
+
+
+class DateKeyed:
+    """An object mapping ISO dates (YYYY-MM-DD) to values matching a spec"""
+
+    def __init__(self, item):
+        self.item = item
+
+    def check(self, value, path, errors):
+        if type(value) is not dict:
+            errors.append(f"{_format_path(path)}: must be an object (got {type(value).__name__})")
+            return
+        for key, item in value.items():
+            try:
+                date.fromisoformat(key)
+            except ValueError:
+                errors.append(f"{_format_path((path, key))}: must be keyed by a date such as 2026-12-24")
+                continue
+            self.item.check(item, (path, key), errors)
+
+
+class HexKey:
+    """A virtual key code written in hexadecimal"""
+
+    def check(self, value, path, errors):
+        try:
+            code = int(value, 16)
+        except (TypeError, ValueError):
+            errors.append(f"{_format_path(path)}: must be a hexadecimal key code such as \"7E\" (got {value!r})")
+            return
+        if not 0 < code <= 0xFE:
+            errors.append(f"{_format_path(path)}: key code must be between 01 and FE (got {value!r})")
+
+
+class AppEntry:
+    """An excluded app name, glob pattern or "re:" regular expression that compiles"""
+
+    def check(self, value, path, errors):
+        if type(value) is not str:
+            errors.append(f"{_format_path(path)}: must be str (got {type(value).__name__})")
+        elif value.startswith(REGEX_PREFIX):
+            error = entry_error(value)
+            if error:
+                errors.append(f"{_format_path(path)}: {error} (got {value!r})")
+
+
+def _spec(spec):
+    """Allow plain types such as bool or str in place of Type(bool)"""
+    return Type(spec) if isinstance(spec, type) else spec
+
+
+HOUR = Range(0, 23, integer=True)
+MINUTE = Range(0, 59, integer=True)
+PERIOD = Fields({
+    "enabled": bool, "start_hour": HOUR, "start_minute": MINUTE, "end_hour": HOUR, "end_minute": MINUTE
+}, required=("start_hour", "start_minute", "end_hour", "end_minute"))
+DAY_SCHEDULE = Fields({"enabled": bool, "use_global": bool, "periods": ListOf(PERIOD)},
+                      required=("enabled", "periods"))
+DATE_OVERRIDE = Fields({"mode": OneOf("off", "on", "custom"), "periods": ListOf(PERIOD), "note": str},
+                       required=("mode",))
+PORT = Range(0, 65535, integer=True)
+SECONDS = Range(0, 86400)
+APP_LIST = ListOf(AppEntry())
+
+CONFIG_SPEC = Fields({
+    "schema_version": Range(0, SCHEMA_VERSION, integer=True),
+    "active": bool,
+    "schedule": Fields({"enabled": bool}, required=("enabled",)),
+    "weekly_schedules": Fields(dict({day: DAY_SCHEDULE for day in DAYS_OF_WEEK},
+                                    **{"global": Fields({"enabled": bool, "periods": ListOf(PERIOD)},
+                                                        required=("enabled", "periods"))}),
+                               required=("global",)),
+    "date_overrides": DateKeyed(DATE_OVERRIDE),
+    "app_monitoring": Fields({"enabled": bool, "apps": APP_LIST}, required=("enabled", "apps")),
+    "foreground_monitoring": Fields({"enabled": bool, "only_apps": APP_LIST, "suspend_apps": APP_LIST}),
+    "load_monitoring": Fields({
+        "enabled": bool, "cpu_high": Range(0, 100), "cpu_low": Range(0, 100),
+        "disk_high": Range(0, 100000), "disk_low": Range(0, 100000),
+        "interval": Range(1, 3600), "smoothing": SECONDS
+    }, ordered=(("cpu_low", "cpu_high"), ("disk_low", "disk_high")), defaults=DEFAULT_LOAD_SETTINGS),
+    "network_monitoring": Fields({
+        "enabled": bool, "local_ports": ListOf(PORT), "remote_ports": ListOf(PORT),
+        "throughput_kb": Range(0, 10 ** 7), "min_interval": Range(1, 3600), "max_interval": Range(1, 3600)
+    }, ordered=(("min_interval", "max_interval"),), defaults=DEFAULT_NETWORK_SETTINGS),
+    "process_holds": Fields({"enabled": bool, "patterns": APP_LIST}),
+    "power_policy": Fields({
+        "enabled": bool, "pause_below": Range(0, 100),
+        "on_battery": OneOf(BATTERY_NORMAL, BATTERY_LONGER_INTERVAL, BATTERY_INHIBIT_ONLY),
+        "battery_interval": SECONDS, "refresh_interval": SECONDS, "notified_refresh_interval": SECONDS
+    }),
+    "session_lock": Fields({
+        "enabled": bool, "when_locked": OneOf(WHEN_LOCKED_PAUSE, WHEN_LOCKED_INHIBIT), "include_screen_off": bool
+    }),
+    "calendar": Fields({
+        "enabled": bool, "path": str, "before_minutes": Range(0, 120), "after_minutes": Range(0, 120),
+        "window_days": Range(1, 366, integer=True), "check_interval": Range(1, 3600),
+        "all_day_events": bool, "free_events": bool
+    }),
+    "activity_settings": Fields({
+        "type": OneOf(*ACTIVITY_TYPES),
+        "interval": Range(MIN_INTERVAL, MAX_INTERVAL, integer=True),
+        "custom_key": HexKey()
+    }, required=("type", "interval")),
+    "ui_settings": Fields({"start_minimized": bool})
+}, required=("active", "schedule", "weekly_schedules", "app_monitoring", "activity_settings"))
+
+
+def validate(config):
+    """Raise ConfigError listing every problem in a (migrated) config"""
+    errors = []
+    CONFIG_SPEC.check(config, None, errors)
+    if errors:
+        raise ConfigError(errors)
+
+
+def validate_section(name, value):
+    """Raise ConfigError listing every problem in one top-level section, e.g. date_overrides"""
+    errors = []
+    dict(CONFIG_SPEC.nested)[name].check(value, (None, name), errors)
+    if errors:
+        raise ConfigError(errors)
+
+
+def load(config):
+    """Migrate and validate a parsed config, returns (config, migrated)"""
+    if not isinstance(config, dict):
+        raise ConfigError([f"config: must be an object (got {type(config).__name__})"])
+    migrated = migrate(config)
+    validate(config)
+    return config, migrated
+
+
+_validated = OrderedDict()  # Digest of a config text valid at SCHEMA_VERSION -> None, oldest first
+
+
+def load_text(data):
+    """Parse, migrate and validate a config file's text or bytes, returns (config, migrated)
+
+    A text that already validated at SCHEMA_VERSION is only parsed.
+    """
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    digest = hashlib.sha1(data).digest()
+    config = json.loads(data)
+    if digest in _validated:
+        _validated.move_to_end(digest)
+        return config, False
+    config, migrated = load(config)
+    if not migrated:
+        _validated[digest] = None
+        if len(_validated) > VALIDATED_CACHE_SIZE:
+            _validated.popitem(last=False)
+    return config, migrated
@@ -0,0 +1,292 @@
+"""
+Watches the configuration file for changes made outside the application.
+
+Change notifications come from the best source available on the platform:
+
+- Linux: inotify on the directory holding the file (catches editors that save by
+  writing a temporary file and renaming it over the original)
+- Windows: ReadDirectoryChangesW on the directory
+- Anywhere else, or when the above are unavailable: polling os.stat
+
+Bursts of events are debounced into one reload. Each reload compares a digest of
+the file contents with the last contents seen, so writes made by the application
+itself (announced with mark_written) and saves that change nothing are ignored.
+"""
+import os
+import sys
+import struct
+import hashlib
+import threading
+
+
+def _digest(data):
+    return hashlib.sha1(data).hexdigest()
+
+
+class ConfigChangeSource:
+    """Base class for a source of change notifications for one file
+
+    on_event() is called without arguments, possibly from a background thread,
+    whenever the file may have changed.
+    """
+    name = "base"
+
+    def start(self, path, on_event):
+        """Start watching, raises OSError if the source is unavailable"""
+        raise NotImplementedError
+
+    def stop(self):
+        pass
+
+
+class PollingChangeSource(ConfigChangeSource):
+    """Fallback source comparing os.stat results on an interval"""
+    name = "polling"
+
+    def __init__(self, interval=2.0):
+        self.interval = interval
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    @staticmethod
+    def _signature(path):
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size, stat.st_ino
+
+    def start(self, path, on_event):
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, args=(path, on_event), daemon=True)
+        self._thread.start()
+
+    def _run(self, path, on_event):
+        known = self._signature(path)
+        while not self._stop_event.wait(self.interval):
+            current = self._signature(path)
+            if current != known:
+                known = current
+                on_event()
+
+    def stop(self):
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout=1.0)
+            self._thread = None
+
+
+class InotifyChangeSource(ConfigChangeSource):
+    """Linux inotify events for the directory holding the file"""
+    name = "inotify"
+
+    IN_MODIFY = 0x00000002
+    IN_CLOSE_WRITE = 0x00000008
+    IN_MOVED_TO = 0x00000080
+    IN_CREATE = 0x00000100
+    IN_DELETE = 0x00000200
+    IN_NONBLOCK = 0o4000
+    IN_CLOEXEC = 0o2000000
+
+    EVENT_HEADER = struct.Struct("iIII")  # wd, mask, cookie, name length
+
+    def __init__(self):
+        self._fd = None
+        self._thread = None
+        self._running = False
+
+    def start(self, path, on_event):
+        if not sys.platform.startswith("linux"):
+            raise OSError("inotify is only available on Linux")
+        import ctypes
+        import ctypes.util
+
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        fd = libc.inotify_init1(self.IN_NONBLOCK | self.IN_CLOEXEC)
+        if fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        directory = os.path.dirname(os.path.abspath(path)) or "."
+        mask = self.IN_MODIFY | self.IN_CLOSE_WRITE | self.IN_MOVED_TO | self.IN_CREATE | self.IN_DELETE
+        if libc.inotify_add_watch(fd, directory.encode(), mask) < 0:
+            errno = ctypes.get_errno()
+            os.close(fd)
+            raise OSError(errno, f"inotify_add_watch failed for {directory}")
+        self._fd = fd
+        self._running = True
+        self._thread = threading.Thread(target=self._run, args=(os.path.basename(path), on_event),
+                                        daemon=True)
+        self._thread.start()
+
+    def _run(self, filename, on_event):
+        import select
+
+        target = filename.encode()
+        while self._running:
+            # Wake up regularly so stop() does not have to close the fd under us
+            readable, _, _ = select.select([self._fd], [], [], 1.0)
+            if not readable:
+                continue
+            try:
+                data = os.read(self._fd, 65536)
+            except BlockingIOError:
+                continue
+            except OSError:
+                break
+            offset = 0
+            matched = False
+            while offset + self.EVENT_HEADER.size <= len(data):
+                _, _, _, length = self.EVENT_HEADER.unpack_from(data, offset)
+                start = offset + self.EVENT_HEADER.size
+                name = data[start:start + length].rstrip(b"\0")
+                offset = start + length
+                if name == target:
+                    matched = True
+            if matched:
+                on_event()
+
+    def stop(self):
+        self._running = False
+        if self._thread is not None:
+            self._thread.join(timeout=2.0)
+            self._thread = None
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+
+class WindowsChangeSource(ConfigChangeSource):
+    """ReadDirectoryChangesW notifications for the directory holding the file"""
+    name = "ReadDirectoryChangesW"
+
+    FILE_LIST_DIRECTORY = 0x0001
+
+    def __init__(self):
+        self._handle = None
+        self._thread = None
+        self._running = False
+
+    def start(self, path, on_event):
+        if sys.platform != "win32":
+            raise OSError("ReadDirectoryChangesW is only available on Windows")
+        import win32con
+        import win32file
+
+        directory = os.path.dirname(os.path.abspath(path)) or "."
+        self._handle = win32file.CreateFile(
+            directory, self.FILE_LIST_DIRECTORY,
+            win32con.FILE_SHARE_READ | win32con.FILE_SHARE_WRITE | win32con.FILE_SHARE_DELETE,
+            None, win32con.OPEN_EXISTING, win32con.FILE_FLAG_BACKUP_SEMANTICS, None)
+        self._running = True
+        self._thread = threading.Thread(target=self._run, args=(os.path.basename(path), on_event),
+                                        daemon=True)
+        self._thread.start()
+
+    def _run(self, filename, on_event):
+        import win32con
+        import win32file
+
+        flags = win32con.FILE_NOTIFY_CHANGE_LAST_WRITE | win32con.FILE_NOTIFY_CHANGE_FILE_NAME | \
+            win32con.FILE_NOTIFY_CHANGE_SIZE
+        target = filename.casefold()
+        while self._running:
+            try:
+                changes = win32file.ReadDirectoryChangesW(self._handle, 8192, False, flags, None, None)
+            except Exception:
+                break
+            if any(name.casefold() == target for _, name in changes):
+                on_event()
+
+    def stop(self):
+        self._running = False
+        if self._handle is not None:
+            import ctypes
+            # Unblock the pending ReadDirectoryChangesW call
+            ctypes.windll.kernel32.CancelIoEx(int(self._handle), None)
+            self._handle.Close()
+            self._handle = None
+        if self._thread is not None:
+            self._thread.join(timeout=2.0)
+            self._thread = None
+
+
+def create_change_sources():
+    """Return the change sources to try on this platform, best first"""
+    if sys.platform.startswith("linux"):
+        return [InotifyChangeSource(), PollingChangeSource()]
+    if sys.platform == "win32":
+        return [WindowsChangeSource(), PollingChangeSource()]
+    return [PollingChangeSource()]
+
+
+class ConfigWatcher:
+    """Calls on_change(text) with the new contents when the file changes on disk"""
+
+    def __init__(self, path, on_change, sources=None, debounce=0.5):
+        self.path = path
+        self.on_change = on_change
+        self.sources = sources
+        self.debounce = debounce
+        self.source = None
+        self._known_digest = None
+        self._timer = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        """Start watching with the first change source that is available"""
+        if self.source is not None:
+            return self.source
+        self._known_digest = self._read_digest()[1]
+        sources = self.sources if self.sources is not None else create_change_sources()
+        for source in sources:
+            try:
+                source.start(self.path, self._on_event)
+            except Exception as e:
+                print(f"Config change source '{source.name}' unavailable: {str(e)}")
+                continue
+            self.source = source
+            print(f"Watching {self.path} using '{source.name}'")
+            return source
+        return None
+
+    def stop(self):
+        if self.source is not None:
+            self.source.stop()
+            self.source = None
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+
+    def mark_written(self, text):
+        """Remember contents written by the application so they do not trigger a reload"""
+        with self._lock:
+            self._known_digest = _digest(text.encode("utf-8"))
+
+    def _read_digest(self):
+        try:
+            with open(self.path, "rb") as f:
+                data = f.read()
+        except OSError:
+            return None, None
+        return data, _digest(data)
+
+    def _on_event(self):
+        # Editors often produce several events per save; reload once they settle
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+            self._timer = threading.Timer(self.debounce, self._reload)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def _reload(self):
+        data, digest = self._read_digest()
+        with self._lock:
+            self._timer = None
+            if data is None or digest == self._known_digest:
+                return
+            self._known_digest = digest
+        try:
+            self.on_change(data.decode("utf-8"))
+        except Exception as e:
+            print(f"Error reloading {self.path}: {str(e)}")
@@ -0,0 +1,308 @@
+"""
+JSON-RPC 2.0 control server for automation scripts.
+
+Extends the single-instance server from instance.py, on the same localhost socket
+and with the same access token, so the simple `{"command": ...}` requests of the
+command line client keep working next to JSON-RPC. Every line is one JSON value:
+a request object, or an array of requests (a batch).
+
+Methods handled on the server's asyncio loop, without touching the GUI:
+
+- status.subscribe / status.unsubscribe: stream "status.changed" notifications
+- lease.acquire / lease.renew / lease.release / lease.list: time-limited leases
+
+All other methods (settings, schedules, excluded apps, status) are passed to the
+application, which runs the calls of one batch together in a single hop to the
+GUI thread. Waiting for that hop does not occupy a thread per client, so hundreds
+of clients can be connected at once.
+
+A connection is authenticated by the first request that carries the instance
+token as a top-level "token" member.
+"""
+import json
+import asyncio
+
+from instance import InstanceServer, INSTANCE_FILE
+
+# JSON-RPC error codes
+PARSE_ERROR = -32700
+INVALID_REQUEST = -32600
+METHOD_NOT_FOUND = -32601
+INVALID_PARAMS = -32602
+INTERNAL_ERROR = -32603
+UNAUTHORIZED = -32001
+
+# Largest request line accepted from a client
+MAX_LINE = 1024 * 1024
+
+
+class RpcError(Exception):
+    """Error returned to the client as a JSON-RPC error object"""
+
+    def __init__(self, code, message):
+        super().__init__(message)
+        self.code = code
+        self.message = message
+
+
+def error_response(request_id, code, message):
+    return {"jsonrpc": "2.0", "id": request_id, "error": {"code": code, "message": message}}
+
+
+class _Connection:
+    """State of one client connection"""
+
+    def __init__(self, writer):
+        self.writer = writer
+        self.authenticated = False
+        self.subscription = None
+        self.latest_status = None          # Newest status not yet sent to a subscriber
+        self.status_ready = asyncio.Event()
+        self.write_lock = asyncio.Lock()
+        self.sender = None                 # Task streaming status notifications
+
+    async def send(self, message):
+        async with self.write_lock:
+            self.writer.write(json.dumps(message).encode("utf-8") + b"\n")
+            await self.writer.drain()
+
+
+class ControlServer(InstanceServer):
+    """Instance server that also speaks JSON-RPC, streams status and tracks leases
+
+    handler(request) serves the legacy command requests, as for InstanceServer.
+    submit(calls) runs a list of (method, params) pairs in the application and
+    returns a concurrent.futures.Future of a list of ("result", value) or
+    ("error", (code, message)) pairs, one per call. leases is the LeaseTable
+    shared with the worker.
+    """
+
+    def __init__(self, handler, submit, leases, path=INSTANCE_FILE):
+        super().__init__(handler, path)
+        self.submit = submit
+        self.leases = leases
+        self.connections = set()
+        self.subscriptions = {}     # subscription id -> _Connection
+        self._next_subscription = 1
+        self._expiry_timer = None
+        self.local_methods = {
+            "status.subscribe": self._subscribe,
+            "status.unsubscribe": self._unsubscribe,
+            "lease.acquire": self._lease_acquire,
+            "lease.renew": self._lease_renew,
+            "lease.release": self._lease_release,
+            "lease.list": self._lease_list
+        }
+
+    def _run(self):
+        # Same as InstanceServer._run, with a larger backlog and line limit
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        try:
+            self._server = self.loop.run_until_complete(
+                asyncio.start_server(self._handle_client, "127.0.0.1", 0, backlog=512, limit=MAX_LINE))
+            self.port = self._server.sockets[0].getsockname()[1]
+        finally:
+            self._started.set()
+        try:
+            self.loop.run_forever()
+        finally:
+            for connection in list(self.connections):
+                connection.writer.close()
+            # Let client handlers and status streams finish before the loop closes
+            tasks = asyncio.all_tasks(self.loop)
+            for task in tasks:
+                task.cancel()
+            self.loop.run_until_complete(asyncio.gather(*tasks, return_exceptions=True))
+            self._server.close()
+            self.loop.run_until_complete(self._server.wait_closed())
+            self.loop.close()
+
+    def publish(self, status):
+        """Send a status change to all subscribers, callable from any thread"""
+        loop = self.loop
+        if loop is not None and loop.is_running():
+            loop.call_soon_threadsafe(self._broadcast, status)
+
+    def _broadcast(self, status):
+        # Slow subscribers only ever get the newest status; nothing queues up
+        for connection in self.subscriptions.values():
+            connection.latest_status = status
+            connection.status_ready.set()
+
+    async def _stream_status(self, connection):
+        try:
+            while connection.subscription is not None:
+                await connection.status_ready.wait()
+                connection.status_ready.clear()
+                if connection.subscription is None:
+                    break
+                status, connection.latest_status = connection.latest_status, None
+                await connection.send({
+                    "jsonrpc": "2.0",
+                    "method": "status.changed",
+                    "params": {"subscription": connection.subscription, "status": status}
+                })
+        except (ConnectionError, RuntimeError, asyncio.CancelledError):
+            pass
+
+    async def _handle_client(self, reader, writer):
+        connection = _Connection(writer)
+        self.connections.add(connection)
+        try:
+            while True:
+                try:
+                    line = await reader.readline()
+                except ValueError:
+                    await connection.send(error_response(None, PARSE_ERROR, "Request too large"))
+                    break
+                if not line:
+                    break
+                response = await self.handle_message(connection, line)
+                if response is not None:
+                    await connection.send(response)
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.CancelledError):
+            # Cancelled when the server shuts down
+            pass
+        finally:
+            self._drop_subscription(connection)
+            self.connections.discard(connection)
+            writer.close()
+
+    async def handle_message(self, connection, line):
+        """Parse one line and return the response to send, or None"""
+        try:
+            message = json.loads(line.decode("utf-8"))
+        except ValueError:
+            return error_response(None, PARSE_ERROR, "Invalid JSON")
+
+        if isinstance(message, dict) and "jsonrpc" not in message:
+            # Request of the command line client
+            response = await self.handle_line(line)
+            if response.get("ok"):
+                connection.authenticated = True
+            return response
+
+        batch = isinstance(message, list)
+        requests = message if batch else [message]
+        if batch and not requests:
+            return error_response(None, INVALID_REQUEST, "Empty batch")
+
+        responses = await self.handle_batch(connection, requests)
+        # Notifications (requests without an id) get no response
+        responses = [response for request, response in zip(requests, responses)
+                     if response is not None and not (isinstance(request, dict) and "id" not in request)]
+        if batch:
+            return responses or None
+        return responses[0] if responses else None
+
+    async def handle_batch(self, connection, requests):
+        """Run a list of requests and return one response per request"""
+        import secrets
+
+        responses = [None] * len(requests)
+        app_calls = []  # (index, method, params) sent to the application together
+
+        for index, request in enumerate(requests):
+            if (not isinstance(request, dict) or request.get("jsonrpc") != "2.0"
+                    or not isinstance(request.get("method"), str)):
+                responses[index] = error_response(None, INVALID_REQUEST, "Invalid request")
+                continue
+            request_id = request.get("id")
+            token = request.get("token")
+            if token is not None and secrets.compare_digest(str(token), self.token):
+                connection.authenticated = True
+            if not connection.authenticated:
+                responses[index] = error_response(request_id, UNAUTHORIZED, "Invalid token")
+                continue
+            params = request.get("params", {})
+            if not isinstance(params, dict):
+                responses[index] = error_response(request_id, INVALID_PARAMS, "params must be an object")
+                continue
+
+            method = request["method"]
+            if method in self.local_methods:
+                try:
+                    result = self.local_methods[method](connection, params)
+                    responses[index] = {"jsonrpc": "2.0", "id": request_id, "result": result}
+                except RpcError as e:
+                    responses[index] = error_response(request_id, e.code, e.message)
+                except (KeyError, TypeError, ValueError) as e:
+                    responses[index] = error_response(request_id, INVALID_PARAMS, str(e))
+            else:
+                app_calls.append((index, method, params))
+
+        if app_calls:
+            try:
+                results = await asyncio.wrap_future(
+                    self.submit([(method, params) for _, method, params in app_calls]))
+            except Exception as e:
+                results = [("error", (INTERNAL_ERROR, str(e)))] * len(app_calls)
+            for (index, _, _), (kind, value) in zip(app_calls, results):
+                request_id = requests[index].get("id")
+                if kind == "result":
+                    responses[index] = {"jsonrpc": "2.0", "id": request_id, "result": value}
+                else:
+                    responses[index] = error_response(request_id, value[0], value[1])
+        return responses
+
+    # Subscriptions
+
+    def _subscribe(self, connection, params):
+        if connection.subscription is None:
+            connection.subscription = self._next_subscription
+            self._next_subscription += 1
+            self.subscriptions[connection.subscription] = connection
+            connection.sender = self.loop.create_task(self._stream_status(connection))
+        return connection.subscription
+
+    def _unsubscribe(self, connection, params):
+        return self._drop_subscription(connection)
+
+    def _drop_subscription(self, connection):
+        if connection.subscription is None:
+            return False
+        self.subscriptions.pop(connection.subscription, None)
+        connection.subscription = None
+        connection.status_ready.set()  # Let the sender task finish
+        return True
+
+    # Leases
+
+    def _lease_acquire(self, connection, params):
+        lease = self.leases.acquire(params["seconds"], str(params.get("reason", "")), params.get("owner"))
+        self._schedule_expiry()
+        return lease.to_dict(self.leases.clock())
+
+    def _lease_renew(self, connection, params):
+        try:
+            reason = params.get("reason")
+            lease = self.leases.renew(params["lease"], params["seconds"], None if reason is None else str(reason))
+        except KeyError:
+            raise RpcError(INVALID_PARAMS, f"No such lease: {params['lease']}")
+        self._schedule_expiry()
+        return lease.to_dict(self.leases.clock())
+
+    def _lease_release(self, connection, params):
+        released = self.leases.release(params["lease"])
+        self._schedule_expiry()
+        return released
+
+    def _lease_list(self, connection, params):
+        return self.leases.snapshot()
+
+    def _schedule_expiry(self):
+        """Arm a single timer for the earliest lease deadline"""
+        if self._expiry_timer is not None:
+            self._expiry_timer.cancel()
+            self._expiry_timer = None
+        deadline = self.leases.next_deadline()
+        if deadline is not None:
+            delay = max(0.0, deadline - self.leases.clock())
+            self._expiry_timer = self.loop.call_later(delay, self._expire_leases)
+
+    def _expire_leases(self):
+        self._expiry_timer = None
+        for lease in self.leases.expire():
+            print(f"Lease {lease.id} expired ({lease.reason or 'no reason given'})")
+        self._schedule_expiry()
@@ -0,0 +1,136 @@
+"""
+Date-specific overrides of the weekly schedule, for holidays and one-off days.
+
+The weekly schedule only knows weekdays. config["date_overrides"] maps ISO dates
+to an override that replaces the weekday's schedule on that date only:
+
+    "date_overrides": {
+        "2026-12-24": {"mode": "off", "note": "Christmas Eve"},
+        "2026-12-31": {"mode": "custom", "periods": [{"start_hour": 9, "start_minute": 0,
+                                                      "end_hour": 13, "end_minute": 0}]},
+        "2027-01-04": {"mode": "on"}
+    }
+
+- off: the schedule says to stay inactive all day
+- on: the schedule does not restrict the day
+- custom: the periods (same format as weekly schedule periods) apply instead
+
+CompiledSchedule resolves them once, keyed by date, so checks, next transition
+queries and the schedule projection all see them. Overrides are imported in bulk
+from CSV files with one line per date (or date range):
+
+    date,mode,periods,note
+    2026-12-24,off,,Christmas Eve
+    2026-12-31,custom,09:00-13:00,
+    2027-08-02..2027-08-13,off,,Summer leave
+"""
+import csv
+from datetime import date, timedelta
+
+MODE_OFF = "off"
+MODE_ON = "on"
+MODE_CUSTOM = "custom"
+MODES = (MODE_OFF, MODE_ON, MODE_CUSTOM)
+MAX_RANGE_DAYS = 366  # Longest date range a single CSV line may cover
+
+
+def parse_periods(text):
+    """Parse "09:00-12:00;13:00-17:00" into a list of period dicts"""
+    periods = []
+    for part in filter(None, (part.strip() for part in text.split(";"))):
+        start, separator, end = part.partition("-")
+        if not separator:
+            raise ValueError(f"Expected a period such as 09:00-17:00, got '{part}'")
+        times = []
+        for value in (start, end):
+            hour, _, minute = value.strip().partition(":")
+            hour, minute = int(hour), int(minute or 0)
+            if not (0 <= hour <= 23 and 0 <= minute <= 59):
+                raise ValueError(f"Invalid time '{value.strip()}'")
+            times.append((hour, minute))
+        periods.append({"enabled": True, "start_hour": times[0][0], "start_minute": times[0][1],
+                        "end_hour": times[1][0], "end_minute": times[1][1]})
+    return periods
+
+
+def format_periods(periods):
+    """Format periods the way parse_periods reads them"""
+    return ";".join(f"{p['start_hour']:02d}:{p['start_minute']:02d}-{p['end_hour']:02d}:{p['end_minute']:02d}"
+                    for p in periods if p.get("enabled", True))
+
+
+def describe(override):
+    """Return a short description of an override for lists and summaries"""
+    mode = override.get("mode")
+    if mode == MODE_OFF:
+        text = "Off all day"
+    elif mode == MODE_ON:
+        text = "On all day"
+    else:
+        text = format_periods(override.get("periods", [])).replace(";", ", ") or "No periods"
+    note = override.get("note")
+    return f"{text} ({note})" if note else text
+
+
+def _parse_dates(text):
+    first, separator, last = text.strip().partition("..")
+    first = date.fromisoformat(first.strip())
+    if not separator:
+        return [first]
+    last = date.fromisoformat(last.strip())
+    if last < first or (last - first).days >= MAX_RANGE_DAYS:
+        raise ValueError(f"Invalid date range '{text.strip()}'")
+    return [first + timedelta(days=day) for day in range((last - first).days + 1)]
+
+
+def import_csv(lines):
+    """Read overrides from CSV lines, returns ({iso date: override}, [errors])
+
+    Columns are date (or first..last), mode, periods and note; a header line is
+    skipped. Later lines win over earlier ones for the same date.
+    """
+    overrides = {}
+    errors = []
+    for number, row in enumerate(csv.reader(lines), 1):
+        if not row or not "".join(row).strip() or row[0].strip().startswith("#"):
+            continue
+        if number == 1 and row[0].strip().lower() == "date":
+            continue
+        row = [cell.strip() for cell in row] + [""] * (4 - len(row))
+        text, mode, periods, note = row[:4]
+        try:
+            dates = _parse_dates(text)
+            mode = mode.lower() or (MODE_CUSTOM if periods else "")
+            if mode not in MODES:
+                raise ValueError(f"Mode must be one of {', '.join(MODES)} (got '{mode}')")
+            override = {"mode": mode}
+            if mode == MODE_CUSTOM:
+                override["periods"] = parse_periods(periods)
+                if not override["periods"]:
+                    raise ValueError("A custom day needs at least one period")
+            if note:
+                override["note"] = note
+        except ValueError as e:
+            errors.append(f"Line {number}: {str(e)}")
+            continue
+        for day in dates:
+            overrides[day.isoformat()] = dict(override)
+    return overrides, errors
+
+
+def export_csv(overrides, f):
+    """Write overrides as CSV that import_csv reads back"""
+    writer = csv.writer(f, lineterminator="\n")
+    writer.writerow(["date", "mode", "periods", "note"])
+    for key in sorted(overrides):
+        override = overrides[key]
+        writer.writerow([key, override.get("mode", MODE_CUSTOM),
+                         format_periods(override.get("periods", [])) if override.get("mode") == MODE_CUSTOM else "",
+                         override.get("note", "")])
+
+
+def upcoming(overrides, today=None):
+    """Return the (date, override) pairs from today on, in date order"""
+    today = today or date.today()
+    days = sorted((date.fromisoformat(key), override) for key, override in overrides.items())
+    return [(day, override) for day, override in days if day >= today]
@@ -0,0 +1,60 @@
+"""
+Immutable settings snapshot shared between the GUI and worker threads.
+
+The GUI thread (and the control server, through it) changes settings while the
+worker thread evaluates the rules. Rather than the worker reading attributes
+that may change halfway through a tick, every change builds a new
+EngineSettings and publishes it by replacing a single reference. The worker
+takes that reference once per tick and sees one consistent set of settings,
+without taking a lock.
+
+EngineSettings is a namedtuple. The containers it holds (the weekly schedules
+and date overrides dicts, the AppMatcher objects and the session lock dict) are private copies that
+are never modified once published; a change always builds new ones.
+"""
+import threading
+from collections import namedtuple
+
+EngineSettings = namedtuple("EngineSettings", [
+    "active",
+    "schedule_active",
+    "weekly_schedules",           # Private copy of the weekly schedules config
+    "date_overrides",             # Private copy of the date overrides config
+    "compiled_schedule",          # CompiledSchedule of weekly_schedules and date_overrides
+    "app_monitoring_active",
+    "excluded_apps",              # AppMatcher
+    "foreground_monitoring_active",
+    "foreground_only_apps",       # AppMatcher
+    "foreground_suspend_apps",    # AppMatcher
+    "load_monitoring_active",
+    "network_monitoring_active",
+    "process_holds_active",
+    "power_policy_active",
+    "calendar_active",
+    "session_lock_active",
+    "session_lock_settings",      # Private copy of the session lock settings
+    "activity_type",
+    "activity_interval",
+    "custom_key_code"
+])
+
+
+class SettingsHolder:
+    """Holds the current EngineSettings; writers are serialized, readers never wait"""
+
+    def __init__(self, settings):
+        self.current = settings
+        self._lock = threading.Lock()
+
+    def update(self, **changes):
+        """Publish a copy of the current settings with some fields replaced"""
+        with self._lock:
+            # A single reference assignment, so readers get the old or the new snapshot
+            self.current = self.current._replace(**changes)
+            return self.current
+
+
+def setting_property(name):
+    """Read-only attribute backed by a field of the current settings snapshot"""
+    return property(lambda self: getattr(self.settings, name),
+                    doc=f"Current value of the '{name}' setting")
@@ -0,0 +1,218 @@
+"""
+Tracks the application owning the foreground window.
+
+Resolving the foreground window to a process name costs a few system calls, so the
+tracker remembers the name for the current foreground window and only resolves
+again when the foreground window changes. Names are not cached beyond that:
+Windows reuses PIDs and window handles, and a stale entry would report the wrong
+application. On Windows a WinEvent hook pushes foreground changes, so checking
+the foreground app does not call into the system at all.
+"""
+import sys
+import threading
+
+from utils import get_foreground_window, get_window_process_id, get_process_name
+
+
+class PollingForegroundSource:
+    """Reads the foreground window on demand using win32gui"""
+    name = "polling"
+    pushes_changes = False
+
+    def get_foreground_window(self):
+        return get_foreground_window()
+
+    def get_window_pid(self, hwnd):
+        return get_window_process_id(hwnd)
+
+    def get_process_name(self, pid):
+        return get_process_name(pid)
+
+    def start(self, on_change):
+        pass
+
+    def stop(self):
+        pass
+
+
+class WinEventForegroundSource(PollingForegroundSource):
+    """Receives foreground changes from a SetWinEventHook(EVENT_SYSTEM_FOREGROUND) hook"""
+    name = "winevent"
+    pushes_changes = True
+
+    EVENT_SYSTEM_FOREGROUND = 0x0003
+    WINEVENT_OUTOFCONTEXT = 0x0000
+    WM_QUIT = 0x0012
+
+    def __init__(self):
+        self._thread = None
+        self._thread_id = None
+        self._started = threading.Event()
+        self._failure = None
+
+    def start(self, on_change):
+        if sys.platform != "win32":
+            raise OSError("WinEvent hooks are only available on Windows")
+        self._started.clear()
+        self._failure = None
+        self._thread = threading.Thread(target=self._run, args=(on_change,), daemon=True)
+        self._thread.start()
+        self._started.wait(timeout=5.0)
+        if self._failure or not self._started.is_set():
+            raise OSError(self._failure or "Timed out installing the foreground hook")
+
+    def _run(self, on_change):
+        import ctypes
+        from ctypes import wintypes
+
+        user32 = ctypes.windll.user32
+        kernel32 = ctypes.windll.kernel32
+
+        WinEventProc = ctypes.WINFUNCTYPE(
+            None, wintypes.HANDLE, wintypes.DWORD, wintypes.HWND,
+            wintypes.LONG, wintypes.LONG, wintypes.DWORD, wintypes.DWORD)
+
+        def callback(hook, event, hwnd, id_object, id_child, thread, event_time):
+            on_change(hwnd)
+
+        # Keep a reference to the callback for as long as the hook is installed
+        self._callback = WinEventProc(callback)
+        user32.SetWinEventHook.restype = wintypes.HANDLE
+        hook = user32.SetWinEventHook(
+            self.EVENT_SYSTEM_FOREGROUND, self.EVENT_SYSTEM_FOREGROUND,
+            0, self._callback, 0, 0, self.WINEVENT_OUTOFCONTEXT)
+        if not hook:
+            self._failure = "SetWinEventHook failed"
+            self._started.set()
+            return
+
+        self._thread_id = kernel32.GetCurrentThreadId()
+        self._started.set()
+
+        # The hook callback is delivered through this thread's message loop
+        msg = wintypes.MSG()
+        while user32.GetMessageW(ctypes.byref(msg), 0, 0, 0) > 0:
+            user32.TranslateMessage(ctypes.byref(msg))
+            user32.DispatchMessageW(ctypes.byref(msg))
+
+        user32.UnhookWinEvent(hook)
+
+    def stop(self):
+        if self._thread_id is not None:
+            import ctypes
+            ctypes.windll.user32.PostThreadMessageW(self._thread_id, self.WM_QUIT, 0, 0)
+            self._thread_id = None
+        if self._thread is not None:
+            self._thread.join(timeout=2.0)
+            self._thread = None
+
+
+class FakeForegroundSource:
+    """Foreground source driven by hand, for tests and simulations"""
+    name = "fake"
+
+    def __init__(self, pushes_changes=True):
+        self.pushes_changes = pushes_changes
+        self.hwnd = None
+        self.windows = {}  # hwnd -> pid
+        self.names = {}    # pid -> name
+        self.resolve_count = 0  # Number of hwnd -> pid lookups performed
+        self._on_change = None
+
+    def get_foreground_window(self):
+        return self.hwnd
+
+    def get_window_pid(self, hwnd):
+        self.resolve_count += 1
+        return self.windows.get(hwnd)
+
+    def get_process_name(self, pid):
+        return self.names.get(pid)
+
+    def start(self, on_change):
+        self._on_change = on_change
+
+    def stop(self):
+        self._on_change = None
+
+    def set_foreground(self, hwnd, pid=None, name=None):
+        """Pretend a window became the foreground window"""
+        if pid is not None:
+            self.windows[hwnd] = pid
+            if name is not None:
+                self.names[pid] = name
+        self.hwnd = hwnd
+        if self.pushes_changes and self._on_change is not None:
+            self._on_change(hwnd)
+
+
+def create_foreground_source():
+    """Return the best foreground source for this platform"""
+    if sys.platform == "win32":
+        return WinEventForegroundSource()
+    return PollingForegroundSource()
+
+
+class ForegroundTracker:
+    """Cached view of the process owning the foreground window"""
+
+    def __init__(self, source=None):
+        self.source = source
+        self._hook_active = False
+        self._pushed_hwnd = None
+        self._hwnd = None
+        self._name = None
+        self._changed = False  # A foreground change was pushed since the last resolve
+
+    def start(self):
+        """Start receiving foreground changes, falling back to polling"""
+        if self.source is None:
+            self.source = create_foreground_source()
+        if self.source.pushes_changes:
+            try:
+                self._pushed_hwnd = self.source.get_foreground_window()
+                self.source.start(self._on_change)
+                self._hook_active = True
+            except Exception as e:
+                print(f"Foreground change hook unavailable, polling instead: {str(e)}")
+                self.source = PollingForegroundSource()
+                self._hook_active = False
+
+    def stop(self):
+        """Stop receiving foreground changes"""
+        if self.source is not None and self._hook_active:
+            self.source.stop()
+        self._hook_active = False
+
+    def _on_change(self, hwnd):
+        self._pushed_hwnd = hwnd
+        self._changed = True
+
+    def current_app(self):
+        """Return the process name of the foreground window, or None"""
+        if self.source is None:
+            self.start()
+
+        # Cleared before reading the handle, so a change pushed meanwhile is not lost
+        changed, self._changed = self._changed, False
+        if self._hook_active:
+            hwnd = self._pushed_hwnd
+        else:
+            hwnd = self.source.get_foreground_window()
+
+        # Unchanged foreground window, nothing to resolve; a pushed change resolves
+        # again even for the same handle, which may belong to a new window by now
+        if hwnd == self._hwnd and not changed:
+            return self._name
+
+        self._hwnd = hwnd
+        self._name = self._resolve(hwnd)
+        return self._name
+
+    def _resolve(self, hwnd):
+        if not hwnd:
+            return None
+        pid = self.source.get_window_pid(hwnd)
+        if pid is None:
+            return None
+        return self.source.get_process_name(pid)
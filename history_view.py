@@ -0,0 +1,158 @@
+from datetime import date, timedelta
+from PyQt6.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QPushButton, QLabel,
+                             QComboBox, QSizePolicy)
+from PyQt6.QtCore import Qt, QRectF
+from PyQt6.QtGui import QPainter, QColor
+from activity_history import STATE_NAMES, hourly_minutes, minutes, totals, week_start
+
+# Heatmap colours per state, drawn with the opacity of the minutes in each hour
+STATE_COLORS = (QColor(46, 160, 67), QColor(52, 120, 200), QColor(220, 130, 30))
+
+
+class HistoryHeatmap(QWidget):
+    """One row per day, one cell per hour, shaded by the minutes spent in a state"""
+
+    LABEL_WIDTH = 80
+    TOTAL_WIDTH = 60
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.rows = []  # (label, 24 hourly minutes, total minutes)
+        self.color = STATE_COLORS[0]
+        self.setMinimumHeight(160)
+        self.setSizePolicy(QSizePolicy.Policy.Expanding, QSizePolicy.Policy.Expanding)
+
+    def set_rows(self, rows, color):
+        self.rows = rows
+        self.color = color
+        self.update()
+
+    def paintEvent(self, event):
+        painter = QPainter(self)
+        if not self.rows:
+            painter.drawText(self.rect(), Qt.AlignmentFlag.AlignCenter, "No history recorded yet")
+            return
+        header = 16
+        grid_width = max(1, self.width() - self.LABEL_WIDTH - self.TOTAL_WIDTH)
+        cell_width = grid_width / 24
+        cell_height = max(4.0, (self.height() - header) / len(self.rows))
+        text_color = self.palette().color(self.foregroundRole())
+
+        # Hour labels every three hours
+        painter.setPen(text_color)
+        for hour in range(0, 24, 3):
+            painter.drawText(QRectF(self.LABEL_WIDTH + hour * cell_width, 0, cell_width * 3, header),
+                             Qt.AlignmentFlag.AlignLeft | Qt.AlignmentFlag.AlignVCenter, f"{hour:02d}")
+
+        empty = QColor(self.color)
+        empty.setAlpha(18)
+        for row, (label, hours, total) in enumerate(self.rows):
+            top = header + row * cell_height
+            painter.setPen(text_color)
+            painter.drawText(QRectF(0, top, self.LABEL_WIDTH - 4, cell_height),
+                             Qt.AlignmentFlag.AlignRight | Qt.AlignmentFlag.AlignVCenter, label)
+            painter.setPen(Qt.PenStyle.NoPen)
+            for hour, count in enumerate(hours):
+                if count:
+                    color = QColor(self.color)
+                    color.setAlpha(40 + int(215 * count / 60))
+                    painter.setBrush(color)
+                else:
+                    painter.setBrush(empty)
+                painter.drawRect(QRectF(self.LABEL_WIDTH + hour * cell_width + 1, top + 1,
+                                        cell_width - 2, cell_height - 2))
+            painter.setPen(text_color)
+            painter.drawText(QRectF(self.LABEL_WIDTH + grid_width, top, self.TOTAL_WIDTH, cell_height),
+                             Qt.AlignmentFlag.AlignRight | Qt.AlignmentFlag.AlignVCenter,
+                             f"{total / 60:.1f} h")
+
+
+class HistoryTab(QWidget):
+    """Week and month heatmaps and totals of the recorded activity history"""
+
+    def __init__(self, history, parent=None):
+        super().__init__(parent)
+        self.history = history
+        self.anchor = date.today()  # A day within the period shown
+        self.init_ui()
+
+    def init_ui(self):
+        layout = QVBoxLayout(self)
+
+        controls = QHBoxLayout()
+        self.period_combo = QComboBox()
+        self.period_combo.addItems(["Week", "Month"])
+        self.period_combo.currentIndexChanged.connect(self.refresh)
+        controls.addWidget(self.period_combo)
+
+        self.state_combo = QComboBox()
+        self.state_combo.addItems(STATE_NAMES)
+        self.state_combo.currentIndexChanged.connect(self.refresh)
+        controls.addWidget(self.state_combo)
+
+        controls.addStretch()
+        previous_button = QPushButton("<")
+        previous_button.setMaximumWidth(30)
+        previous_button.clicked.connect(lambda: self.step(-1))
+        controls.addWidget(previous_button)
+        self.period_label = QLabel()
+        controls.addWidget(self.period_label)
+        next_button = QPushButton(">")
+        next_button.setMaximumWidth(30)
+        next_button.clicked.connect(lambda: self.step(1))
+        controls.addWidget(next_button)
+        today_button = QPushButton("Today")
+        today_button.clicked.connect(self.show_today)
+        controls.addWidget(today_button)
+        layout.addLayout(controls)
+
+        self.heatmap = HistoryHeatmap()
+        layout.addWidget(self.heatmap)
+
+        self.totals_label = QLabel()
+        self.totals_label.setWordWrap(True)
+        layout.addWidget(self.totals_label)
+
+    def period(self):
+        """Return the first and last day of the period shown"""
+        if self.period_combo.currentText() == "Week":
+            first = week_start(self.anchor)
+            return first, first + timedelta(days=6)
+        first = self.anchor.replace(day=1)
+        following = (first + timedelta(days=32)).replace(day=1)
+        return first, following - timedelta(days=1)
+
+    def step(self, direction):
+        first, last = self.period()
+        self.anchor = last + timedelta(days=1) if direction > 0 else first - timedelta(days=1)
+        self.refresh()
+
+    def show_today(self):
+        self.anchor = date.today()
+        self.refresh()
+
+    def refresh(self):
+        """Reload the period shown from the history"""
+        first, last = self.period()
+        days = self.history.days(first, last) if self.history is not None else {}
+        state = self.state_combo.currentIndex()
+
+        rows = []
+        day = first
+        while day <= last:
+            bitmap = days[day][state] if day in days else 0
+            label = day.strftime("%a %d") if self.period_combo.currentText() == "Week" else day.strftime("%d %a")
+            rows.append((label, hourly_minutes(bitmap), minutes(bitmap)))
+            day += timedelta(days=1)
+        self.heatmap.set_rows(rows, STATE_COLORS[state])
+
+        if self.period_combo.currentText() == "Week":
+            self.period_label.setText(f"{first.strftime('%d %b')} - {last.strftime('%d %b %Y')}")
+        else:
+            self.period_label.setText(first.strftime("%B %Y"))
+        summed = totals(days)
+        recorded = len(days)
+        parts = [f"{name}: {total / 60:.1f} h" for name, total in zip(STATE_NAMES, summed)]
+        if recorded:
+            parts.append(f"{summed[0] / 60 / recorded:.1f} h kept awake per recorded day ({recorded} days)")
+        self.totals_label.setText("; ".join(parts))
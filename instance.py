@@ -0,0 +1,299 @@
+"""
+Single-instance enforcement and the command line control client.
+
+The first Stay Awake instance takes an exclusive lock on ~/.stay_awake.lock and
+serves control requests on a localhost socket. The port and a random access token
+are published in ~/.stay_awake_instance.json, which only the current user can read.
+Later invocations such as `stay_awake.py --toggle` or `--status --json` send one
+request to the running instance and exit.
+
+This module is imported before Qt by stay_awake.py, so it must stay free of Qt,
+psutil and win32 imports to keep the client fast.
+"""
+import os
+import sys
+import json
+import socket
+
+LOCK_FILE = os.path.join(os.path.expanduser("~"), ".stay_awake.lock")
+INSTANCE_FILE = os.path.join(os.path.expanduser("~"), ".stay_awake_instance.json")
+
+# Command line flags handled by talking to the running instance
+CONTROL_FLAGS = {"--toggle", "--activate", "--deactivate", "--status", "--watch-pid", "--unwatch-pid"}
+
+# Seconds to wait for the running instance to answer
+CLIENT_TIMEOUT = 5.0
+
+
+def is_control_command(argv):
+    """Check if the command line holds a control flag, also written as --flag=value"""
+    return any(arg.partition("=")[0] in CONTROL_FLAGS for arg in argv)
+
+
+class InstanceLock:
+    """Exclusive lock held by the first instance for its whole lifetime"""
+
+    def __init__(self, path=LOCK_FILE):
+        self.path = path
+        self._file = None
+
+    def acquire(self):
+        """Try to become the running instance, returns False if another one is"""
+        handle = open(self.path, "a+")
+        try:
+            if os.name == "nt":
+                import msvcrt
+                handle.seek(0)
+                msvcrt.locking(handle.fileno(), msvcrt.LK_NBLCK, 1)
+            else:
+                import fcntl
+                fcntl.flock(handle.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            handle.close()
+            return False
+        self._file = handle
+        return True
+
+    def release(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+def read_instance_info(path=INSTANCE_FILE):
+    """Return the published {"port": ..., "token": ...} of the running instance, or None"""
+    try:
+        with open(path, "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def write_instance_info(info, path=INSTANCE_FILE):
+    """Publish the port and token of this instance, readable by the current user only"""
+    temp_path = path + ".tmp"
+    fd = os.open(temp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, "w") as f:
+        json.dump(info, f)
+    os.replace(temp_path, path)
+
+
+def send_request(request, timeout=CLIENT_TIMEOUT, path=INSTANCE_FILE):
+    """Send one request to the running instance and return its response
+
+    Raises ConnectionError if no instance is running.
+    """
+    info = read_instance_info(path)
+    if not info:
+        raise ConnectionError("Stay Awake is not running")
+    message = dict(request, token=info["token"])
+    try:
+        with socket.create_connection(("127.0.0.1", info["port"]), timeout=timeout) as sock:
+            sock.sendall(json.dumps(message).encode("utf-8") + b"\n")
+            data = b""
+            while not data.endswith(b"\n"):
+                chunk = sock.recv(65536)
+                if not chunk:
+                    break
+                data += chunk
+    except OSError as e:
+        raise ConnectionError(f"Stay Awake is not running ({str(e)})")
+    if not data:
+        raise ConnectionError("The running instance closed the connection")
+    return json.loads(data.decode("utf-8"))
+
+
+def call_method(method, params=None, timeout=CLIENT_TIMEOUT, path=INSTANCE_FILE):
+    """Call a JSON-RPC method of the running instance and return its result
+
+    Raises ConnectionError if no instance is running and RuntimeError if the
+    call fails.
+    """
+    response = send_request({"jsonrpc": "2.0", "id": 1, "method": method, "params": params or {}},
+                            timeout, path)
+    if "error" in response:
+        raise RuntimeError(response["error"].get("message", "unknown error"))
+    return response.get("result")
+
+
+def format_status(status):
+    """Format a status response for people"""
+    lines = [f"Stay Awake is {'ON' if status.get('active') else 'OFF'}"]
+    if status.get("active"):
+        if status.get("keeping_awake"):
+            lines.append("Currently keeping the computer awake")
+        else:
+            lines.append("Currently idle")
+        if status.get("reason"):
+            lines.append(f"Reason: {status['reason']}")
+    return "\n".join(lines)
+
+
+def run_client(argv):
+    """Handle the control flags of the command line, returns the exit code"""
+    import argparse
+
+    parser = argparse.ArgumentParser(prog="stay_awake.py", description="Control the running Stay Awake instance")
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument("--toggle", action="store_true", help="Turn Stay Awake on or off")
+    group.add_argument("--activate", action="store_true", help="Turn Stay Awake on")
+    group.add_argument("--deactivate", action="store_true", help="Turn Stay Awake off")
+    group.add_argument("--status", action="store_true", help="Show the current status")
+    group.add_argument("--watch-pid", type=int, metavar="PID",
+                       help="Stay awake while a process, or anything it starts, is running")
+    group.add_argument("--unwatch-pid", type=int, metavar="PID", help="Stop watching a process")
+    parser.add_argument("--json", action="store_true", help="Print the status as JSON")
+    args = parser.parse_args(argv)
+
+    if args.watch_pid is not None or args.unwatch_pid is not None:
+        return _run_watch_client(args)
+
+    if args.toggle:
+        command = "toggle"
+    elif args.activate:
+        command = "activate"
+    elif args.deactivate:
+        command = "deactivate"
+    else:
+        command = "status"
+
+    try:
+        response = send_request({"command": command})
+    except ConnectionError as e:
+        if args.json:
+            print(json.dumps({"ok": False, "error": str(e)}))
+        else:
+            print(str(e), file=sys.stderr)
+        return 1
+
+    if not response.get("ok"):
+        if args.json:
+            print(json.dumps(response))
+        else:
+            print(f"Error: {response.get('error', 'unknown error')}", file=sys.stderr)
+        return 1
+
+    status = response.get("status", {})
+    if args.json:
+        print(json.dumps(status))
+    else:
+        print(format_status(status))
+    return 0
+
+
+def _run_watch_client(args):
+    if args.watch_pid is not None:
+        method, pid = "process_holds.watch", args.watch_pid
+    else:
+        method, pid = "process_holds.unwatch", args.unwatch_pid
+    try:
+        result = call_method(method, {"pid": pid})
+    except (ConnectionError, RuntimeError) as e:
+        if args.json:
+            print(json.dumps({"ok": False, "error": str(e)}))
+        else:
+            print(str(e), file=sys.stderr)
+        return 1
+    if args.json:
+        print(json.dumps(result))
+        return 0
+    if args.watch_pid is not None:
+        print(f"Keeping the computer awake while process {pid} or anything it starts is running")
+    else:
+        print(f"No longer watching process {pid}")
+    if not result.get("enabled"):
+        print("Process holds are turned off in Stay Awake; watches apply once they are turned on",
+              file=sys.stderr)
+    return 0
+
+
+class InstanceServer:
+    """Serves control requests for the running instance on a localhost socket
+
+    Each connection carries JSON lines. handler(request) is called on a worker
+    thread of the server and returns the response dict.
+    """
+
+    def __init__(self, handler, path=INSTANCE_FILE):
+        # Imported here so the command line client does not pay for them
+        import secrets
+        import threading
+
+        self.handler = handler
+        self.path = path
+        self.token = secrets.token_hex(16)
+        self.port = None
+        self.loop = None
+        self._server = None
+        self._thread = None
+        self._started = threading.Event()
+
+    def start(self):
+        """Start serving in a background thread and publish the instance file"""
+        import threading
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        self._started.wait(timeout=5.0)
+        if self.port is None:
+            raise OSError("Could not start the control server")
+        write_instance_info({"port": self.port, "token": self.token, "pid": os.getpid()}, self.path)
+
+    def _run(self):
+        import asyncio
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        try:
+            self._server = self.loop.run_until_complete(
+                asyncio.start_server(self._handle_client, "127.0.0.1", 0))
+            self.port = self._server.sockets[0].getsockname()[1]
+        finally:
+            self._started.set()
+        try:
+            self.loop.run_forever()
+        finally:
+            self._server.close()
+            self.loop.run_until_complete(self._server.wait_closed())
+            self.loop.close()
+
+    async def _handle_client(self, reader, writer):
+        import asyncio
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                response = await self.handle_line(line)
+                writer.write(json.dumps(response).encode("utf-8") + b"\n")
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def handle_line(self, line):
+        """Parse, authenticate and dispatch one request line"""
+        import secrets
+        try:
+            request = json.loads(line.decode("utf-8"))
+        except ValueError:
+            return {"ok": False, "error": "Invalid JSON"}
+        if not isinstance(request, dict) or not secrets.compare_digest(str(request.get("token", "")), self.token):
+            return {"ok": False, "error": "Invalid token"}
+        try:
+            return await self.loop.run_in_executor(None, self.handler, request)
+        except Exception as e:
+            return {"ok": False, "error": str(e)}
+
+    def stop(self):
+        """Stop serving and remove the instance file"""
+        if self.loop is not None and self.loop.is_running():
+            self.loop.call_soon_threadsafe(self.loop.stop)
+        if self._thread is not None:
+            self._thread.join(timeout=2.0)
+            self._thread = None
+        try:
+            info = read_instance_info(self.path)
+            if info and info.get("token") == self.token:
+                os.remove(self.path)
+        except OSError:
+            pass
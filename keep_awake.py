@@ -0,0 +1,290 @@
+"""
+Keeps the machine awake for a while without the GUI: for the lifetime of a command,
+or while Python code holds it.
+
+    stay_awake.py run -- make -j8
+    python keep_awake.py -- make -j8
+
+    import keep_awake
+
+    with keep_awake.hold(reason="copying backups"):
+        ...
+
+    @keep_awake.hold(reason="nightly export")
+    def export():
+        ...
+
+Holds are counted across all threads of a process: one KeepAwake runs while
+at least one hold is active, and stops when the last one ends. Holds nest and
+may be entered from many threads at once; the reasons of the active holds are
+what the app shows as the reason for keeping the computer awake.
+
+If the Stay Awake app is running, KeepAwake takes a lease on it over the control
+server and renews it while it is needed, so the app shows why the computer is
+kept awake and applies its own rules (such as a nearly empty battery). A lease
+that is not renewed, because this process was killed, expires on its own.
+
+Without a running app it holds an OS power inhibit (SetThreadExecutionState on
+Windows, systemd-inhibit on Linux) instead. If the app goes away while a lease
+is held, KeepAwake switches to the inhibit.
+
+This module is imported before Qt, psutil or win32, which keeps prefixing a
+command with `stay_awake.py run --` cheap; the inhibit is only imported when it
+is needed.
+"""
+import os
+import sys
+import atexit
+import functools
+import threading
+
+from instance import call_method
+
+LEASE_SECONDS = 120  # Lease duration; renewed every RENEW_INTERVAL seconds
+RENEW_INTERVAL = 30
+START_TIMEOUT = 10.0  # Seconds start() waits for the lease or the inhibit
+
+
+class KeepAwake:
+    """Keeps the machine awake from start() until stop()
+
+    A background thread owns the lease or the inhibit: the Windows inhibit is per
+    thread, so it has to be taken and dropped by the same thread.
+    """
+
+    def __init__(self, reason=""):
+        self.reason = reason
+        self.mode = None  # "lease" while the app holds a lease for us, "inhibit" for an OS inhibit
+        self.lease = None  # Id of the lease held on the running app
+        self._inhibitor = None
+        self._stop = threading.Event()
+        self._wake = threading.Event()  # Set to renew right away, e.g. with a new reason
+        self._ready = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """Start keeping the machine awake, returns the mode once it is in effect"""
+        if self._thread is not None:
+            return self.mode
+        self._stop.clear()
+        self._ready.clear()
+        self._thread = threading.Thread(target=self._run, name="keep-awake", daemon=True)
+        self._thread.start()
+        self._ready.wait(START_TIMEOUT)
+        return self.mode
+
+    def stop(self):
+        """Stop keeping the machine awake"""
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._wake.set()
+        self._thread.join()
+        self._thread = None
+
+    def set_reason(self, reason):
+        """Change the reason shown in the app, without waiting for it"""
+        self.reason = reason
+        self._wake.set()
+
+    def _acquire_lease(self):
+        try:
+            result = call_method("lease.acquire", {"seconds": LEASE_SECONDS, "reason": self.reason,
+                                                   "owner": f"pid {os.getpid()}"})
+        except (ConnectionError, RuntimeError):
+            return False
+        self.lease = result["lease"]
+        self.mode = "lease"
+        return True
+
+    def _renew_lease(self):
+        try:
+            call_method("lease.renew", {"lease": self.lease, "seconds": LEASE_SECONDS, "reason": self.reason})
+            return True
+        except RuntimeError:
+            # The app restarted or dropped the lease; take a new one
+            return self._acquire_lease()
+        except ConnectionError:
+            self.lease = None
+            return False
+
+    def _acquire_inhibit(self):
+        if self._inhibitor is None:
+            from power_policy import PowerInhibitor
+            self._inhibitor = PowerInhibitor(self.reason or "Stay Awake")
+        if self._inhibitor.acquire():
+            self.mode = "inhibit"
+        else:
+            self.mode = None
+            print("Stay Awake is not running and this system offers no power inhibit; "
+                  "the computer may still sleep", file=sys.stderr)
+
+    def _run(self):
+        try:
+            if not self._acquire_lease():
+                self._acquire_inhibit()
+            self._ready.set()
+            while True:
+                self._wake.wait(RENEW_INTERVAL)
+                self._wake.clear()
+                if self._stop.is_set():
+                    break
+                if self.mode == "lease" and not self._renew_lease():
+                    print("Lost the connection to Stay Awake, holding a power inhibit instead", file=sys.stderr)
+                    self._acquire_inhibit()
+        finally:
+            self._ready.set()
+            if self.lease is not None:
+                try:
+                    call_method("lease.release", {"lease": self.lease})
+                except (ConnectionError, RuntimeError):
+                    pass  # The lease expires on its own
+                self.lease = None
+            if self._inhibitor is not None:
+                self._inhibitor.release()
+            self.mode = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop()
+        return False
+
+
+class _Holds:
+    """Process-wide count of active holds, keeping one KeepAwake running while it is above zero"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reasons = {}  # reason -> number of active holds with it
+        self.engine = None
+
+    def _reason(self):
+        named = sorted(reason for reason in self.reasons if reason)
+        return ", ".join(named) if named else f"{os.path.basename(sys.argv[0] or 'python')} (pid {os.getpid()})"
+
+    def acquire(self, reason):
+        # Start the engine under the lock so every hold returns with the machine kept awake
+        with self._lock:
+            self.reasons[reason] = self.reasons.get(reason, 0) + 1
+            if self.engine is None:
+                self.engine = KeepAwake(self._reason())
+                self.engine.start()
+            elif self.reasons[reason] == 1:
+                self.engine.set_reason(self._reason())
+
+    def release(self, reason):
+        with self._lock:
+            count = self.reasons.get(reason, 0) - 1
+            if count < 0:
+                return
+            if count:
+                self.reasons[reason] = count
+                return
+            del self.reasons[reason]
+            if not self.reasons:
+                engine, self.engine = self.engine, None
+                engine.stop()
+            else:
+                self.engine.set_reason(self._reason())
+
+    def count(self):
+        with self._lock:
+            return sum(self.reasons.values())
+
+    def release_all(self):
+        """Stop the engine, e.g. when the interpreter exits with holds still active"""
+        with self._lock:
+            self.reasons.clear()
+            engine, self.engine = self.engine, None
+        if engine is not None:
+            engine.stop()
+
+
+_holds = _Holds()
+atexit.register(_holds.release_all)
+
+
+class hold:
+    """Keeps the machine awake while active; a context manager and a decorator
+
+    A hold has no state of its own, so one hold (such as a decorated function)
+    can be entered by many threads at once, and holds nest.
+    """
+
+    def __init__(self, reason=""):
+        self.reason = str(reason)
+
+    def __enter__(self):
+        _holds.acquire(self.reason)
+        return self
+
+    def __exit__(self, *exc_info):
+        _holds.release(self.reason)
+        return False
+
+    def __call__(self, function):
+        @functools.wraps(function)
+        def held(*args, **kwargs):
+            with self:
+                return function(*args, **kwargs)
+        return held
+
+
+def active_holds():
+    """Return the number of holds currently active in this process"""
+    return _holds.count()
+
+
+def run(command, reason=None, verbose=False):
+    """Run a command while keeping the machine awake, returns its exit code"""
+    import signal
+    import subprocess
+
+    with KeepAwake(reason or f"run: {' '.join(command)}"[:200]) as keep_awake:
+        if verbose:
+            methods = {"lease": "a lease on the running Stay Awake", "inhibit": "an OS power inhibit"}
+            print(f"Keeping the computer awake with {methods.get(keep_awake.mode, 'nothing')}", file=sys.stderr)
+        try:
+            process = subprocess.Popen(command)
+        except FileNotFoundError:
+            print(f"Command not found: {command[0]}", file=sys.stderr)
+            return 127
+        except PermissionError:
+            print(f"Permission denied: {command[0]}", file=sys.stderr)
+            return 126
+        # Ctrl+C reaches the command too; wait for it to finish before letting go
+        previous = signal.signal(signal.SIGINT, signal.SIG_IGN)
+        try:
+            returncode = process.wait()
+        finally:
+            signal.signal(signal.SIGINT, previous)
+    if returncode < 0:
+        # Killed by a signal, reported the way shells do
+        return 128 - returncode
+    return returncode
+
+
+def main(argv):
+    """Handle `run [--reason TEXT] [--verbose] -- COMMAND ...`, returns the exit code"""
+    import argparse
+
+    if "--" in argv:
+        split = argv.index("--")
+        options, command = argv[:split], argv[split + 1:]
+    else:
+        options, command = [], argv
+    parser = argparse.ArgumentParser(prog="stay_awake.py run",
+                                     description="Keep the computer awake while a command runs")
+    parser.add_argument("--reason", help="Reason shown in Stay Awake (default: the command)")
+    parser.add_argument("--verbose", action="store_true", help="Report how the computer is kept awake")
+    args = parser.parse_args(options)
+    if not command:
+        parser.error("no command given, e.g. stay_awake.py run -- make")
+    return run(command, args.reason, args.verbose)
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
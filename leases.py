@@ -0,0 +1,140 @@
+"""
+Time-limited "stay awake" leases taken by scripts over the control server.
+
+Leases live in a dict keyed by lease id, with their deadlines in a min-heap so the
+next expiry is always at the top. Releasing or renewing a lease leaves its old
+heap entry behind; stale entries are recognised by a deadline that no longer
+matches the lease and are dropped when they reach the top.
+"""
+import heapq
+import itertools
+import threading
+import time
+
+
+class Lease:
+    """A request to keep the machine awake until a deadline"""
+
+    def __init__(self, lease_id, deadline, reason, owner=None):
+        self.id = lease_id
+        self.deadline = deadline
+        self.reason = reason
+        self.owner = owner
+
+    def to_dict(self, now):
+        return {
+            "lease": self.id,
+            "reason": self.reason,
+            "owner": self.owner,
+            "remaining": max(0.0, self.deadline - now)
+        }
+
+
+class LeaseTable:
+    """Active leases with a deadline heap for automatic expiry"""
+
+    MAX_DURATION = 24 * 3600  # Longest lease in seconds, renew to keep it longer
+
+    def __init__(self, clock=time.monotonic):
+        self.clock = clock
+        self.leases = {}       # lease id -> Lease
+        self._heap = []        # (deadline, lease id), may hold stale entries
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self.listeners = []    # Called with no arguments when the set of leases changes
+
+    def __len__(self):
+        return len(self.leases)
+
+    def is_held(self):
+        """Check if any lease is currently held"""
+        return bool(self.leases)
+
+    def acquire(self, seconds, reason="", owner=None):
+        """Take a new lease for a number of seconds and return it"""
+        seconds = self._duration(seconds)
+        with self._lock:
+            lease = Lease(next(self._ids), self.clock() + seconds, reason, owner)
+            self.leases[lease.id] = lease
+            heapq.heappush(self._heap, (lease.deadline, lease.id))
+        self._notify()
+        return lease
+
+    def renew(self, lease_id, seconds, reason=None):
+        """Extend a lease to end the given number of seconds from now, optionally with a new reason"""
+        seconds = self._duration(seconds)
+        with self._lock:
+            lease = self.leases.get(lease_id)
+            if lease is None:
+                raise KeyError(lease_id)
+            lease.deadline = self.clock() + seconds
+            heapq.heappush(self._heap, (lease.deadline, lease.id))
+            changed = reason is not None and reason != lease.reason
+            if changed:
+                lease.reason = reason
+        if changed:
+            self._notify()
+        return lease
+
+    def release(self, lease_id):
+        """Drop a lease before it expires, returns False if it was not held"""
+        with self._lock:
+            lease = self.leases.pop(lease_id, None)
+        if lease is None:
+            return False
+        self._notify()
+        return True
+
+    def expire(self):
+        """Drop all leases past their deadline, returns the expired leases"""
+        now = self.clock()
+        expired = []
+        with self._lock:
+            while self._heap and self._heap[0][0] <= now:
+                deadline, lease_id = heapq.heappop(self._heap)
+                lease = self.leases.get(lease_id)
+                if lease is not None and lease.deadline == deadline:
+                    del self.leases[lease_id]
+                    expired.append(lease)
+        if expired:
+            self._notify()
+        return expired
+
+    def next_deadline(self):
+        """Return the earliest deadline of a held lease, or None"""
+        with self._lock:
+            # Drop stale entries of released and renewed leases from the top
+            while self._heap:
+                deadline, lease_id = self._heap[0]
+                lease = self.leases.get(lease_id)
+                if lease is not None and lease.deadline == deadline:
+                    return deadline
+                heapq.heappop(self._heap)
+        return None
+
+    def snapshot(self):
+        """Return the held leases as JSON serializable dicts"""
+        now = self.clock()
+        with self._lock:
+            leases = sorted(self.leases.values(), key=lambda lease: lease.deadline)
+        return [lease.to_dict(now) for lease in leases]
+
+    def describe(self):
+        with self._lock:
+            reasons = [lease.reason for lease in self.leases.values() if lease.reason]
+        if reasons:
+            return f"Lease held ({', '.join(sorted(set(reasons)))})"
+        return f"Lease held ({len(self.leases)} active)"
+
+    def _duration(self, seconds):
+        seconds = float(seconds)
+        if not 0 < seconds <= self.MAX_DURATION:
+            raise ValueError(f"Lease duration must be between 0 and {self.MAX_DURATION} seconds")
+        return seconds
+
+    def _notify(self):
+        for listener in self.listeners:
+            try:
+                listener()
+            except Exception as e:
+                print(f"Error in lease listener: {str(e)}")
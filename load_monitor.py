@@ -0,0 +1,131 @@
+"""
+Keeps the machine awake while the system is busy, e.g. during long builds or renders.
+
+CPU and disk load are sampled as deltas of the cumulative psutil.cpu_times and
+psutil.disk_io_counters counters, which are cheap to read. The raw rates are smoothed
+with an exponentially weighted moving average, and separate high and low thresholds
+(hysteresis) keep the busy state from flapping around a single threshold.
+"""
+import math
+import time
+
+import psutil
+
+from monitor_defaults import DEFAULT_LOAD_SETTINGS
+
+
+class PsutilLoadSource:
+    """Reads cumulative CPU and disk counters from psutil"""
+
+    def read(self):
+        """Return (cpu busy seconds, cpu total seconds, disk bytes transferred)"""
+        cpu = psutil.cpu_times()
+        total = sum(cpu)
+        # iowait is time the CPU had nothing to do, so do not count it as busy
+        idle = cpu.idle + getattr(cpu, "iowait", 0.0)
+        try:
+            disk = psutil.disk_io_counters()
+            disk_bytes = disk.read_bytes + disk.write_bytes if disk else 0
+        except Exception:
+            disk_bytes = 0
+        return total - idle, total, disk_bytes
+
+
+class FakeLoadSource:
+    """Load source with counters advanced by hand, for tests and simulations"""
+
+    def __init__(self):
+        self.busy = 0.0
+        self.total = 0.0
+        self.disk_bytes = 0
+
+    def advance(self, seconds, cpu_percent=0.0, disk_mb_per_second=0.0):
+        """Pretend the given load was present for the given number of seconds"""
+        self.total += seconds
+        self.busy += seconds * cpu_percent / 100.0
+        self.disk_bytes += int(seconds * disk_mb_per_second * 1024 * 1024)
+
+    def read(self):
+        return self.busy, self.total, self.disk_bytes
+
+
+class LoadMonitor:
+    """Smoothed CPU and disk load with hysteresis thresholds"""
+
+    def __init__(self, settings=None, source=None, clock=time.monotonic):
+        self.settings = dict(DEFAULT_LOAD_SETTINGS)
+        self.settings.update(settings or {})
+        self.source = source or PsutilLoadSource()
+        self.clock = clock
+        self.cpu_percent = 0.0  # Smoothed CPU busy percentage
+        self.disk_rate = 0.0    # Smoothed disk MB/s
+        self.busy = False
+        self._last = None       # (timestamp, busy seconds, total seconds, disk bytes)
+        # Overhead accounting for the sampling itself
+        self.sample_count = 0
+        self.sample_time = 0.0  # Seconds of CPU time spent sampling
+        self._started = None
+
+    def configure(self, settings):
+        """Apply new thresholds without losing the smoothed history"""
+        self.settings.update(settings or {})
+
+    def reset(self):
+        """Forget the sampling history"""
+        self._last = None
+        self.cpu_percent = 0.0
+        self.disk_rate = 0.0
+        self.busy = False
+
+    def sample(self):
+        """Take one sample and update the smoothed load, returns the busy state"""
+        started = time.thread_time()
+        now = self.clock()
+        busy_seconds, total_seconds, disk_bytes = self.source.read()
+
+        if self._last is None:
+            # The first sample only establishes the baseline for the deltas
+            self._last = (now, busy_seconds, total_seconds, disk_bytes)
+            self._started = now
+        else:
+            last_time, last_busy, last_total, last_disk = self._last
+            elapsed = now - last_time
+            if elapsed > 0:
+                total_delta = total_seconds - last_total
+                cpu = 100.0 * (busy_seconds - last_busy) / total_delta if total_delta > 0 else 0.0
+                disk = max(0, disk_bytes - last_disk) / (1024 * 1024) / elapsed
+
+                # Irregular sampling is fine: the weight depends on the elapsed time
+                alpha = 1.0 - math.exp(-elapsed / max(self.settings["smoothing"], 1e-6))
+                self.cpu_percent += alpha * (cpu - self.cpu_percent)
+                self.disk_rate += alpha * (disk - self.disk_rate)
+                self._last = (now, busy_seconds, total_seconds, disk_bytes)
+                self._update_state()
+
+        self.sample_count += 1
+        self.sample_time += time.thread_time() - started
+        return self.busy
+
+    def maybe_sample(self):
+        """Take a sample if the sampling interval has elapsed since the last one"""
+        if self._last is None or self.clock() - self._last[0] >= self.settings["interval"]:
+            return self.sample()
+        return self.busy
+
+    def _update_state(self):
+        if self.busy:
+            # Stay busy until both CPU and disk fall below their low thresholds
+            if self.cpu_percent < self.settings["cpu_low"] and self.disk_rate < self.settings["disk_low"]:
+                self.busy = False
+        else:
+            if self.cpu_percent >= self.settings["cpu_high"] or self.disk_rate >= self.settings["disk_high"]:
+                self.busy = True
+
+    def overhead(self):
+        """Return the fraction of one CPU spent sampling since the first sample"""
+        if self._started is None:
+            return 0.0
+        elapsed = self.clock() - self._started
+        if elapsed <= 0:
+            return 0.0
+        return self.sample_time / elapsed
@@ -0,0 +1,727 @@
+"""
+Keeps the machine awake during meetings read from a local iCalendar (.ics) file.
+
+Another tool exports or syncs the calendar to a file; this module only reads it.
+The file is streamed line by line and cut into VEVENT blocks. Each block is
+keyed by a digest of its text, so when the file changes only new or edited
+events are parsed again and everything else is reused from the previous read.
+Unchanged files are not read at all (their size and mtime are checked first).
+
+Recurring events (RRULE with DAILY, WEEKLY, MONTHLY or YEARLY frequency,
+INTERVAL, COUNT, UNTIL, BYDAY, BYMONTHDAY, BYMONTH, BYHOUR, BYMINUTE and
+BYSETPOS, plus EXDATE, RDATE and moved or cancelled instances via RECURRENCE-ID)
+are expanded over a rolling window of the next few days only. The occurrences, padded by a few
+minutes before and after, go into an IntervalTree, so "in a meeting now?" and
+"when does that change?" are O(log n) queries however large the calendar is.
+The window rolls forward once a day by re-expanding the cached events, without
+touching the file.
+
+Events with other rule parts (BYWEEKNO, BYYEARDAY, BYSECOND) or out of range
+values (e.g. BYMONTH=13) are skipped with a warning rather than expanded wrongly. Cancelled events, events marked free (TRANSP:TRANSPARENT) and all-day events
+are ignored unless configured otherwise.
+
+    python meeting_calendar.py calendar.ics [--days 14] [--count 10]
+"""
+import os
+import sys
+import time
+import hashlib
+import argparse
+from bisect import bisect_right
+from calendar import monthrange
+from datetime import date, datetime, timedelta, timezone
+
+try:
+    from zoneinfo import ZoneInfo
+except ImportError:  # Python < 3.9: TZID times are read as local time
+    ZoneInfo = None
+
+from monitor_defaults import DEFAULT_CALENDAR_SETTINGS
+
+ROLL_INTERVAL = 86400  # Seconds between re-expansions of the rolling window
+MAX_PERIODS = 100000   # Recurrence periods examined per event, guards against rules that never match
+
+WEEKDAYS = {"MO": 0, "TU": 1, "WE": 2, "TH": 3, "FR": 4, "SA": 5, "SU": 6}
+FREQUENCIES = ("DAILY", "WEEKLY", "MONTHLY", "YEARLY")
+UNSUPPORTED_PARTS = ("BYWEEKNO", "BYYEARDAY", "BYSECOND")
+
+
+class IntervalTree:
+    """Static interval tree over half-open [start, end) intervals
+
+    The intervals are sorted by start and viewed as an implicit balanced binary
+    tree (the middle of each range is its root). Every node stores the largest
+    end in its subtree, so a query skips whole subtrees that end too early and
+    all subtrees that start too late.
+    """
+
+    def __init__(self, intervals):
+        intervals = sorted(intervals, key=lambda item: (item[0], item[1]))
+        self.starts = [item[0] for item in intervals]
+        self.ends = [item[1] for item in intervals]
+        self.items = [item[2] for item in intervals]
+        self.max_end = list(self.ends)
+        self._build(0, len(intervals))
+
+    def _build(self, low, high):
+        if low >= high:
+            return float("-inf")
+        middle = (low + high) // 2
+        self.max_end[middle] = max(self.ends[middle], self._build(low, middle), self._build(middle + 1, high))
+        return self.max_end[middle]
+
+    def __len__(self):
+        return len(self.starts)
+
+    def at(self, point):
+        """Return the indices of the intervals containing a point"""
+        result = []
+        pending = [(0, len(self.starts))]
+        while pending:
+            low, high = pending.pop()
+            if low >= high:
+                continue
+            middle = (low + high) // 2
+            if self.max_end[middle] <= point:
+                continue
+            pending.append((low, middle))
+            if self.starts[middle] <= point:
+                if self.ends[middle] > point:
+                    result.append(middle)
+                pending.append((middle + 1, high))
+        return result
+
+    def next_start(self, point):
+        """Return the first interval start after a point, or None"""
+        index = bisect_right(self.starts, point)
+        return self.starts[index] if index < len(self.starts) else None
+
+    def covered_until(self, point):
+        """Return when the chain of intervals covering a point ends, or None if none covers it"""
+        end = None
+        found = self.at(point)
+        while found:
+            end = max(self.ends[index] for index in found)
+            # Back-to-back or overlapping intervals continue the covered stretch
+            found = self.at(end)
+        return end
+
+
+# Parsing
+
+def _unfold(lines):
+    """Yield logical content lines, joining folded continuation lines"""
+    pending = None
+    for line in lines:
+        line = line.rstrip("\r\n")
+        if line[:1] in (" ", "\t"):
+            if pending is not None:
+                pending += line[1:]
+            continue
+        if pending is not None:
+            yield pending
+        pending = line
+    if pending:
+        yield pending
+
+
+def _split_property(line):
+    """Split "NAME;PARAM=VALUE:value" into (NAME, {PARAM: VALUE}, value)"""
+    index = line.find(":")
+    if '"' in line[:index]:
+        # A quoted parameter value may hold a colon
+        quoted = False
+        for index, char in enumerate(line):
+            if char == '"':
+                quoted = not quoted
+            elif char == ":" and not quoted:
+                break
+        else:
+            index = -1
+    if index < 0:
+        return line.upper(), {}, ""
+    head, value = line[:index], line[index + 1:]
+    if ";" not in head:
+        return head.upper(), {}, value
+    name, *params = head.split(";")
+    parameters = {}
+    for param in params:
+        key, _, param_value = param.partition("=")
+        parameters[key.upper()] = param_value.strip('"')
+    return name.upper(), parameters, value
+
+
+def iter_event_blocks(lines):
+    """Yield the content lines of each VEVENT in an iCalendar stream
+
+    Only one event is held in memory at a time, so files of any size stream
+    through.
+    """
+    block = None
+    for line in _unfold(lines):
+        upper = line.upper()
+        if upper == "BEGIN:VEVENT":
+            block = []
+        elif upper == "END:VEVENT":
+            if block is not None:
+                yield block
+            block = None
+        elif block is not None:
+            # Alarms nested in the event are not needed
+            if upper.startswith("BEGIN:VALARM"):
+                block.append(None)
+            elif block and block[-1] is None:
+                if upper.startswith("END:VALARM"):
+                    block.pop()
+            else:
+                block.append(line)
+
+
+def _unescape(text):
+    return (text.replace("\\n", " ").replace("\\N", " ").replace("\\,", ",")
+            .replace("\\;", ";").replace("\\\\", "\\"))
+
+
+_zones = {}
+
+
+def _zone(tzid):
+    """Return the tzinfo for a TZID, None (local time) when it is unknown"""
+    if tzid not in _zones:
+        zone = None
+        if ZoneInfo is not None:
+            try:
+                zone = ZoneInfo(tzid.lstrip("/"))
+            except (ValueError, OSError, KeyError):
+                print(f"Unknown calendar time zone '{tzid}', using local time")
+        _zones[tzid] = zone
+    return _zones[tzid]
+
+
+def _parse_value(value, parameters):
+    """Parse a DATE or DATE-TIME value, returns (naive datetime, tzinfo, all day)"""
+    value = value.strip()
+    # Sliced by hand, strptime would dominate the time to read a large calendar
+    day = date(int(value[0:4]), int(value[4:6]), int(value[6:8]))
+    if parameters.get("VALUE") == "DATE" or len(value) == 8:
+        return datetime(day.year, day.month, day.day), None, True
+    if value[8:9] != "T" or len(value) < 15:
+        raise ValueError(f"Invalid date-time '{value}'")
+    moment = datetime(day.year, day.month, day.day, int(value[9:11]), int(value[11:13]), int(value[13:15]))
+    if value.endswith("Z"):
+        return moment, timezone.utc, False
+    tzid = parameters.get("TZID")
+    return moment, _zone(tzid) if tzid else None, False
+
+
+def _timestamp(moment, zone):
+    """Return the timestamp of a naive datetime in a time zone (None: local time)"""
+    return (moment.replace(tzinfo=zone) if zone is not None else moment).timestamp()
+
+
+def _to_zone(moment, zone, target):
+    """Return a naive datetime in one zone as a naive datetime in another"""
+    return datetime.fromtimestamp(_timestamp(moment, zone), target).replace(tzinfo=None)
+
+
+def _parse_duration(text):
+    """Parse an iCalendar DURATION such as PT1H30M or P1D"""
+    sign = -1 if text.startswith("-") else 1
+    text = text.lstrip("+-").lstrip("P")
+    total = timedelta()
+    number = ""
+    in_time = False
+    units = {"W": timedelta(weeks=1), "D": timedelta(days=1), "H": timedelta(hours=1),
+             "M": timedelta(minutes=1), "S": timedelta(seconds=1)}
+    for char in text:
+        if char == "T":
+            in_time = True
+        elif char.isdigit():
+            number += char
+        elif char in units and number:
+            if char == "M" and not in_time:
+                raise ValueError(f"Invalid duration '{text}'")
+            total += int(number) * units[char]
+            number = ""
+    return sign * total
+
+
+def _rule_numbers(parts, name, low, high, signed=False):
+    """Return the integers of a comma separated rule part, raises ValueError if one is out of range
+
+    Signed parts also take -high to -low, counting from the end.
+    """
+    numbers = [int(item) for item in filter(None, parts.get(name, "").split(","))]
+    for number in numbers:
+        if not (low <= number <= high or signed and -high <= number <= -low):
+            raise ValueError(f"Invalid {name} value {number}")
+    return numbers
+
+
+class RecurrenceRule:
+    """A parsed RRULE, raises ValueError for unsupported or out of range parts"""
+
+    def __init__(self, text, start, zone):
+        parts = dict(part.partition("=")[::2] for part in text.upper().split(";") if part)
+        self.frequency = parts.get("FREQ")
+        if self.frequency not in FREQUENCIES:
+            raise ValueError(f"Unsupported recurrence frequency '{self.frequency}'")
+        unsupported = [part for part in UNSUPPORTED_PARTS if part in parts]
+        if unsupported:
+            raise ValueError(f"Unsupported recurrence rule part {', '.join(unsupported)}")
+        self.interval = int(parts.get("INTERVAL", 1))
+        if self.interval < 1:
+            raise ValueError(f"Invalid INTERVAL value {self.interval}")
+        self.count = int(parts["COUNT"]) if "COUNT" in parts else None
+        if self.count is not None and self.count < 1:
+            raise ValueError(f"Invalid COUNT value {self.count}")
+        self.until = None  # Last possible start as a naive datetime in the event's zone
+        if "UNTIL" in parts:
+            until, until_zone, all_day = _parse_value(parts["UNTIL"], {})
+            if all_day:
+                self.until = until.replace(hour=23, minute=59, second=59)
+            elif until_zone is not None:
+                self.until = _to_zone(until, until_zone, zone)
+            else:
+                self.until = until
+        self.by_day = []
+        # Ordinals count weekdays within the month, or within the year for YEARLY without BYMONTH
+        max_ordinal = 53 if self.frequency == "YEARLY" and "BYMONTH" not in parts else 5
+        for item in filter(None, parts.get("BYDAY", "").split(",")):
+            if item[-2:] not in WEEKDAYS:
+                raise ValueError(f"Invalid BYDAY value {item}")
+            ordinal = int(item[:-2]) if item[:-2] not in ("", "+") else None
+            if ordinal is not None and not (1 <= abs(ordinal) <= max_ordinal):
+                raise ValueError(f"Invalid BYDAY value {item}")
+            self.by_day.append((ordinal, WEEKDAYS[item[-2:]]))
+        self.by_month_day = _rule_numbers(parts, "BYMONTHDAY", 1, 31, signed=True)
+        self.by_month = _rule_numbers(parts, "BYMONTH", 1, 12)
+        self.by_set_position = _rule_numbers(parts, "BYSETPOS", 1, 366, signed=True)
+        hours = _rule_numbers(parts, "BYHOUR", 0, 23) or [start.hour]
+        minutes = _rule_numbers(parts, "BYMINUTE", 0, 59) or [start.minute]
+        # Times of day of the occurrences on each matching date
+        self.times = sorted({start.time().replace(hour=hour, minute=minute) for hour in hours for minute in minutes})
+        self.start = start
+
+    def _month_days(self, year, month):
+        days_in_month = monthrange(year, month)[1]
+        month_days = None
+        if self.by_month_day:
+            month_days = set()
+            for day in self.by_month_day:
+                day = day if day > 0 else days_in_month + day + 1
+                if 1 <= day <= days_in_month:
+                    month_days.add(day)
+        weekday_days = None
+        if self.by_day:
+            weekday_days = set()
+            first_weekday = date(year, month, 1).weekday()
+            for ordinal, weekday in self.by_day:
+                matching = list(range(1 + (weekday - first_weekday) % 7, days_in_month + 1, 7))
+                if ordinal is None:
+                    weekday_days.update(matching)
+                elif -len(matching) <= ordinal <= len(matching) and ordinal:
+                    weekday_days.add(matching[ordinal - 1 if ordinal > 0 else ordinal])
+        if month_days is None and weekday_days is None:
+            return [self.start.day] if self.start.day <= days_in_month else []
+        if month_days is None or weekday_days is None:
+            days = month_days if weekday_days is None else weekday_days
+        else:
+            days = month_days & weekday_days
+        return sorted(days)
+
+    def _year_days(self, year):
+        """Return the dates of a year matching BYDAY, counting ordinals within the year"""
+        first = date(year, 1, 1)
+        days_in_year = (date(year + 1, 1, 1) - first).days
+        days = set()
+        for ordinal, weekday in self.by_day:
+            matching = list(range((weekday - first.weekday()) % 7, days_in_year, 7))
+            if ordinal is None:
+                days.update(matching)
+            elif -len(matching) <= ordinal <= len(matching) and ordinal:
+                days.add(matching[ordinal - 1 if ordinal > 0 else ordinal])
+        candidates = [first + timedelta(days=day) for day in sorted(days)]
+        if self.by_month_day:
+            candidates = [day for day in candidates if day in self._month_day_dates(day.year, day.month)]
+        return candidates
+
+    def _month_day_dates(self, year, month):
+        days_in_month = monthrange(year, month)[1]
+        return {date(year, month, day if day > 0 else days_in_month + day + 1)
+                for day in self.by_month_day if -days_in_month <= day <= days_in_month and day}
+
+    def _period(self, index):
+        """Return (first day of the period, candidate dates) of the index-th period"""
+        start = self.start.date()
+        step = index * self.interval
+        if self.frequency == "DAILY":
+            day = start + timedelta(days=step)
+            candidates = [day]
+            if self.by_day and day.weekday() not in {weekday for _, weekday in self.by_day}:
+                candidates = []
+            if self.by_month_day and day.day not in self.by_month_day:
+                candidates = []
+            anchor = day
+        elif self.frequency == "WEEKLY":
+            anchor = start - timedelta(days=start.weekday()) + timedelta(weeks=step)
+            weekdays = sorted({weekday for _, weekday in self.by_day}) or [start.weekday()]
+            candidates = [anchor + timedelta(days=weekday) for weekday in weekdays]
+        elif self.frequency == "MONTHLY":
+            months = start.month - 1 + step
+            year, month = start.year + months // 12, months % 12 + 1
+            anchor = date(year, month, 1)
+            candidates = [date(year, month, day) for day in self._month_days(year, month)]
+        else:
+            year = start.year + step
+            anchor = date(year, 1, 1)
+            candidates = []
+            if self.by_day and not self.by_month:
+                # Without BYMONTH, BYDAY ordinals count within the whole year
+                candidates = self._year_days(year)
+            # BYMONTHDAY without BYMONTH applies to every month
+            for month in self.by_month or ([] if self.by_day else range(1, 13) if self.by_month_day
+                                           else [start.month]):
+                if self.by_day or self.by_month_day:
+                    candidates.extend(date(year, month, day) for day in self._month_days(year, month))
+                elif start.day <= monthrange(year, month)[1]:
+                    candidates.append(date(year, month, start.day))
+        if self.by_month and self.frequency != "YEARLY":
+            candidates = [day for day in candidates if day.month in self.by_month]
+        candidates.sort()
+        if self.by_set_position and candidates:
+            candidates = sorted({candidates[position - 1 if position > 0 else position]
+                                 for position in self.by_set_position
+                                 if -len(candidates) <= position <= len(candidates) and position})
+        return anchor, candidates
+
+    def _first_period(self, first):
+        """Return the index of a period shortly before a date, when the periods can be skipped"""
+        if self.count is not None or first <= self.start.date():
+            return 0
+        start = self.start.date()
+        if self.frequency == "DAILY":
+            periods = (first - start).days
+        elif self.frequency == "WEEKLY":
+            periods = (first - start).days // 7
+        elif self.frequency == "MONTHLY":
+            periods = (first.year - start.year) * 12 + first.month - start.month
+        else:
+            periods = first.year - start.year
+        return max(0, periods // self.interval - 1)
+
+    def starts(self, first, last):
+        """Yield the naive starts from the first date up to the last date, in order"""
+        index = self._first_period(first)
+        seen = 0
+        for index in range(index, index + MAX_PERIODS):
+            anchor, candidates = self._period(index)
+            if anchor > last:
+                return
+            for day in candidates:
+                if day > last:
+                    return
+                for moment in (datetime.combine(day, moment) for moment in self.times):
+                    if moment < self.start:
+                        continue
+                    if self.until is not None and moment > self.until:
+                        return
+                    seen += 1
+                    if self.count is not None and seen > self.count:
+                        return
+                    yield moment
+
+
+class CalendarEvent:
+    """One VEVENT block"""
+
+    def __init__(self, block):
+        self.uid = None
+        self.summary = ""
+        self.start = None       # Naive datetime in zone
+        self.zone = None        # tzinfo, None for local time
+        self.all_day = False
+        self.duration = None    # timedelta
+        self.rule = None        # RecurrenceRule of a recurring event
+        self.extra_starts = []  # RDATE timestamps
+        self.excluded = set()   # EXDATE timestamps
+        self.recurrence_id = None  # Timestamp of the instance this event replaces
+        self.cancelled = False
+        self.free = False
+        end = None
+        rule_text = None
+        for line in block:
+            name, parameters, value = _split_property(line)
+            if name == "DTSTART":
+                self.start, self.zone, self.all_day = _parse_value(value, parameters)
+            elif name == "DTEND":
+                end = _parse_value(value, parameters)
+            elif name == "DURATION":
+                self.duration = _parse_duration(value)
+            elif name == "UID":
+                self.uid = value
+            elif name == "SUMMARY":
+                self.summary = _unescape(value)
+            elif name == "RRULE":
+                rule_text = value
+            elif name in ("EXDATE", "RDATE"):
+                target = self.excluded if name == "EXDATE" else None
+                for item in filter(None, value.split(",")):
+                    moment, zone, _ = _parse_value(item, parameters)
+                    if target is not None:
+                        target.add((moment, zone))
+                    else:
+                        self.extra_starts.append((moment, zone))
+            elif name == "RECURRENCE-ID":
+                self.recurrence_id = _parse_value(value, parameters)[:2]
+            elif name == "STATUS":
+                self.cancelled = value.upper() == "CANCELLED"
+            elif name == "TRANSP":
+                self.free = value.upper() == "TRANSPARENT"
+        if self.start is None:
+            raise ValueError("Event without DTSTART")
+        if self.duration is None:
+            if end is not None:
+                end_moment, end_zone, _ = end
+                self.duration = timedelta(seconds=_timestamp(end_moment, end_zone) -
+                                          _timestamp(self.start, self.zone))
+            else:
+                self.duration = timedelta(days=1) if self.all_day else timedelta()
+        # EXDATE, RDATE and RECURRENCE-ID values without a zone of their own use the event's
+        self.excluded = {_timestamp(moment, zone or self.zone) for moment, zone in self.excluded}
+        self.extra_starts = [_timestamp(moment, zone or self.zone) for moment, zone in self.extra_starts]
+        if self.recurrence_id is not None:
+            self.recurrence_id = _timestamp(self.recurrence_id[0], self.recurrence_id[1] or self.zone)
+        if rule_text is not None:
+            self.rule = RecurrenceRule(rule_text, self.start, self.zone)
+
+    def occurrences(self, first, last, excluded=()):
+        """Yield the (start, end) timestamps of occurrences overlapping [first, last)"""
+        length = self.duration.total_seconds()
+        if self.rule is None:
+            starts = [_timestamp(self.start, self.zone)] + self.extra_starts
+        else:
+            # A day of slack either side covers zone offsets and occurrences in progress
+            first_day = datetime.fromtimestamp(first - length, self.zone).date() - timedelta(days=1)
+            last_day = datetime.fromtimestamp(last, self.zone).date() + timedelta(days=1)
+            starts = [_timestamp(moment, self.zone) for moment in self.rule.starts(first_day, last_day)]
+            starts.extend(self.extra_starts)
+        for start in starts:
+            if start < last and start + length > first and start not in self.excluded and start not in excluded:
+                yield start, start + length
+
+
+# Calendar
+
+class MeetingCalendar:
+    """Meetings from an .ics file, indexed for the rule engine
+
+    maybe_reload() is called by the worker thread; the indexed occurrences are
+    replaced as a whole, so queries never see a half built index.
+    """
+
+    def __init__(self, settings=None, clock=time.time):
+        self.settings = dict(DEFAULT_CALENDAR_SETTINGS)
+        self.settings.update(settings or {})
+        self.clock = clock
+        self.events = {}        # Block digest -> CalendarEvent (None if the block could not be parsed)
+        self.tree = IntervalTree([])  # Padded occurrences; items are (start, end, event)
+        self.window = (0.0, 0.0)  # Timestamps covered by the tree
+        self.indexed_at = None  # When the tree was last built
+        self.parsed = 0         # Blocks parsed by the last reload
+        self.errors = 0         # Blocks that could not be parsed by the last reload
+        self._signature = None  # (mtime, size) of the file as last read
+        self._checked_at = None
+        self._stale = True
+
+    def configure(self, settings):
+        """Apply new settings; the file is read again on the next check"""
+        self.settings.update(settings or {})
+        self._stale = True
+
+    def reset(self):
+        """Forget the file, e.g. when the rule is turned off"""
+        self.events = {}
+        self.tree = IntervalTree([])
+        self.window = (0.0, 0.0)
+        self.indexed_at = None
+        self._signature = None
+        self._checked_at = None
+        self._stale = True
+
+    def maybe_reload(self):
+        """Read the file if it changed and roll the window forward, returns True if the index changed"""
+        now = self.clock()
+        if not self._stale and self._checked_at is not None \
+                and now - self._checked_at < self.settings["check_interval"]:
+            return False
+        self._checked_at = now
+        path = self.settings["path"]
+        try:
+            stat = os.stat(path) if path else None
+        except OSError:
+            stat = None
+        signature = (stat.st_mtime_ns, stat.st_size) if stat is not None else None
+        if signature != self._signature or self._stale:
+            self._stale = False
+            self._signature = signature
+            if signature is None:
+                if path:
+                    print(f"Calendar file {path} not found")
+                self.events = {}
+            else:
+                self.read(path)
+            self.index(now)
+            return True
+        if self.indexed_at is None or now >= self.indexed_at + ROLL_INTERVAL:
+            self.index(now)
+            return True
+        return False
+
+    def read(self, path):
+        """Stream the file, parsing only the events that are new or changed since the last read"""
+        previous = self.events
+        events = {}
+        self.parsed = 0
+        self.errors = 0
+        try:
+            with open(path, "r", encoding="utf-8-sig", errors="replace") as f:
+                for block in iter_event_blocks(f):
+                    digest = hashlib.sha1("\n".join(block).encode("utf-8")).digest()
+                    if digest in events:
+                        continue
+                    if digest in previous:
+                        events[digest] = previous[digest]
+                        continue
+                    self.parsed += 1
+                    try:
+                        events[digest] = CalendarEvent(block)
+                    except (ValueError, KeyError, IndexError) as e:
+                        self.errors += 1
+                        events[digest] = None
+                        if self.errors <= 5:
+                            print(f"Skipping calendar event: {str(e)}")
+        except OSError as e:
+            print(f"Error reading calendar {path}: {str(e)}")
+            return
+        self.events = events
+        print(f"Calendar {path}: {len(events)} events, {self.parsed} parsed, "
+              f"{len(events) - self.parsed} unchanged")
+
+    def _included(self, event):
+        return event is not None and not (event.all_day and not self.settings["all_day_events"]) \
+            and not (event.free and not self.settings["free_events"])
+
+    def index(self, now):
+        """Expand the events over the window starting now and rebuild the interval tree"""
+        first = now - 86400
+        last = now + self.settings["window_days"] * 86400
+        before = self.settings["before_minutes"] * 60
+        after = self.settings["after_minutes"] * 60
+
+        # Moved or cancelled instances of recurring events, per UID
+        replaced = {}
+        for event in self.events.values():
+            if event is not None and event.recurrence_id is not None:
+                replaced.setdefault(event.uid, set()).add(event.recurrence_id)
+
+        intervals = []
+        for digest, event in list(self.events.items()):
+            if not self._included(event) or event.cancelled:
+                continue
+            excluded = replaced.get(event.uid, ()) if event.recurrence_id is None else ()
+            try:
+                occurrences = [(start - before, end + after, event)
+                               for start, end in event.occurrences(first, last, excluded)]
+            except Exception as e:
+                # Skip the event from now on, like one that could not be parsed
+                print(f"Skipping calendar event {event.summary or event.uid}: {str(e)}")
+                self.events[digest] = None
+                continue
+            intervals.extend(occurrences)
+        self.tree = IntervalTree(intervals)
+        self.window = (first, last)
+        self.indexed_at = now
+
+    def current(self, now=None):
+        """Return the events in progress (including the padding) at a time"""
+        now = self.clock() if now is None else now
+        tree = self.tree
+        return [tree.items[index] for index in tree.at(now)]
+
+    def in_meeting(self, now=None):
+        now = self.clock() if now is None else now
+        return bool(self.tree.at(now))
+
+    def next_boundary(self, now=None):
+        """Return when being in a meeting next changes, or None if not within the window"""
+        now = self.clock() if now is None else now
+        tree = self.tree
+        end = tree.covered_until(now)
+        if end is not None:
+            return end
+        return tree.next_start(now)
+
+    def upcoming(self, now=None, count=10):
+        """Return up to count (start, end, event) padded occurrences in progress or starting after a time"""
+        now = self.clock() if now is None else now
+        tree = self.tree
+        result = [(tree.starts[index], tree.ends[index], tree.items[index]) for index in sorted(tree.at(now))]
+        index = bisect_right(tree.starts, now)
+        while len(result) < count and index < len(tree):
+            result.append((tree.starts[index], tree.ends[index], tree.items[index]))
+            index += 1
+        return result[:count]
+
+    def describe(self, now=None):
+        now = self.clock() if now is None else now
+        events = self.current(now)
+        if not events:
+            return "In a meeting"
+        until = self.next_boundary(now)
+        names = ", ".join(sorted({event.summary or "Untitled" for event in events}))
+        if until is None:
+            return f"In a meeting: {names}"
+        return f"In a meeting: {names} (until {datetime.fromtimestamp(until).strftime('%H:%M')})"
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="List the meetings Stay Awake sees in an .ics file")
+    parser.add_argument("path", help="iCalendar file")
+    parser.add_argument("--days", type=int, default=14, help="Window to expand recurring events over")
+    parser.add_argument("--count", type=int, default=10, help="Number of upcoming meetings to list")
+    args = parser.parse_args(argv)
+
+    calendar = MeetingCalendar({"path": args.path, "window_days": args.days,
+                                "before_minutes": 0, "after_minutes": 0})
+    began = time.perf_counter()
+    calendar.maybe_reload()
+    loaded = time.perf_counter()
+    # A second read of the unchanged file reuses every parsed event
+    calendar.configure({})
+    calendar.maybe_reload()
+    reread = time.perf_counter()
+    now = time.time()
+    queries = 10000
+    for offset in range(queries):
+        calendar.in_meeting(now + offset * 60)
+        calendar.next_boundary(now + offset * 60)
+    queried = time.perf_counter()
+
+    print(f"{len(calendar.events)} events, {len(calendar.tree)} occurrences in the next {args.days} days")
+    print(f"Read and indexed in {(loaded - began) * 1000:.1f} ms, unchanged re-read {(reread - loaded) * 1000:.1f} ms, "
+          f"{(queried - reread) / queries * 1e6:.1f} us per query pair")
+    for start, end, event in calendar.upcoming(now, args.count):
+        print(f"{datetime.fromtimestamp(start).strftime('%a %Y-%m-%d %H:%M')}-"
+              f"{datetime.fromtimestamp(end).strftime('%H:%M')}  {event.summary or 'Untitled'}")
+    boundary = calendar.next_boundary(now)
+    state = "In a meeting" if calendar.in_meeting(now) else "Not in a meeting"
+    if boundary is not None:
+        print(f"{state} until {datetime.fromtimestamp(boundary).strftime('%a %H:%M')}")
+    else:
+        print(state)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,63 @@
+"""
+Default settings and option values of the optional monitors.
+
+They live apart from the monitors (load_monitor.py, network_monitor.py,
+power_policy.py, session_lock.py, meeting_calendar.py), which import psutil,
+start processes or parse calendars, so config_schema.py can build defaults and
+validate configs without importing any of that. The monitors import them from
+here.
+"""
+
+DEFAULT_LOAD_SETTINGS = {
+    "enabled": False,
+    "cpu_high": 30.0,     # Percent CPU busy to start keeping awake
+    "cpu_low": 15.0,      # Percent CPU busy to stop keeping awake
+    "disk_high": 5.0,     # Disk MB/s to start keeping awake
+    "disk_low": 1.0,      # Disk MB/s to stop keeping awake
+    "interval": 10,       # Seconds between samples
+    "smoothing": 60       # EWMA time constant in seconds
+}
+
+DEFAULT_NETWORK_SETTINGS = {
+    "enabled": False,
+    "local_ports": [22, 3389],  # SSH and RDP servers on this machine
+    "remote_ports": [],         # Outgoing sessions, e.g. 22 for SSH
+    "throughput_kb": 500,       # KB/s in + out that counts as a transfer
+    "min_interval": 5,          # Seconds between samples while active
+    "max_interval": 60          # Longest period between samples while idle
+}
+
+# What to do while running on battery
+BATTERY_NORMAL = "normal"                    # Same as on AC power
+BATTERY_LONGER_INTERVAL = "longer_interval"  # Inject less often
+BATTERY_INHIBIT_ONLY = "inhibit_only"        # Hold a power inhibit instead of injecting
+
+DEFAULT_POWER_SETTINGS = {
+    "enabled": False,
+    "pause_below": 10,                   # Battery percent below which Stay Awake pauses
+    "on_battery": BATTERY_LONGER_INTERVAL,
+    "battery_interval": 120,             # Seconds between simulations on battery
+    "refresh_interval": 60,              # Seconds between battery reads
+    "notified_refresh_interval": 600     # Seconds between reads when changes are pushed
+}
+
+# What to do while the session is locked or the screen is off
+WHEN_LOCKED_PAUSE = "pause"      # Stop keeping the machine awake
+WHEN_LOCKED_INHIBIT = "inhibit"  # Hold a power inhibit instead of injecting input
+
+DEFAULT_LOCK_SETTINGS = {
+    "enabled": False,
+    "when_locked": WHEN_LOCKED_INHIBIT,
+    "include_screen_off": True  # Treat a switched off display like a locked session
+}
+
+DEFAULT_CALENDAR_SETTINGS = {
+    "enabled": False,
+    "path": "",                # .ics file kept up to date by another tool
+    "before_minutes": 2,       # Stay awake this long before a meeting starts
+    "after_minutes": 5,        # and this long after it ends
+    "window_days": 14,         # Recurring events are expanded this far ahead
+    "check_interval": 60,      # Seconds between checks of the file for changes
+    "all_day_events": False,   # All-day events usually mark days, not meetings
+    "free_events": False       # Events shown as free (TRANSP:TRANSPARENT)
+}
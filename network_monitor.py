@@ -0,0 +1,145 @@
+"""
+Keeps the machine awake while network sessions or transfers are active.
+
+Two triggers are supported:
+
+- established TCP connections on configured local ports (e.g. incoming SSH on 22
+  or RDP on 3389) or remote ports (e.g. an outgoing SSH session)
+- total network throughput above a threshold, e.g. a large download
+
+Each sample diffs the set of watched connections and the cumulative
+psutil.net_io_counters against the previous sample. The sampling period adapts:
+it stays short while the network is active, so the end of a session is noticed
+quickly, and backs off while idle.
+"""
+import time
+
+import psutil
+
+from monitor_defaults import DEFAULT_NETWORK_SETTINGS
+
+
+class PsutilNetworkSource:
+    """Reads connections and counters from psutil"""
+
+    def connections(self):
+        """Return established connections as a set of (local port, remote ip, remote port)"""
+        result = set()
+        for conn in psutil.net_connections(kind="tcp"):
+            if conn.status != psutil.CONN_ESTABLISHED or not conn.raddr:
+                continue
+            result.add((conn.laddr.port, conn.raddr.ip, conn.raddr.port))
+        return result
+
+    def bytes_transferred(self):
+        """Return the total bytes sent and received so far"""
+        counters = psutil.net_io_counters()
+        return counters.bytes_sent + counters.bytes_recv if counters else 0
+
+
+class FakeNetworkSource:
+    """Network source driven by hand, for tests and simulations"""
+
+    def __init__(self):
+        self.open_connections = set()
+        self.total_bytes = 0
+
+    def connections(self):
+        return set(self.open_connections)
+
+    def bytes_transferred(self):
+        return self.total_bytes
+
+    def connect(self, local_port, remote_ip="127.0.0.1", remote_port=50000):
+        """Pretend a connection was established"""
+        self.open_connections.add((local_port, remote_ip, remote_port))
+
+    def disconnect(self, local_port, remote_ip="127.0.0.1", remote_port=50000):
+        """Pretend a connection was closed"""
+        self.open_connections.discard((local_port, remote_ip, remote_port))
+
+    def transfer(self, kilobytes):
+        """Pretend data was transferred"""
+        self.total_bytes += int(kilobytes * 1024)
+
+
+class NetworkMonitor:
+    """Tracks watched network sessions and throughput with an adaptive sampling period"""
+
+    def __init__(self, settings=None, source=None, clock=time.monotonic):
+        self.settings = dict(DEFAULT_NETWORK_SETTINGS)
+        self.settings.update(settings or {})
+        self.source = source or PsutilNetworkSource()
+        self.clock = clock
+        self.sessions = set()  # Watched connections seen in the last sample
+        self.throughput = 0.0  # KB/s during the last sample period
+        self.active = False
+        self.interval = self.settings["min_interval"]
+        self._last_time = None
+        self._last_bytes = None
+        self._ports = None
+        self._compile_ports()
+
+    def configure(self, settings):
+        """Apply new settings without losing the current state"""
+        self.settings.update(settings or {})
+        self._compile_ports()
+        self.interval = self.settings["min_interval"]
+
+    def reset(self):
+        """Forget the sampling history"""
+        self.sessions = set()
+        self.throughput = 0.0
+        self.active = False
+        self.interval = self.settings["min_interval"]
+        self._last_time = None
+        self._last_bytes = None
+
+    def _compile_ports(self):
+        self._local_ports = frozenset(int(port) for port in self.settings["local_ports"])
+        self._remote_ports = frozenset(int(port) for port in self.settings["remote_ports"])
+
+    def _is_watched(self, connection):
+        local_port, _, remote_port = connection
+        return local_port in self._local_ports or remote_port in self._remote_ports
+
+    def sample(self):
+        """Take one sample, returns the active state"""
+        now = self.clock()
+
+        # Connections are only listed when there are ports to watch
+        if self._local_ports or self._remote_ports:
+            try:
+                current = {conn for conn in self.source.connections() if self._is_watched(conn)}
+            except Exception as e:
+                print(f"Error listing network connections: {str(e)}")
+                current = self.sessions
+            opened = current - self.sessions
+            closed = self.sessions - current
+            if opened or closed:
+                print(f"Network sessions: {len(opened)} opened, {len(closed)} closed, {len(current)} active")
+            self.sessions = current
+
+        try:
+            total_bytes = self.source.bytes_transferred()
+        except Exception:
+            total_bytes = self._last_bytes
+        if self._last_time is not None and total_bytes is not None and now > self._last_time:
+            self.throughput = max(0, total_bytes - self._last_bytes) / 1024 / (now - self._last_time)
+        self._last_time = now
+        self._last_bytes = total_bytes
+
+        self.active = bool(self.sessions) or self.throughput >= self.settings["throughput_kb"]
+
+        # Sample often while active, back off exponentially while idle
+        if self.active:
+            self.interval = self.settings["min_interval"]
+        else:
+            self.interval = min(self.interval * 2, self.settings["max_interval"])
+        return self.active
+
+    def maybe_sample(self):
+        """Take a sample if the current sampling period has elapsed"""
+        if self._last_time is None or self.clock() - self._last_time >= self.interval:
+            return self.sample()
+        return self.active
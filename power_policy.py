@@ -0,0 +1,177 @@
+"""
+Battery and power-source aware policy, and a power inhibitor used instead of input
+injection where injecting is pointless or wasteful.
+
+Battery reads go through psutil.sensors_battery and are cached, refreshed on a much
+longer cadence than the worker tick. When the platform reports power-source
+changes (WM_POWERBROADCAST on Windows) the cache is invalidated on each change and
+the periodic refresh slows down even further.
+"""
+import sys
+import time
+import shutil
+import subprocess
+
+import psutil
+
+# What to do while running on battery, and the defaults
+from monitor_defaults import (BATTERY_NORMAL, BATTERY_LONGER_INTERVAL, BATTERY_INHIBIT_ONLY,  # noqa: F401
+                              DEFAULT_POWER_SETTINGS)
+
+
+class PsutilBatterySource:
+    """Reads the battery state from psutil"""
+
+    def read(self):
+        """Return (percent, plugged in), or None without a battery"""
+        battery = psutil.sensors_battery()
+        if battery is None:
+            return None
+        return battery.percent, bool(battery.power_plugged)
+
+
+class FakeBatterySource:
+    """Battery source driven by hand, for tests and simulations"""
+
+    def __init__(self, percent=100, plugged=True, present=True):
+        self.percent = percent
+        self.plugged = plugged
+        self.present = present
+        self.read_count = 0
+
+    def read(self):
+        self.read_count += 1
+        if not self.present:
+            return None
+        return self.percent, self.plugged
+
+
+class PowerPolicy:
+    """Decides how Stay Awake behaves depending on the battery and power source"""
+
+    def __init__(self, settings=None, source=None, clock=time.monotonic):
+        self.settings = dict(DEFAULT_POWER_SETTINGS)
+        self.settings.update(settings or {})
+        self.source = source or PsutilBatterySource()
+        self.clock = clock
+        self.notifications_available = False  # Set once power-source changes are pushed
+        self._state = None
+        self._read_at = None
+
+    def configure(self, settings):
+        """Apply new settings"""
+        self.settings.update(settings or {})
+
+    def notify_change(self):
+        """Called when the platform reports a power-source or battery change"""
+        self.notifications_available = True
+        self._read_at = None
+
+    def state(self):
+        """Return the cached (percent, plugged in), or None without a battery"""
+        now = self.clock()
+        if self.notifications_available:
+            refresh = self.settings["notified_refresh_interval"]
+        else:
+            refresh = self.settings["refresh_interval"]
+        if self._read_at is None or now - self._read_at >= refresh:
+            try:
+                self._state = self.source.read()
+            except Exception as e:
+                print(f"Error reading battery state: {str(e)}")
+                self._state = None
+            self._read_at = now
+        return self._state
+
+    def on_battery(self):
+        """Check if the machine is currently running on battery"""
+        state = self.state()
+        return state is not None and not state[1]
+
+    def should_pause(self):
+        """Check if the battery is too low to keep the machine awake"""
+        state = self.state()
+        if state is None or state[1]:
+            return False
+        return state[0] < self.settings["pause_below"]
+
+    def inhibit_only(self):
+        """Check if a power inhibit should be used instead of injecting input"""
+        return self.settings["on_battery"] == BATTERY_INHIBIT_ONLY and self.on_battery()
+
+    def effective_interval(self, interval):
+        """Return the activity interval to use in the current power state"""
+        if self.settings["on_battery"] == BATTERY_LONGER_INTERVAL and self.on_battery():
+            return max(interval, self.settings["battery_interval"])
+        return interval
+
+    def describe(self):
+        state = self.state()
+        if state is None:
+            return "No battery"
+        return f"Battery {state[0]:.0f}% ({'AC power' if state[1] else 'on battery'})"
+
+
+class PowerInhibitor:
+    """Keeps the machine awake through the OS power management instead of fake input
+
+    On Windows this uses SetThreadExecutionState, which is per-thread, so acquire()
+    and release() must be called from the same (worker) thread. On Linux it holds a
+    systemd-inhibit lock for as long as it is acquired. The lock's child process
+    waits for the end of a pipe from this process, so the lock also ends when this
+    process is killed instead of blocking sleep until the next reboot.
+    """
+
+    # SetThreadExecutionState flags
+    ES_CONTINUOUS = 0x80000000
+    ES_SYSTEM_REQUIRED = 0x00000001
+    ES_DISPLAY_REQUIRED = 0x00000002
+
+    def __init__(self, reason="Stay Awake"):
+        self.reason = reason
+        self.held = False
+        self._process = None
+
+    def acquire(self):
+        """Start inhibiting sleep, returns False if the platform has no way to do it"""
+        if self.held:
+            return True
+        try:
+            if sys.platform == "win32":
+                import ctypes
+                flags = self.ES_CONTINUOUS | self.ES_SYSTEM_REQUIRED | self.ES_DISPLAY_REQUIRED
+                if not ctypes.windll.kernel32.SetThreadExecutionState(flags):
+                    return False
+            elif shutil.which("systemd-inhibit"):
+                # cat exits when the pipe closes: on release() or when this process dies
+                self._process = subprocess.Popen(
+                    ["systemd-inhibit", "--what=idle:sleep", "--who=Stay Awake",
+                     f"--why={self.reason}", "--mode=block", "cat"],
+                    stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            else:
+                return False
+        except Exception as e:
+            print(f"Error acquiring power inhibit: {str(e)}")
+            return False
+        self.held = True
+        return True
+
+    def release(self):
+        """Stop inhibiting sleep"""
+        if not self.held:
+            return
+        try:
+            if sys.platform == "win32":
+                import ctypes
+                ctypes.windll.kernel32.SetThreadExecutionState(self.ES_CONTINUOUS)
+            elif self._process is not None:
+                self._process.stdin.close()
+                try:
+                    self._process.wait(timeout=2)
+                except subprocess.TimeoutExpired:
+                    self._process.terminate()
+                    self._process.wait(timeout=2)
+        except Exception as e:
+            print(f"Error releasing power inhibit: {str(e)}")
+        self._process = None
+        self.held = False
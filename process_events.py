@@ -0,0 +1,527 @@
+"""
+Process start/stop event sources and a live process table built on top of them.
+
+Instead of scanning every running process on each check, an event source pushes
+process creation and exit events as they happen:
+
+- Linux: the netlink process connector (usually requires root / CAP_NET_ADMIN)
+- Windows: WMI process traces, falling back to WMI instance events
+- Anywhere else, or when the above are unavailable: polling psutil.process_iter
+
+If an event source fails while running (a netlink buffer overrun, a lost WMI
+subscription), the tracker takes a fresh snapshot and falls back to the next
+source, so it never keeps trusting a process table that stopped updating.
+
+FakeProcessEventSource lets the tracker be driven by hand, e.g. in tests.
+"""
+import os
+import sys
+import socket
+import struct
+import threading
+from collections import deque
+
+import psutil
+
+
+class ProcessEventSource:
+    """Base class for a source of process start and exit events
+
+    Callbacks are on_start(pid, ppid, name), on_exit(pid) and on_failure(error),
+    called once when the source stops delivering events on its own. They may be
+    called from a background thread owned by the source.
+    """
+    name = "base"
+
+    def snapshot(self):
+        """Return the currently running processes as {pid: (ppid, name)}"""
+        processes = {}
+        for proc in psutil.process_iter(['pid', 'ppid', 'name']):
+            try:
+                processes[proc.info['pid']] = (proc.info['ppid'], proc.info['name'])
+            except Exception:
+                continue
+        return processes
+
+    def start(self, on_start, on_exit, on_failure=None):
+        """Start delivering events, raises OSError if the source is unavailable"""
+        raise NotImplementedError
+
+    def stop(self):
+        """Stop delivering events"""
+        pass
+
+
+def _process_info(pid):
+    """Return (ppid, name) for a pid, or None if the process is already gone"""
+    try:
+        proc = psutil.Process(pid)
+        return proc.ppid(), proc.name()
+    except Exception:
+        return None
+
+
+class PollingProcessEventSource(ProcessEventSource):
+    """Fallback source that diffs psutil.process_iter snapshots on an interval"""
+    name = "polling"
+
+    def __init__(self, interval=5.0):
+        self.interval = interval
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def start(self, on_start, on_exit, on_failure=None):
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, args=(on_start, on_exit), daemon=True)
+        self._thread.start()
+
+    def _run(self, on_start, on_exit):
+        known = set(psutil.pids())
+        while not self._stop_event.wait(self.interval):
+            try:
+                current = set(psutil.pids())
+            except Exception:
+                continue
+            # Only new pids need their name looked up
+            for pid in current - known:
+                info = _process_info(pid)
+                if info is not None:
+                    on_start(pid, info[0], info[1])
+            for pid in known - current:
+                on_exit(pid)
+            known = current
+
+    def stop(self):
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout=1.0)
+            self._thread = None
+
+
+class NetlinkProcessEventSource(ProcessEventSource):
+    """Linux process connector events received over a netlink socket"""
+    name = "netlink"
+
+    NETLINK_CONNECTOR = 11
+    CN_IDX_PROC = 1
+    CN_VAL_PROC = 1
+    NLMSG_DONE = 3
+    PROC_CN_MCAST_LISTEN = 1
+    PROC_CN_MCAST_IGNORE = 2
+
+    PROC_EVENT_FORK = 0x00000001
+    PROC_EVENT_EXEC = 0x00000002
+    PROC_EVENT_EXIT = 0x80000000
+
+    NLMSG_HEADER = struct.Struct("=IHHII")
+    CN_MSG_HEADER = struct.Struct("=IIIIHH")
+    PROC_EVENT_HEADER = struct.Struct("=IIQ")
+
+    def __init__(self):
+        self._socket = None
+        self._thread = None
+        self._running = False
+
+    def _control_message(self, operation):
+        payload = struct.pack("=I", operation)
+        cn_msg = self.CN_MSG_HEADER.pack(self.CN_IDX_PROC, self.CN_VAL_PROC, 0, 0, len(payload), 0)
+        length = self.NLMSG_HEADER.size + len(cn_msg) + len(payload)
+        header = self.NLMSG_HEADER.pack(length, self.NLMSG_DONE, 0, 0, os.getpid())
+        return header + cn_msg + payload
+
+    def start(self, on_start, on_exit, on_failure=None):
+        if not sys.platform.startswith("linux"):
+            raise OSError("The netlink process connector is only available on Linux")
+        sock = socket.socket(socket.AF_NETLINK, socket.SOCK_DGRAM, self.NETLINK_CONNECTOR)
+        try:
+            sock.bind((os.getpid(), self.CN_IDX_PROC))
+            sock.send(self._control_message(self.PROC_CN_MCAST_LISTEN))
+            # Wake up regularly so stop() does not have to wait for an event
+            sock.settimeout(1.0)
+        except OSError:
+            sock.close()
+            raise
+        self._socket = sock
+        self._running = True
+        self._thread = threading.Thread(target=self._run, args=(on_start, on_exit, on_failure), daemon=True)
+        self._thread.start()
+
+    def _run(self, on_start, on_exit, on_failure):
+        header_size = self.NLMSG_HEADER.size + self.CN_MSG_HEADER.size
+        while self._running:
+            try:
+                data = self._socket.recv(4096)
+            except socket.timeout:
+                continue
+            except OSError as e:
+                # ENOBUFS after an overrun means events were lost; the table can no longer be trusted
+                if self._running and on_failure is not None:
+                    self._running = False
+                    on_failure(str(e))
+                break
+            if len(data) < header_size + self.PROC_EVENT_HEADER.size:
+                continue
+            what, _, _ = self.PROC_EVENT_HEADER.unpack_from(data, header_size)
+            event_data = header_size + self.PROC_EVENT_HEADER.size
+
+            if what == self.PROC_EVENT_FORK:
+                parent_pid, parent_tgid, child_pid, child_tgid = struct.unpack_from("=IIII", data, event_data)
+                # New threads also fork; only report new processes
+                if child_pid == child_tgid:
+                    info = _process_info(child_pid)
+                    name = info[1] if info else None
+                    on_start(child_pid, parent_tgid, name)
+            elif what == self.PROC_EVENT_EXEC:
+                pid, tgid = struct.unpack_from("=II", data, event_data)
+                # exec() replaces the process image, so report it again with its new name
+                info = _process_info(tgid)
+                if info is not None:
+                    on_start(tgid, info[0], info[1])
+            elif what == self.PROC_EVENT_EXIT:
+                pid, tgid = struct.unpack_from("=II", data, event_data)
+                if pid == tgid:
+                    on_exit(tgid)
+
+    def stop(self):
+        self._running = False
+        if self._socket is not None:
+            try:
+                self._socket.send(self._control_message(self.PROC_CN_MCAST_IGNORE))
+            except OSError:
+                pass
+        # On failure the tracker stops the source from its own thread, which ends by itself
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout=2.0)
+        self._thread = None
+        if self._socket is not None:
+            self._socket.close()
+            self._socket = None
+
+
+class WmiProcessEventSource(ProcessEventSource):
+    """Windows process events delivered by WMI"""
+    name = "wmi"
+
+    # Process traces need administrator rights; instance events work for everyone
+    TRACE_QUERY = "SELECT * FROM Win32_ProcessTrace"
+    INSTANCE_QUERY = ("SELECT * FROM __InstanceOperationEvent WITHIN 1 "
+                      "WHERE TargetInstance ISA 'Win32_Process'")
+    # WBEM_E_TIMED_OUT, returned by NextEvent when no event arrived in time
+    WBEM_TIMED_OUT = -2147209215
+
+    def __init__(self):
+        self._thread = None
+        self._running = False
+
+    def start(self, on_start, on_exit, on_failure=None):
+        if sys.platform != "win32":
+            raise OSError("WMI process events are only available on Windows")
+        try:
+            import pythoncom  # noqa: F401
+            import win32com.client  # noqa: F401
+        except ImportError as e:
+            raise OSError(f"pywin32 is not available: {str(e)}")
+
+        started = threading.Event()
+        failure = []
+        self._running = True
+        self._thread = threading.Thread(target=self._run, args=(on_start, on_exit, on_failure, started, failure),
+                                        daemon=True)
+        self._thread.start()
+        started.wait(timeout=10.0)
+        if failure or not started.is_set():
+            self._running = False
+            raise OSError(failure[0] if failure else "Timed out subscribing to WMI process events")
+
+    def _subscribe(self):
+        import win32com.client
+        wmi = win32com.client.GetObject("winmgmts:")
+        try:
+            return wmi.ExecNotificationQuery(self.TRACE_QUERY), True
+        except Exception:
+            return wmi.ExecNotificationQuery(self.INSTANCE_QUERY), False
+
+    def _run(self, on_start, on_exit, on_failure, started, failure):
+        import pythoncom
+        pythoncom.CoInitialize()
+        try:
+            try:
+                watcher, is_trace = self._subscribe()
+            except Exception as e:
+                failure.append(str(e))
+                return
+            finally:
+                started.set()
+
+            error = None
+            while self._running:
+                try:
+                    event = watcher.NextEvent(1000)
+                except pythoncom.com_error as e:
+                    if e.args and e.args[0] == self.WBEM_TIMED_OUT:
+                        continue
+                    # Any other COM error means the subscription is gone
+                    error = str(e)
+                    break
+                except Exception as e:
+                    error = str(e)
+                    break
+
+                event_class = event.Path_.Class
+                if is_trace:
+                    if event_class == "Win32_ProcessStartTrace":
+                        on_start(event.ProcessID, event.ParentProcessID, event.ProcessName)
+                    elif event_class == "Win32_ProcessStopTrace":
+                        on_exit(event.ProcessID)
+                else:
+                    target = event.TargetInstance
+                    if event_class == "__InstanceCreationEvent":
+                        on_start(target.ProcessId, target.ParentProcessId, target.Name)
+                    elif event_class == "__InstanceDeletionEvent":
+                        on_exit(target.ProcessId)
+            if error is not None and self._running and on_failure is not None:
+                self._running = False
+                on_failure(error)
+        finally:
+            pythoncom.CoUninitialize()
+
+    def stop(self):
+        self._running = False
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout=2.0)
+        self._thread = None
+
+
+class FakeProcessEventSource(ProcessEventSource):
+    """Event source driven by hand, for tests and simulations"""
+    name = "fake"
+
+    def __init__(self, processes=None):
+        self.processes = dict(processes or {})  # pid -> (ppid, name)
+        self._on_start = None
+        self._on_exit = None
+        self._on_failure = None
+
+    def snapshot(self):
+        return dict(self.processes)
+
+    def start(self, on_start, on_exit, on_failure=None):
+        self._on_start = on_start
+        self._on_exit = on_exit
+        self._on_failure = on_failure
+
+    def stop(self):
+        self._on_start = None
+        self._on_exit = None
+        self._on_failure = None
+
+    def emit_start(self, pid, name, ppid=0):
+        """Pretend a process was started"""
+        self.processes[pid] = (ppid, name)
+        if self._on_start is not None:
+            self._on_start(pid, ppid, name)
+
+    def emit_exit(self, pid):
+        """Pretend a process exited"""
+        self.processes.pop(pid, None)
+        if self._on_exit is not None:
+            self._on_exit(pid)
+
+    def fail(self, error="Simulated failure"):
+        """Pretend the source stopped delivering events"""
+        on_failure = self._on_failure
+        self.stop()
+        if on_failure is not None:
+            on_failure(error)
+
+
+def create_event_sources():
+    """Return the event sources to try on this platform, best first"""
+    if sys.platform.startswith("linux"):
+        return [NetlinkProcessEventSource(), PollingProcessEventSource()]
+    if sys.platform == "win32":
+        return [WmiProcessEventSource(), PollingProcessEventSource()]
+    return [PollingProcessEventSource()]
+
+
+class ProcessTracker:
+    """Live table of running processes maintained from process events
+
+    Tracks which running processes match an AppMatcher, so checking whether an
+    excluded app is running is O(1) and costs nothing while no process changes.
+    """
+
+    def __init__(self, matcher=None, sources=None, on_change=None):
+        self.matcher = matcher
+        self.sources = sources
+        self.on_change = on_change  # Called when the matching state flips
+        self.source = None
+        self.processes = {}  # pid -> (ppid, name)
+        self._matching = set()  # pids of processes matching the matcher
+        self._lock = threading.Lock()
+        self._listeners = []  # Additional (on_start, on_exit, on_snapshot) callbacks
+        self._buffered = None  # Events received while a snapshot is taken, replayed after it
+
+    @property
+    def running(self):
+        """Check if the tracker is receiving events"""
+        return self.source is not None
+
+    def add_listener(self, on_start, on_exit, on_snapshot=None):
+        """Also forward process events (and the initial snapshot) to another consumer"""
+        self._listeners.append((on_start, on_exit, on_snapshot))
+
+    def start(self):
+        """Start tracking with the first event source that is available"""
+        if self.source is not None:
+            return self.source
+        if self.sources is None:
+            self.sources = create_event_sources()
+        return self._start_first(self.sources)
+
+    def _start_first(self, sources):
+        for source in sources:
+            try:
+                self._start_source(source)
+            except Exception as e:
+                print(f"Process event source '{source.name}' unavailable: {str(e)}")
+                continue
+            self.source = source
+            print(f"Tracking processes using '{source.name}' events")
+            return source
+        return None
+
+    def _start_source(self, source):
+        # Subscribe before taking the snapshot so no process slips in between; events
+        # arriving meanwhile are held back and replayed on top of the snapshot
+        with self._lock:
+            self._buffered = deque()
+        try:
+            source.start(self._on_start, self._on_exit, self._on_failure)
+            try:
+                processes = source.snapshot()
+            except Exception:
+                source.stop()
+                raise
+        except Exception:
+            with self._lock:
+                self._buffered = None
+            raise
+        with self._lock:
+            before = bool(self._matching)
+            self.processes = processes
+            self._recount()
+            changed = before != bool(self._matching)
+        for _, _, on_snapshot in self._listeners:
+            if on_snapshot is not None:
+                on_snapshot(dict(processes))
+        if changed:
+            self._notify()
+        # Replay the held back events in order; events still arriving meanwhile queue up
+        # behind them, and only an empty queue hands over to applying events directly
+        while True:
+            with self._lock:
+                if not self._buffered:
+                    self._buffered = None
+                    break
+                event = self._buffered.popleft()
+            if len(event) == 3:
+                self._apply_start(*event)
+            else:
+                self._apply_exit(*event)
+
+    def _on_failure(self, error):
+        """Fall back to the next source with a fresh snapshot when the current one fails"""
+        failed = self.source
+        if failed is None:
+            return
+        self.source = None
+        print(f"Process event source '{failed.name}' failed: {error}")
+        failed.stop()
+        # The default sources end with polling, which always works
+        remaining = self.sources[self.sources.index(failed) + 1:] if failed in self.sources else []
+        if self._start_first(remaining) is None:
+            # Without a source the rules scan processes themselves; drop the stale table
+            self.stop()
+
+    def stop(self):
+        """Stop tracking and forget the process table"""
+        if self.source is not None:
+            self.source.stop()
+            self.source = None
+        with self._lock:
+            self.processes = {}
+            self._matching = set()
+        for _, _, on_snapshot in self._listeners:
+            if on_snapshot is not None:
+                on_snapshot({})
+
+    def set_matcher(self, matcher):
+        """Use a different matcher, recounting from the process table"""
+        self.matcher = matcher
+        self.refresh()
+
+    def refresh(self):
+        """Recount matching processes, e.g. after the matcher was changed in place"""
+        with self._lock:
+            before = bool(self._matching)
+            self._recount()
+            changed = before != bool(self._matching)
+        if changed:
+            self._notify()
+
+    def _recount(self):
+        if self.matcher:
+            self._matching = {pid for pid, (_, name) in self.processes.items() if self.matcher.matches(name)}
+        else:
+            self._matching = set()
+
+    def _notify(self):
+        if self.on_change is not None:
+            try:
+                self.on_change()
+            except Exception as e:
+                print(f"Error in process change callback: {str(e)}")
+
+    def _on_start(self, pid, ppid, name):
+        with self._lock:
+            if self._buffered is not None:
+                self._buffered.append((pid, ppid, name))
+                return
+        self._apply_start(pid, ppid, name)
+
+    def _apply_start(self, pid, ppid, name):
+        with self._lock:
+            before = bool(self._matching)
+            self.processes[pid] = (ppid, name)
+            if self.matcher and self.matcher.matches(name):
+                self._matching.add(pid)
+            else:
+                self._matching.discard(pid)
+            changed = before != bool(self._matching)
+        if changed:
+            self._notify()
+        for on_start, _, _ in self._listeners:
+            on_start(pid, ppid, name)
+
+    def _on_exit(self, pid):
+        with self._lock:
+            if self._buffered is not None:
+                self._buffered.append((pid,))
+                return
+        self._apply_exit(pid)
+
+    def _apply_exit(self, pid):
+        with self._lock:
+            before = bool(self._matching)
+            self.processes.pop(pid, None)
+            self._matching.discard(pid)
+            changed = before != bool(self._matching)
+        if changed:
+            self._notify()
+        for _, on_exit, _ in self._listeners:
+            on_exit(pid)
+
+    def is_matching_running(self):
+        """Check if any process matching the matcher is running"""
+        return bool(self._matching)
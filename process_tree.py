@@ -0,0 +1,187 @@
+"""
+Process-tree holds: keep the machine awake while a watched process, or anything it
+spawned, is still running.
+
+The watcher is fed by the same process start/stop events as the ProcessTracker. It
+keeps a parent -> children map and, for every live process that belongs to a
+watched tree, the trees it belongs to, both updated per event in O(1). Checking
+whether any watched process or descendant is alive is therefore O(1); no tree walk
+happens per check.
+
+A process stays in a tree for its whole life once it joined, also after its
+parent exits and it is reparented. Membership is kept per tree, so unwatching a
+root or changing the patterns releases only the trees that are no longer watched,
+and a fresh snapshot (e.g. after the tracker fell back to another event source)
+keeps the membership of processes that are still running.
+"""
+import itertools
+import threading
+
+from app_matcher import AppMatcher
+
+
+class ProcessTreeWatcher:
+    """Tracks the live descendants of watched root processes"""
+
+    def __init__(self, patterns=None):
+        self.matcher = AppMatcher(patterns)  # Names of processes that start a tree
+        self.root_pids = set()               # Explicitly watched root PIDs
+        self.parents = {}                    # pid -> ppid
+        self.children = {}                   # ppid -> set of child pids
+        self.held = {}                       # Live pid in a watched tree -> ids of its trees
+        self.trees = {}                      # Tree id -> [root pid, root name, explicitly watched]
+        self._sizes = {}                     # Tree id -> number of live members
+        self._roots = {}                     # Live root pid -> its tree id
+        self._names = {}                     # pid -> (ppid, name)
+        self._tree_ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def attach(self, tracker):
+        """Receive process events from a ProcessTracker"""
+        tracker.add_listener(self.on_start, self.on_exit, self.on_snapshot)
+        if tracker.running:
+            self.on_snapshot(tracker.processes)
+
+    def is_held(self):
+        """Check if any watched process or descendant is still running"""
+        return bool(self.held)
+
+    def has_watches(self):
+        """Check if there is anything to watch at all, including trees whose root exited"""
+        return bool(self.matcher) or bool(self.root_pids) or bool(self.trees)
+
+    def set_patterns(self, patterns):
+        """Watch trees started by processes with matching names"""
+        with self._lock:
+            self.matcher = AppMatcher(patterns)
+            self._rebuild()
+
+    def watch_pid(self, pid):
+        """Watch the tree below an already running process"""
+        with self._lock:
+            self.root_pids.add(pid)
+            tree_id = self._roots.get(pid)
+            if tree_id is not None:
+                self.trees[tree_id][2] = True
+            elif pid in self._names:
+                self._start_tree(pid, self._names[pid][1], True)
+
+    def unwatch_pid(self, pid):
+        """Stop watching the tree below a process, also after the process itself exited"""
+        with self._lock:
+            self.root_pids.discard(pid)
+            for tree in self.trees.values():
+                if tree[0] == pid:
+                    tree[2] = False
+            self._rebuild()
+
+    def _is_root(self, pid, name):
+        return pid in self.root_pids or self.matcher.matches(name)
+
+    def _start_tree(self, pid, name, explicit):
+        tree_id = next(self._tree_ids)
+        self.trees[tree_id] = [pid, name, explicit]
+        self._sizes[tree_id] = 0
+        self._roots[pid] = tree_id
+        self._hold_subtree(pid, {tree_id})
+
+    def _join(self, pid, tree_ids):
+        member_of = self.held.setdefault(pid, set())
+        for tree_id in tree_ids - member_of:
+            member_of.add(tree_id)
+            self._sizes[tree_id] += 1
+
+    def _leave(self, pid):
+        for tree_id in self.held.pop(pid, ()):
+            self._sizes[tree_id] -= 1
+            if not self._sizes[tree_id]:
+                # The root exited too, as it is a member while it runs
+                del self._sizes[tree_id]
+                del self.trees[tree_id]
+
+    def _hold_subtree(self, pid, tree_ids):
+        """Add a process and its known descendants to trees"""
+        stack = [pid]
+        seen = set()
+        while stack:
+            current = stack.pop()
+            if current in seen:
+                continue
+            seen.add(current)
+            self._join(current, tree_ids)
+            stack.extend(self.children.get(current, ()))
+
+    def _release(self, tree_id):
+        root = self.trees.pop(tree_id)[0]
+        del self._sizes[tree_id]
+        if self._roots.get(root) == tree_id:
+            del self._roots[root]
+        for pid, member_of in list(self.held.items()):
+            member_of.discard(tree_id)
+            if not member_of:
+                del self.held[pid]
+
+    def _rebuild(self):
+        """Release trees that are no longer watched and start the newly watched ones"""
+        for tree_id, (_, name, explicit) in list(self.trees.items()):
+            if not explicit and not self.matcher.matches(name):
+                self._release(tree_id)
+        for pid, (_, name) in list(self._names.items()):
+            if pid not in self._roots and self._is_root(pid, name):
+                self._start_tree(pid, name, pid in self.root_pids)
+
+    def on_snapshot(self, processes):
+        """Seed the tree from a {pid: (ppid, name)} snapshot"""
+        with self._lock:
+            # Processes that are gone, or whose pid now belongs to another program, leave their trees
+            for pid in list(self.held):
+                if pid not in processes or processes[pid][1] != self._names.get(pid, (None, None))[1]:
+                    self._leave(pid)
+                    self._roots.pop(pid, None)
+            for pid in list(self._roots):
+                if pid not in self.held:
+                    del self._roots[pid]
+            self._names = dict(processes)
+            self.parents = {}
+            self.children = {}
+            for pid, (ppid, _) in processes.items():
+                self.parents[pid] = ppid
+                self.children.setdefault(ppid, set()).add(pid)
+            # Children started while no events arrived join the trees of their parents
+            for pid, member_of in list(self.held.items()):
+                self._hold_subtree(pid, set(member_of))
+            self._rebuild()
+
+    def on_start(self, pid, ppid, name):
+        with self._lock:
+            previous = self.parents.get(pid)
+            if previous is not None and previous != ppid:
+                self._unlink(pid, previous)
+            self._names[pid] = (ppid, name)
+            self.parents[pid] = ppid
+            self.children.setdefault(ppid, set()).add(pid)
+            # A process stays in its trees for its whole life, even if its parent exits
+            # and it gets reparented
+            if ppid in self.held and ppid != pid:
+                self._hold_subtree(pid, set(self.held[ppid]))
+            if pid not in self._roots and self._is_root(pid, name):
+                self._start_tree(pid, name, pid in self.root_pids)
+
+    def on_exit(self, pid):
+        with self._lock:
+            self._leave(pid)
+            self._roots.pop(pid, None)
+            self.root_pids.discard(pid)
+            self._names.pop(pid, None)
+            ppid = self.parents.pop(pid, None)
+            if ppid is not None:
+                self._unlink(pid, ppid)
+            # Orphaned children stay in their trees; drop the empty entry
+            self.children.pop(pid, None)
+
+    def _unlink(self, pid, ppid):
+        siblings = self.children.get(ppid)
+        if siblings is not None:
+            siblings.discard(pid)
+            if not siblings:
+                del self.children[ppid]
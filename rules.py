@@ -0,0 +1,475 @@
+"""
+Rule engine that decides whether Stay Awake should currently keep the machine awake.
+
+Every condition is a Rule that declares how expensive it is to evaluate and how long
+its result may be cached. The engine evaluates the cheapest rules first and stops as
+soon as none of the remaining rules could change the outcome, so an expensive check
+(such as scanning every running process) is skipped once the decision is settled.
+"""
+import time
+from datetime import datetime, timedelta
+
+from utils import is_app_running
+from compiled_schedule import MINUTES_PER_DAY
+
+# Verdicts a rule can return. A rule returns None when it has no opinion.
+SUSPEND = "suspend"        # Stay Awake should be inactive
+KEEP_AWAKE = "keep_awake"  # Stay Awake should keep the machine awake
+
+# Rule priorities. When rules disagree, the verdict of the highest priority rule wins;
+# on a tie SUSPEND wins.
+PRIORITY_SCHEDULE = 10
+PRIORITY_HOLD = 20
+PRIORITY_EXCLUSION = 30
+PRIORITY_CRITICAL = 40
+
+
+class Rule:
+    """Base class for a single condition evaluated by the RuleEngine"""
+    name = "rule"
+    # Relative cost of one evaluation, used to order rules (cheapest first)
+    cost = 1.0
+    # Seconds an evaluation result stays valid (0 disables caching)
+    ttl = 0.0
+    priority = PRIORITY_SCHEDULE
+    # Verdicts this rule is able to return, used to detect a settled outcome
+    verdicts = (SUSPEND,)
+
+    def evaluate(self, state, now):
+        """Return SUSPEND, KEEP_AWAKE or None for the given settings snapshot"""
+        raise NotImplementedError
+
+    def describe(self, verdict):
+        """Return a short human readable reason for a verdict of this rule"""
+        return self.name
+
+
+class ScheduleRule(Rule):
+    """Suspends Stay Awake outside of the configured weekly schedule"""
+    name = "schedule"
+    cost = 1.0
+    ttl = 1.0
+    priority = PRIORITY_SCHEDULE
+    verdicts = (SUSPEND,)
+
+    def __init__(self, timezone=None):
+        self.timezone = timezone  # tzinfo of the schedule times, None for local time
+
+    def evaluate(self, state, now):
+        # The schedule is compiled into per-day minute intervals when it is set
+        if not state.schedule_active or state.compiled_schedule is None:
+            return None
+        return SUSPEND if state.compiled_schedule.suspends_at(now, self.timezone) else None
+
+    def describe(self, verdict):
+        return "Outside scheduled hours"
+
+    def next_transition(self, state, now, days=8):
+        """Return the timestamp of the next schedule change after now, or None
+
+        Only interval boundaries and midnights can change the verdict, so the rule
+        is evaluated at those candidate times instead of every minute.
+        """
+        if not state.schedule_active or state.compiled_schedule is None:
+            return None
+        current = self.evaluate(state, now)
+        today = datetime.fromtimestamp(now, self.timezone).replace(hour=0, minute=0, second=0, microsecond=0)
+        for day in range(days):
+            date = today + timedelta(days=day)
+            candidates = {(0, 0)}
+            for start, end in state.compiled_schedule.day_intervals(date.date()) or ():
+                candidates.add((start, 0))
+                # Intervals include the first second of their end minute
+                if end < MINUTES_PER_DAY:
+                    candidates.add((end, 1))
+            for minute, second in sorted(candidates):
+                candidate = date.replace(hour=minute // 60, minute=minute % 60, second=second).timestamp()
+                if candidate > now and self.evaluate(state, candidate) != current:
+                    return candidate
+        return None
+
+
+class ExcludedAppsRule(Rule):
+    """Suspends Stay Awake while any of the excluded applications is running
+
+    With a running ProcessTracker the answer comes from its live process table;
+    otherwise every running process is scanned.
+    """
+    name = "excluded_apps"
+    priority = PRIORITY_EXCLUSION
+    verdicts = (SUSPEND,)
+
+    def __init__(self, tracker=None):
+        self.tracker = tracker
+
+    @property
+    def cost(self):
+        if self.tracker is not None and self.tracker.running:
+            return 1.0
+        # Scanning every running process is by far the most expensive check
+        return 100.0
+
+    @property
+    def ttl(self):
+        if self.tracker is not None and self.tracker.running:
+            # The process table is always current, nothing to cache
+            return 0.0
+        return 10.0
+
+    def evaluate(self, state, now):
+        if not state.app_monitoring_active or not state.excluded_apps:
+            return None
+        if self.tracker is not None and self.tracker.running:
+            running = self.tracker.is_matching_running()
+        else:
+            running = is_app_running(state.excluded_apps)
+        return SUSPEND if running else None
+
+    def describe(self, verdict):
+        return "Excluded application running"
+
+
+class ForegroundOnlyRule(Rule):
+    """Suspends Stay Awake unless one of the configured apps is in the foreground"""
+    name = "foreground_only"
+    cost = 2.0
+    priority = PRIORITY_SCHEDULE
+    verdicts = (SUSPEND,)
+
+    def __init__(self, tracker):
+        self.tracker = tracker
+
+    @property
+    def ttl(self):
+        # With a foreground hook the tracker is always current
+        return 0.0 if self.tracker.source is not None and self.tracker.source.pushes_changes else 1.0
+
+    def evaluate(self, state, now):
+        if not state.foreground_monitoring_active or not state.foreground_only_apps:
+            return None
+        if state.foreground_only_apps.matches(self.tracker.current_app()):
+            return None
+        return SUSPEND
+
+    def describe(self, verdict):
+        return "Required application not in the foreground"
+
+
+class ForegroundSuspendRule(ForegroundOnlyRule):
+    """Suspends Stay Awake while one of the configured apps is in the foreground"""
+    name = "foreground_suspend"
+    priority = PRIORITY_EXCLUSION
+
+    def evaluate(self, state, now):
+        if not state.foreground_monitoring_active or not state.foreground_suspend_apps:
+            return None
+        if state.foreground_suspend_apps.matches(self.tracker.current_app()):
+            return SUSPEND
+        return None
+
+    def describe(self, verdict):
+        return "Excluded application in the foreground"
+
+
+class LoadRule(Rule):
+    """Keeps the machine awake while the system CPU or disk load is high
+
+    Sampling is driven by the worker loop so the smoothed load has a continuous
+    history; evaluating the rule only reads the current busy state.
+    """
+    name = "system_load"
+    cost = 0.5
+    ttl = 0.0
+    priority = PRIORITY_HOLD
+    verdicts = (KEEP_AWAKE,)
+
+    def __init__(self, monitor):
+        self.monitor = monitor
+
+    def evaluate(self, state, now):
+        if not state.load_monitoring_active:
+            return None
+        return KEEP_AWAKE if self.monitor.busy else None
+
+    def describe(self, verdict):
+        return (f"System busy (CPU {self.monitor.cpu_percent:.0f}%, "
+                f"disk {self.monitor.disk_rate:.1f} MB/s)")
+
+
+class NetworkRule(Rule):
+    """Keeps the machine awake while watched network sessions or transfers are active"""
+    name = "network_activity"
+    cost = 0.5
+    ttl = 0.0
+    priority = PRIORITY_HOLD
+    verdicts = (KEEP_AWAKE,)
+
+    def __init__(self, monitor):
+        self.monitor = monitor
+
+    def evaluate(self, state, now):
+        if not state.network_monitoring_active:
+            return None
+        return KEEP_AWAKE if self.monitor.active else None
+
+    def describe(self, verdict):
+        if self.monitor.sessions:
+            return f"Network session active ({len(self.monitor.sessions)} connections)"
+        return f"Network transfer active ({self.monitor.throughput:.0f} KB/s)"
+
+
+class ProcessTreeRule(Rule):
+    """Keeps the machine awake while a watched process or any of its descendants runs"""
+    name = "process_tree"
+    cost = 0.5
+    ttl = 0.0
+    priority = PRIORITY_HOLD
+    verdicts = (KEEP_AWAKE,)
+
+    def __init__(self, watcher):
+        self.watcher = watcher
+
+    def evaluate(self, state, now):
+        if not state.process_holds_active:
+            return None
+        return KEEP_AWAKE if self.watcher.is_held() else None
+
+    def describe(self, verdict):
+        return f"Watched process tree running ({len(self.watcher.held)} processes)"
+
+
+class MeetingRule(Rule):
+    """Keeps the machine awake during meetings from a local iCalendar file"""
+    name = "meetings"
+    # An interval tree query over the occurrences in the rolling window
+    cost = 0.2
+    ttl = 0.0
+    priority = PRIORITY_HOLD
+    verdicts = (KEEP_AWAKE,)
+
+    def __init__(self, calendar):
+        self.calendar = calendar
+
+    def evaluate(self, state, now):
+        if not state.calendar_active:
+            return None
+        return KEEP_AWAKE if self.calendar.in_meeting(now) else None
+
+    def describe(self, verdict):
+        return self.calendar.describe()
+
+    def next_transition(self, state, now):
+        """Return the timestamp of the next meeting start or end after now, or None"""
+        if not state.calendar_active:
+            return None
+        return self.calendar.next_boundary(now)
+
+
+class LeaseRule(Rule):
+    """Keeps the machine awake while a script holds a lease on the control server"""
+    name = "leases"
+    # Held leases are counted in memory, expiry happens on the server
+    cost = 0.1
+    ttl = 0.0
+    priority = PRIORITY_HOLD
+    verdicts = (KEEP_AWAKE,)
+
+    def __init__(self, leases):
+        self.leases = leases
+
+    def evaluate(self, state, now):
+        return KEEP_AWAKE if self.leases.is_held() else None
+
+    def describe(self, verdict):
+        return self.leases.describe()
+
+
+class PowerRule(Rule):
+    """Suspends Stay Awake while running on a nearly empty battery"""
+    name = "power"
+    # Battery reads are cached by the policy itself
+    cost = 1.0
+    ttl = 0.0
+    priority = PRIORITY_CRITICAL
+    verdicts = (SUSPEND,)
+
+    def __init__(self, policy):
+        self.policy = policy
+
+    def evaluate(self, state, now):
+        if not state.power_policy_active:
+            return None
+        return SUSPEND if self.policy.should_pause() else None
+
+    def describe(self, verdict):
+        return f"Battery low ({self.policy.describe()})"
+
+
+class SessionLockRule(Rule):
+    """Suspends Stay Awake while the session is locked or the screen is off"""
+    name = "session_lock"
+    # The lock state is pushed, so reading it is free
+    cost = 0.1
+    ttl = 0.0
+    priority = PRIORITY_EXCLUSION
+    verdicts = (SUSPEND,)
+
+    def __init__(self, monitor):
+        self.monitor = monitor
+
+    def evaluate(self, state, now):
+        if not state.session_lock_active or state.session_lock_settings["when_locked"] != "pause":
+            return None
+        if self.monitor.is_idle(state.session_lock_settings["include_screen_off"]):
+            return SUSPEND
+        return None
+
+    def describe(self, verdict):
+        return "Session locked" if self.monitor.locked else "Screen off"
+
+
+class RuleEngine:
+    """Evaluates a set of rules in cost order with per-rule result caching"""
+
+    def __init__(self, rules=None, clock=time.time):
+        self.rules = []
+        self.clock = clock
+        self._cache = {}  # rule name -> (verdict, expires_at)
+        self._state = None  # Settings snapshot the cached results were computed from
+        self.last_rule = None  # Rule that decided the most recent evaluation
+        self.last_verdict = KEEP_AWAKE
+        for rule in rules or []:
+            self.add_rule(rule)
+
+    def add_rule(self, rule):
+        """Register a rule, replacing any existing rule with the same name"""
+        self.remove_rule(rule.name)
+        self.rules.append(rule)
+
+    def remove_rule(self, name):
+        """Unregister the rule with the given name"""
+        self.rules = [rule for rule in self.rules if rule.name != name]
+        self._cache.pop(name, None)
+
+    def get_rule(self, name):
+        """Return the registered rule with the given name, or None"""
+        for rule in self.rules:
+            if rule.name == name:
+                return rule
+        return None
+
+    def invalidate(self, name=None):
+        """Drop cached results for one rule, or for all rules"""
+        if name is None:
+            self._cache.clear()
+        else:
+            self._cache.pop(name, None)
+
+    def _cached(self, rule, now):
+        entry = self._cache.get(rule.name)
+        if entry is not None and now < entry[1]:
+            return True, entry[0]
+        return False, None
+
+    @staticmethod
+    def _beats(priority, verdict, best_priority, best_verdict):
+        """Check if a verdict at a priority overrides the current best verdict"""
+        if priority != best_priority:
+            return priority > best_priority
+        return verdict == SUSPEND and best_verdict != SUSPEND
+
+    def _can_change(self, rule, best_priority, best_verdict):
+        """Check if an unevaluated rule could still change the current outcome"""
+        for verdict in rule.verdicts:
+            if verdict != best_verdict and self._beats(rule.priority, verdict, best_priority, best_verdict):
+                return True
+        return False
+
+    def evaluate(self, state, now=None):
+        """Return the current verdict (SUSPEND or KEEP_AWAKE) for a settings snapshot"""
+        now = self.clock() if now is None else now
+
+        # A new settings snapshot may change any verdict, including ones cached
+        # from the previous snapshot while it was being replaced
+        if state is not self._state:
+            self._cache.clear()
+            self._state = state
+
+        # Cached results cost nothing, so they are consulted before anything else
+        pending = []
+        for rule in self.rules:
+            hit, verdict = self._cached(rule, now)
+            pending.append((0.0 if hit else rule.cost, rule))
+        pending.sort(key=lambda item: item[0])
+
+        # Without any opinion the machine is kept awake
+        best_priority = float("-inf")
+        best_verdict = KEEP_AWAKE
+        best_rule = None
+
+        while pending:
+            # Pick the cheapest rule that could still change the outcome. A rule that
+            # cannot is kept, since a later verdict may make it relevant again.
+            candidate = None
+            for index, (_, rule) in enumerate(pending):
+                if self._can_change(rule, best_priority, best_verdict):
+                    candidate = index
+                    break
+            if candidate is None:
+                # The outcome is settled, skip the remaining rules
+                break
+            _, rule = pending.pop(candidate)
+
+            hit, verdict = self._cached(rule, now)
+            if not hit:
+                try:
+                    verdict = rule.evaluate(state, now)
+                except Exception as e:
+                    print(f"Error evaluating rule {rule.name}: {str(e)}")
+                    verdict = None
+                if rule.ttl > 0:
+                    self._cache[rule.name] = (verdict, now + rule.ttl)
+
+            if verdict is not None and self._beats(rule.priority, verdict, best_priority, best_verdict):
+                best_priority = rule.priority
+                best_verdict = verdict
+                best_rule = rule
+
+        self.last_rule = best_rule
+        self.last_verdict = best_verdict
+        return best_verdict
+
+    def should_be_inactive(self, state, now=None):
+        """Convenience wrapper returning True when Stay Awake should be inactive"""
+        return self.evaluate(state, now) == SUSPEND
+
+    def last_reason(self):
+        """Return a human readable reason for the most recent decision"""
+        if self.last_rule is None:
+            return None
+        return self.last_rule.describe(self.last_verdict)
+
+
+def create_default_engine(process_tracker=None, foreground_tracker=None, load_monitor=None,
+                          network_monitor=None, process_tree=None, power_policy=None,
+                          session_monitor=None, leases=None, calendar=None):
+    """Create a rule engine with the built-in rules"""
+    rules = [ScheduleRule(), ExcludedAppsRule(process_tracker)]
+    if foreground_tracker is not None:
+        rules.append(ForegroundOnlyRule(foreground_tracker))
+        rules.append(ForegroundSuspendRule(foreground_tracker))
+    if load_monitor is not None:
+        rules.append(LoadRule(load_monitor))
+    if network_monitor is not None:
+        rules.append(NetworkRule(network_monitor))
+    if process_tree is not None:
+        rules.append(ProcessTreeRule(process_tree))
+    if power_policy is not None:
+        rules.append(PowerRule(power_policy))
+    if session_monitor is not None:
+        rules.append(SessionLockRule(session_monitor))
+    if leases is not None:
+        rules.append(LeaseRule(leases))
+    if calendar is not None:
+        rules.append(MeetingRule(calendar))
+    return RuleEngine(rules)
@@ -0,0 +1,225 @@
+"""
+Projection of the weekly schedule over the coming days, with conflict analysis.
+
+The weekly schedule config combines a global schedule, per-day custom periods,
+use_global flags and overnight periods, and its overall effect is hard to see
+from the dialog. ScheduleProjection expands the compiled schedule into bitmaps
+with one bit per minute over a horizon (a year by default, 525,600 bits): a set
+bit means the schedule allows keeping the machine awake in that minute. A day
+without an opinion (disabled, or using a disabled global schedule) is all set,
+as Stay Awake then behaves as if there were no schedule. Date overrides replace
+the days they fall on.
+
+Each day is a 1,440 bit int, so totals are popcounts and transitions are the
+set bits of bitmap XOR (bitmap << 1), whole-day int operations rather than
+loops over minutes. That keeps a year-ahead projection with its analysis well
+under a millisecond, fast enough to recompute on every edit in the dialog.
+
+find_conflicts() reports periods that are empty or overlap, and short gaps
+between periods, which the dialog otherwise silently merges or ignores.
+
+    python schedule_projection.py [--config FILE] [--days 365] [--transitions 10]
+"""
+import sys
+import json
+import time
+import argparse
+from datetime import date, datetime, timedelta
+
+from compiled_schedule import CompiledSchedule, DAYS_OF_WEEK, MINUTES_PER_DAY, _period_intervals
+
+DAY_BYTES = MINUTES_PER_DAY // 8
+FULL_DAY = (1 << MINUTES_PER_DAY) - 1
+SHORT_GAP = 15  # Minutes; shorter gaps between periods are reported as likely mistakes
+
+
+def day_bitmap(intervals):
+    """Return the minute bitmap of one compiled day, all set for a day without an opinion"""
+    if intervals is None:
+        return FULL_DAY
+    bitmap = 0
+    for start, end in intervals:
+        bitmap |= ((1 << (end - start)) - 1) << start
+    return bitmap
+
+
+def _runs(bitmap, size):
+    """Return the (start, end) runs of set bits in a bitmap of size bits"""
+    edges = (bitmap ^ (bitmap << 1)) & ((1 << (size + 1)) - 1)
+    positions = []
+    while edges:
+        lowest = edges & -edges
+        positions.append(lowest.bit_length() - 1)
+        edges ^= lowest
+    return list(zip(positions[::2], positions[1::2]))
+
+
+def _format_minute(minute):
+    return f"{minute // 60:02d}:{minute % 60:02d}"
+
+
+class ScheduleProjection:
+    """A compiled weekly schedule expanded into minute bitmaps over a number of days"""
+
+    def __init__(self, weekly_schedules=None, start=None, days=365, compiled=None, date_overrides=None):
+        if compiled is None:
+            compiled = CompiledSchedule(weekly_schedules, date_overrides)
+        self.compiled = compiled
+        self.start = start or date.today()  # The horizon starts at midnight of this date
+        self.days = days
+        week = [day_bitmap(intervals) for intervals in self.compiled.days]
+        first = self.start.weekday()
+        # One 1,440 bit int per day of the horizon; days of the same weekday share theirs
+        self.day_bitmaps = [week[(first + day) % 7] for day in range(days)]
+        overridden = set()
+        for day, (intervals, _) in self.compiled.overrides.items():
+            offset = (day - self.start).days
+            if 0 <= offset < days:
+                self.day_bitmaps[offset] = day_bitmap(intervals)
+                overridden.add(offset)
+        # Day offsets within the horizon that have no opinion
+        self.unrestricted = [day for day in range(days) if self.compiled.days[(first + day) % 7] is None
+                             and day not in overridden]
+        self._bitmap = None
+
+    @property
+    def bitmap(self):
+        """The whole horizon as one int, bit n for minute n after the start (built on first use)"""
+        if self._bitmap is None:
+            self._bitmap = int.from_bytes(b"".join(bitmap.to_bytes(DAY_BYTES, "little")
+                                                   for bitmap in self.day_bitmaps), "little")
+        return self._bitmap
+
+    def active_hours(self):
+        """Return the hours within the horizon in which the schedule allows keeping awake"""
+        return sum(map(int.bit_count, self.day_bitmaps)) / 60
+
+    def day_runs(self, day):
+        """Return the active (start, end) minute runs of a day offset within the horizon"""
+        return _runs(self.day_bitmaps[day], MINUTES_PER_DAY)
+
+    def transitions(self, count=10, after=None):
+        """Return up to count (datetime, active) changes after a datetime (default: the horizon start)"""
+        origin = datetime.combine(self.start, datetime.min.time())
+        offset = 0
+        if after is not None:
+            offset = max(0, int((after - origin).total_seconds() // 60))
+        result = []
+        day = offset // MINUTES_PER_DAY
+        while day < self.days and len(result) < count:
+            bitmap = self.day_bitmaps[day]
+            # Bit 0 of the edges compares the first minute with the last one of the day before
+            previous = self.day_bitmaps[day - 1] >> (MINUTES_PER_DAY - 1) if day else bitmap & 1
+            edges = (bitmap ^ ((bitmap << 1) | previous)) & FULL_DAY
+            if day == offset // MINUTES_PER_DAY:
+                edges &= ~((1 << (offset % MINUTES_PER_DAY + 1)) - 1)
+            while edges and len(result) < count:
+                lowest = edges & -edges
+                minute = lowest.bit_length() - 1
+                result.append((origin + timedelta(minutes=day * MINUTES_PER_DAY + minute),
+                               bool(bitmap >> minute & 1)))
+                edges ^= lowest
+            day += 1
+        return result
+
+    def gaps(self):
+        """Return (weekday name, start, end) inactive stretches between two active periods of a day"""
+        result = []
+        for name, intervals in zip(DAYS_OF_WEEK, self.compiled.days):
+            for (_, end), (start, _) in zip(intervals or (), (intervals or ())[1:]):
+                result.append((name, end, start))
+        return result
+
+
+def _effective_periods(weekly_schedules, date_overrides=None):
+    """Yield (label, enabled periods) per schedule that applies, each schedule once"""
+    for key in sorted(date_overrides or {}):
+        override = date_overrides[key]
+        if override.get("mode") == "custom":
+            yield key, [p for p in override.get("periods", []) if p.get("enabled", True)]
+    schedules = weekly_schedules or {}
+    global_schedule = schedules.get("global") or {}
+    global_used = False
+    for day in DAYS_OF_WEEK:
+        day_schedule = schedules.get(day) or {}
+        if not day_schedule.get("enabled"):
+            continue
+        if day_schedule.get("use_global"):
+            global_used = global_used or global_schedule.get("enabled", False)
+            continue
+        yield day, [p for p in day_schedule.get("periods", []) if p.get("enabled")]
+    if global_used:
+        yield "Global schedule", [p for p in global_schedule.get("periods", []) if p.get("enabled")]
+
+
+def find_conflicts(weekly_schedules, date_overrides=None):
+    """Return human readable problems: empty and overlapping periods, short gaps, ineffective days"""
+    problems = []
+    schedules = weekly_schedules or {}
+    for label, periods in _effective_periods(schedules, date_overrides):
+        texts = [f"{p['start_hour']}:{p['start_minute']:02d}-{p['end_hour']}:{p['end_minute']:02d}"
+                 for p in periods]
+        intervals = [_period_intervals(p) for p in periods]
+        for text, parts in zip(texts, intervals):
+            if parts[0][0] == parts[0][1]:
+                problems.append(f"{label}: period {text} is empty")
+        for first in range(len(periods)):
+            for second in range(first + 1, len(periods)):
+                overlap = sum(max(0, min(a_end, b_end) - max(a_start, b_start))
+                              for a_start, a_end in intervals[first] for b_start, b_end in intervals[second])
+                if overlap:
+                    problems.append(f"{label}: {texts[first]} overlaps {texts[second]} by {overlap} min")
+    for day in DAYS_OF_WEEK:
+        day_schedule = schedules.get(day) or {}
+        if day_schedule.get("enabled") and day_schedule.get("use_global") \
+                and not (schedules.get("global") or {}).get("enabled"):
+            problems.append(f"{day}: uses the global schedule, which is disabled, so the day is unrestricted")
+    for name, start, end in ScheduleProjection(schedules, days=7).gaps():
+        if end - start < SHORT_GAP:
+            problems.append(f"{name}: only {end - start} min off between "
+                            f"{_format_minute(start)} and {_format_minute(end)}")
+    return problems
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="Project the weekly schedule over the coming days")
+    parser.add_argument("--config", help="Config file (default: the app's config file)")
+    parser.add_argument("--days", type=int, default=365, help="Horizon in days")
+    parser.add_argument("--transitions", type=int, default=10, help="Number of upcoming transitions to list")
+    args = parser.parse_args(argv)
+
+    import os
+    import config_schema
+    path = args.config or os.path.join(os.path.expanduser("~"), "stay_awake_config.json")
+    try:
+        with open(path, "r") as f:
+            config, _ = config_schema.load(json.load(f))
+    except (OSError, ValueError) as e:
+        print(f"Cannot read {path}: {str(e)}")
+        return 2
+    schedules = config["weekly_schedules"]
+    overrides = config["date_overrides"]
+
+    began = time.perf_counter()
+    projection = ScheduleProjection(schedules, days=args.days, date_overrides=overrides)
+    hours = projection.active_hours()
+    upcoming = projection.transitions(args.transitions, after=datetime.now())
+    problems = find_conflicts(schedules, overrides)
+    elapsed = time.perf_counter() - began
+
+    if not config["schedule"]["enabled"]:
+        print("The schedule is turned off; this is what it would do when turned on")
+    print(f"Active {hours:.1f} h over {args.days} days ({hours / args.days * 7:.1f} h a week), "
+          f"{len(projection.unrestricted)} days unrestricted")
+    for name, start, end in projection.gaps():
+        print(f"Gap on {name}: {_format_minute(start)}-{_format_minute(end)}")
+    for moment, active in upcoming:
+        print(f"{moment.strftime('%a %Y-%m-%d %H:%M')}  {'active' if active else 'inactive'}")
+    for problem in problems:
+        print(f"Problem: {problem}")
+    print(f"Projected and analysed in {elapsed * 1000:.2f} ms")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
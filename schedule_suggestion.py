@@ -0,0 +1,248 @@
+"""
+Weekly schedule suggestions inferred from the recorded activity history.
+
+The history (see activity_history.py) holds a 1,440 bit bitmap per day and state.
+A minute counts as active when Stay Awake was turned on in it: keeping the machine
+awake, or held back by an excluded app. Minutes held back by the schedule are not
+counted, as they reflect the current schedule rather than use. Days without any
+activity are not stored in the history; they count as inactive all day, from the
+first recorded day on.
+
+For each weekday the bitmaps of all its days are summed into a minute-of-week
+histogram. The counts are bit-sliced: plane i holds bit i of every minute's
+count, so adding a day is a ripple-carry add of whole 1,440 bit ints, and "active
+on at least k of n days" is a bitwise comparison of the planes against k. Months
+of history are analysed in a few milliseconds without looping over minutes.
+
+The minutes above the threshold are then clustered: runs closer than MERGE_GAP
+are joined, runs shorter than MIN_SPAN are dropped, and the rest are rounded
+outward to ROUND minutes and become the periods of that day. A day without any
+is suggested as off: enabled, with its own schedule and no periods, so the
+schedule keeps Stay Awake inactive all day (a disabled day would leave it
+unrestricted). merge_periods() joins each day's periods into one for editors
+that show a single period per day.
+
+    python schedule_suggestion.py [--days 90] [--threshold 0.5]
+"""
+import sys
+import copy
+import math
+import time
+import argparse
+from datetime import date, timedelta
+
+from activity_history import KEPT_AWAKE, APP_SUPPRESSED
+from compiled_schedule import DAYS_OF_WEEK, MINUTES_PER_DAY
+from schedule_projection import _runs, _format_minute
+
+HISTORY_DAYS = 90   # Days of history analysed by default
+THRESHOLD = 0.5     # Share of a weekday's days on which a minute must be active
+MIN_DAYS = 2        # Days of a weekday the history must cover to suggest anything for it
+MERGE_GAP = 30      # Minutes; shorter idle gaps within a span are closed
+MIN_SPAN = 30       # Minutes; shorter spans are dropped as noise
+ROUND = 15          # Period boundaries are rounded outward to multiples of this
+
+
+def add_to_histogram(planes, bitmap):
+    """Add one day bitmap to a bit-sliced histogram (a list of bit planes) in place"""
+    carry = bitmap
+    plane = 0
+    while carry:
+        if plane == len(planes):
+            planes.append(0)
+        planes[plane], carry = planes[plane] ^ carry, planes[plane] & carry
+        plane += 1
+
+
+def at_least(planes, count):
+    """Return the bitmap of minutes whose histogram count is at least count"""
+    full = (1 << MINUTES_PER_DAY) - 1
+    greater = 0
+    equal = full
+    for plane in reversed(range(max(len(planes), count.bit_length()))):
+        bits = planes[plane] if plane < len(planes) else 0
+        if count >> plane & 1:
+            equal &= bits
+        else:
+            greater |= equal & bits
+            equal &= ~bits & full
+    return greater | equal
+
+
+def span_count(planes, start, end):
+    """Return the histogram counts summed over the minutes [start, end)"""
+    mask = ((1 << (end - start)) - 1) << start
+    return sum((planes[plane] & mask).bit_count() << plane for plane in range(len(planes)))
+
+
+def cluster(bitmap):
+    """Return the (start, end) spans of a day bitmap after closing gaps, dropping noise and rounding"""
+    spans = []
+    for start, end in _runs(bitmap, MINUTES_PER_DAY):
+        if spans and start - spans[-1][1] < MERGE_GAP:
+            spans[-1] = (spans[-1][0], end)
+        else:
+            spans.append((start, end))
+    result = []
+    for start, end in spans:
+        if end - start < MIN_SPAN:
+            continue
+        start = start // ROUND * ROUND
+        end = min(MINUTES_PER_DAY, -(-end // ROUND) * ROUND)
+        if result and start <= result[-1][1]:
+            result[-1] = (result[-1][0], end)
+        else:
+            result.append((start, end))
+    return result
+
+
+def _period(start, end):
+    # A period ending at midnight is written as ending at 00:00, a whole day as 00:00-23:59
+    if end - start == MINUTES_PER_DAY:
+        end -= 1
+    return {"enabled": True, "start_hour": start // 60, "start_minute": start % 60,
+            "end_hour": end // 60 % 24, "end_minute": end % 60}
+
+
+def _format_span(start, end):
+    if end - start == MINUTES_PER_DAY:
+        return "all day"
+    return f"{_format_minute(start)}-{_format_minute(end % MINUTES_PER_DAY)}"
+
+
+class Suggestion:
+    """A suggested weekly schedule and what it is based on"""
+
+    def __init__(self, schedules, days, covered):
+        self.schedules = schedules  # Weekly schedules config ready to apply
+        self.days = days            # Weekday name -> [(start, end, share of days)], None without enough data
+        self.covered = covered      # Weekday name -> number of days of it the history covers
+
+    def is_empty(self):
+        """Check if there was not enough history for any weekday"""
+        return all(spans is None for spans in self.days.values())
+
+    def describe(self):
+        """Return one line per weekday for people"""
+        lines = []
+        for name in DAYS_OF_WEEK:
+            spans = self.days[name]
+            if spans is None:
+                lines.append(f"{name}: unchanged, {self.covered[name]} days recorded")
+            elif not spans:
+                lines.append(f"{name}: off ({self.covered[name]} days)")
+            else:
+                periods = ", ".join(f"{_format_span(start, end)} ({share:.0%})" for start, end, share in spans)
+                lines.append(f"{name}: {periods} ({self.covered[name]} days)")
+        return lines
+
+
+def suggest(history_days, current=None, threshold=THRESHOLD, min_days=MIN_DAYS, last=None):
+    """Suggest weekly schedules from {date: (kept awake, schedule off, app suppressed)} history
+
+    The history covers the days from the first recorded one to last (default:
+    the last recorded one). Weekdays covered fewer than min_days times keep
+    their current schedule, also when they used the global schedule and that
+    changes. When all suggested workdays (Monday to Friday) come out the same
+    they share the global schedule.
+    """
+    histograms = [[] for _ in DAYS_OF_WEEK]
+    for day, bitmaps in history_days.items():
+        add_to_histogram(histograms[day.weekday()], bitmaps[KEPT_AWAKE] | bitmaps[APP_SUPPRESSED])
+    covered = [0] * len(DAYS_OF_WEEK)
+    if history_days:
+        first = min(history_days)
+        span = ((last or max(history_days)) - first).days + 1
+        for weekday in range(len(DAYS_OF_WEEK)):
+            covered[weekday] = max(0, span - (weekday - first.weekday()) % 7 + 6) // 7
+
+    schedules = copy.deepcopy(current) if current else {}
+    schedules.setdefault("global", {"enabled": True, "periods": [_period(9 * 60, 17 * 60)]})
+    old_global = copy.deepcopy(schedules["global"])
+    days = {}
+    for weekday, name in enumerate(DAYS_OF_WEEK):
+        count = covered[weekday]
+        if count < min_days:
+            days[name] = None
+            continue
+        planes = histograms[weekday]
+        spans = cluster(at_least(planes, max(1, math.ceil(threshold * count))))
+        days[name] = [(start, end, span_count(planes, start, end) / (count * (end - start)))
+                      for start, end in spans]
+        # Enabled without any period: inactive all day
+        periods = [_period(start, end) for start, end in spans]
+        schedules[name] = {"enabled": True, "use_global": False, "periods": periods}
+
+    # Identical workdays share the global schedule
+    workdays = [name for name in DAYS_OF_WEEK[:5] if days[name]]
+    if len(workdays) >= 2 and all(schedules[name]["periods"] == schedules[workdays[0]]["periods"]
+                                  for name in workdays):
+        schedules["global"]["periods"] = copy.deepcopy(schedules[workdays[0]]["periods"])
+        for name in workdays:
+            schedules[name]["use_global"] = True
+    # The schedule as a whole is turned on together with the global schedule
+    schedules["global"]["enabled"] = True
+    if schedules["global"] != old_global:
+        # Days left unchanged must not follow the new global schedule
+        for name in DAYS_OF_WEEK:
+            day_schedule = schedules.get(name)
+            if days[name] is None and day_schedule and day_schedule.get("enabled") and day_schedule.get("use_global"):
+                if old_global.get("enabled"):
+                    day_schedule.update(use_global=False, periods=copy.deepcopy(old_global["periods"]))
+                else:
+                    # It used a disabled global schedule, so it was unrestricted
+                    day_schedule["enabled"] = False
+    return Suggestion(schedules, days, dict(zip(DAYS_OF_WEEK, covered)))
+
+
+def merge_periods(suggestion):
+    """Return the suggested schedules with at most one period per day, and a line per merged day
+
+    A day's periods are joined into one from the first start to the last end,
+    which keeps Stay Awake on during the breaks between them.
+    """
+    schedules = copy.deepcopy(suggestion.schedules)
+    merged = []
+    for name in DAYS_OF_WEEK:
+        spans = suggestion.days[name]
+        if not spans or len(spans) < 2:
+            continue
+        start, end = spans[0][0], spans[-1][1]
+        schedules[name]["periods"] = [_period(start, end)]
+        if schedules[name]["use_global"]:
+            schedules["global"]["periods"] = [_period(start, end)]
+        parts = ", ".join(_format_span(span_start, span_end) for span_start, span_end, _ in spans)
+        merged.append(f"{name}: {parts} joined into {_format_span(start, end)}")
+    return schedules, merged
+
+
+def suggest_from_history(history, days=HISTORY_DAYS, current=None, threshold=THRESHOLD, today=None):
+    """Suggest weekly schedules from the last days of an ActivityHistory"""
+    today = today or date.today()
+    # Today is still being recorded, so only complete days are used
+    last = today - timedelta(days=1)
+    return suggest(history.days(today - timedelta(days=days), last), current, threshold, last=last)
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="Suggest a weekly schedule from the recorded history")
+    parser.add_argument("--days", type=int, default=HISTORY_DAYS, help="Days of history to analyse")
+    parser.add_argument("--threshold", type=float, default=THRESHOLD,
+                        help="Share of recorded days a minute must be active on (0-1)")
+    args = parser.parse_args(argv)
+
+    from activity_history import ActivityHistory
+    history = ActivityHistory()
+    began = time.perf_counter()
+    suggestion = suggest_from_history(history, args.days, threshold=args.threshold)
+    elapsed = time.perf_counter() - began
+    if suggestion.is_empty():
+        print(f"Not enough history yet: a weekday needs {MIN_DAYS} recorded days")
+    for line in suggestion.describe():
+        print(line)
+    print(f"Analysed {sum(suggestion.covered.values())} days in {elapsed * 1000:.1f} ms")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
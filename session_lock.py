@@ -0,0 +1,214 @@
+"""
+Session-lock and screen-off awareness.
+
+Simulated input is wasted while the workstation is locked or the display is off,
+and on some systems it fights the lock screen. The SessionLockMonitor tracks that
+state from push notifications instead of polling:
+
+- Windows: WTS session change notifications (WM_WTSSESSION_CHANGE) and the console
+  display state power setting, delivered to the main window
+- Linux: logind Lock/Unlock signals for the current session, read from `gdbus monitor`
+
+FakeLockSource drives the monitor by hand, e.g. in tests.
+"""
+import os
+import sys
+import shutil
+import threading
+import subprocess
+
+# What to do while the session is locked or the screen is off, and the defaults
+from monitor_defaults import WHEN_LOCKED_PAUSE, WHEN_LOCKED_INHIBIT, DEFAULT_LOCK_SETTINGS  # noqa: F401
+
+
+class SessionLockMonitor:
+    """Current lock and display state, updated by a push source"""
+
+    def __init__(self):
+        self.locked = False
+        self.display_off = False
+        self.listeners = []  # Called with no arguments when the state changes
+
+    def set_locked(self, locked):
+        if locked != self.locked:
+            self.locked = locked
+            self._notify()
+
+    def set_display_off(self, display_off):
+        if display_off != self.display_off:
+            self.display_off = display_off
+            self._notify()
+
+    def is_idle(self, include_screen_off=True):
+        """Check if input injection is pointless right now"""
+        return self.locked or (include_screen_off and self.display_off)
+
+    def _notify(self):
+        for listener in self.listeners:
+            try:
+                listener()
+            except Exception as e:
+                print(f"Error in session lock listener: {str(e)}")
+
+
+class WindowsSessionSource:
+    """Feeds the monitor from messages received by a top-level window"""
+
+    WM_WTSSESSION_CHANGE = 0x02B1
+    WTS_SESSION_LOCK = 0x7
+    WTS_SESSION_UNLOCK = 0x8
+    NOTIFY_FOR_THIS_SESSION = 0
+
+    WM_POWERBROADCAST = 0x0218
+    PBT_POWERSETTINGCHANGE = 0x8013
+    DEVICE_NOTIFY_WINDOW_HANDLE = 0
+    # GUID_CONSOLE_DISPLAY_STATE {6FE69556-704A-47A0-8F24-C28D936FDA47}
+    GUID_CONSOLE_DISPLAY_STATE = "{6FE69556-704A-47A0-8F24-C28D936FDA47}"
+
+    def __init__(self, monitor):
+        self.monitor = monitor
+        self.hwnd = None
+        self._power_notification = None
+
+    def register(self, hwnd):
+        """Ask Windows to send session and display notifications to a window"""
+        import ctypes
+        from ctypes import wintypes
+
+        if not ctypes.windll.wtsapi32.WTSRegisterSessionNotification(wintypes.HWND(hwnd),
+                                                                     self.NOTIFY_FOR_THIS_SESSION):
+            raise OSError("WTSRegisterSessionNotification failed")
+        self.hwnd = hwnd
+
+        guid = self._guid(self.GUID_CONSOLE_DISPLAY_STATE)
+        user32 = ctypes.windll.user32
+        user32.RegisterPowerSettingNotification.restype = wintypes.HANDLE
+        self._guid_buffer = guid  # Must stay alive while registered
+        self._power_notification = user32.RegisterPowerSettingNotification(
+            wintypes.HANDLE(hwnd), ctypes.byref(guid), self.DEVICE_NOTIFY_WINDOW_HANDLE)
+
+    def unregister(self):
+        if self.hwnd is None:
+            return
+        import ctypes
+        from ctypes import wintypes
+        ctypes.windll.wtsapi32.WTSUnRegisterSessionNotification(wintypes.HWND(self.hwnd))
+        if self._power_notification:
+            ctypes.windll.user32.UnregisterPowerSettingNotification(wintypes.HANDLE(self._power_notification))
+            self._power_notification = None
+        self.hwnd = None
+
+    @staticmethod
+    def _guid(text):
+        import ctypes
+        import uuid
+
+        class GUID(ctypes.Structure):
+            _fields_ = [("data", ctypes.c_ubyte * 16)]
+
+        guid = GUID()
+        ctypes.memmove(guid.data, uuid.UUID(text).bytes_le, 16)
+        return guid
+
+    def handle_message(self, message, wparam, lparam):
+        """Process a window message, returns True if it was a session or display change"""
+        if message == self.WM_WTSSESSION_CHANGE:
+            if wparam == self.WTS_SESSION_LOCK:
+                self.monitor.set_locked(True)
+                return True
+            if wparam == self.WTS_SESSION_UNLOCK:
+                self.monitor.set_locked(False)
+                return True
+        elif message == self.WM_POWERBROADCAST and wparam == self.PBT_POWERSETTINGCHANGE and lparam:
+            import ctypes
+            import uuid
+            # POWERBROADCAST_SETTING: GUID PowerSetting, DWORD DataLength, UCHAR Data[]
+            setting = uuid.UUID(bytes_le=ctypes.string_at(lparam, 16))
+            if setting == uuid.UUID(self.GUID_CONSOLE_DISPLAY_STATE):
+                state = ctypes.c_ulong.from_address(lparam + 20).value
+                # 0 = off, 1 = on, 2 = dimmed
+                self.monitor.set_display_off(state == 0)
+                return True
+        return False
+
+
+def _escape_object_path_label(label):
+    """Escape a string for use in a D-Bus object path, like sd_bus_path_encode"""
+    escaped = []
+    for index, char in enumerate(label):
+        if char.isalnum() and char.isascii() and not (index == 0 and char.isdigit()):
+            escaped.append(char)
+        else:
+            escaped.append("_%02x" % ord(char))
+    return "".join(escaped)
+
+
+class LogindLockSource:
+    """Feeds the monitor from logind Lock/Unlock signals of the current session"""
+
+    def __init__(self, monitor, session_id=None):
+        self.monitor = monitor
+        self.session_id = session_id or os.environ.get("XDG_SESSION_ID")
+        self._process = None
+        self._thread = None
+
+    def start(self):
+        if not sys.platform.startswith("linux"):
+            raise OSError("logind is only available on Linux")
+        if not self.session_id:
+            raise OSError("XDG_SESSION_ID is not set")
+        if not shutil.which("gdbus"):
+            raise OSError("gdbus is not installed")
+
+        path = "/org/freedesktop/login1/session/" + _escape_object_path_label(self.session_id)
+        self._process = subprocess.Popen(
+            ["gdbus", "monitor", "--system", "--dest", "org.freedesktop.login1", "--object-path", path],
+            stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        for line in self._process.stdout:
+            # e.g. "/org/freedesktop/login1/session/_32: org.freedesktop.login1.Session.Lock ()"
+            if "org.freedesktop.login1.Session.Lock " in line:
+                self.monitor.set_locked(True)
+            elif "org.freedesktop.login1.Session.Unlock " in line:
+                self.monitor.set_locked(False)
+            elif "'LockedHint': <true>" in line:
+                self.monitor.set_locked(True)
+            elif "'LockedHint': <false>" in line:
+                self.monitor.set_locked(False)
+
+    def stop(self):
+        if self._process is not None:
+            self._process.terminate()
+            try:
+                self._process.wait(timeout=2)
+            except Exception:
+                self._process.kill()
+            self._process = None
+        if self._thread is not None:
+            self._thread.join(timeout=2.0)
+            self._thread = None
+
+
+class FakeLockSource:
+    """Lock source driven by hand, for tests and simulations"""
+
+    def __init__(self, monitor):
+        self.monitor = monitor
+
+    def start(self):
+        pass
+
+    def stop(self):
+        pass
+
+    def lock(self):
+        self.monitor.set_locked(True)
+
+    def unlock(self):
+        self.monitor.set_locked(False)
+
+    def display(self, on):
+        self.monitor.set_display_off(not on)
@@ -0,0 +1,417 @@
+"""
+Time-warp simulation of the keep-awake engine.
+
+Runs the real rule engine (schedule and excluded app rules) through a scripted
+week in a fraction of a second, with four injectable fakes:
+
+- SimulatedClock: the time the engine sees, moved forward by the simulation
+- FakeProcessEventSource (process_events): processes starting and exiting
+- SimulatedIdleSource: user input and the OS idle timer that puts the machine to sleep
+- CountingInjector: records simulated activity instead of injecting input
+
+The battery, for the power policy, is a FakeBatterySource (power_policy) driven
+by the scenario as well.
+
+Decisions are made on the same 5 second tick grid as StayAwakeWorker.run, but
+instead of visiting every tick the simulation jumps to the next tick at which
+something can change: a scripted event, a schedule transition or an injection
+falling due. When the idle timer runs out first, the machine sleeps until the
+next user input. The result is a decision timeline and the injection count.
+
+Scenario times are wall clock times in the scenario's time zone (or plain
+timestamps, as in recorded traces, see activity_trace.py), so DST shifts
+are simulated by picking a zone and a week with a transition. Without arguments
+the built-in scenario runs the week of the 2026 spring DST shift in Berlin:
+
+    python simulation.py [--timezone Europe/Berlin] [--start 2026-03-23] [--config FILE]
+"""
+import sys
+import json
+import time
+import argparse
+import itertools
+from datetime import datetime, timedelta
+
+import config_schema
+from app_matcher import AppMatcher
+from compiled_schedule import CompiledSchedule
+from engine_settings import EngineSettings
+from process_events import FakeProcessEventSource, ProcessTracker
+from power_policy import FakeBatterySource, PowerPolicy
+from rules import create_default_engine
+from session_lock import DEFAULT_LOCK_SETTINGS
+
+TICK = 5.0  # Seconds between decisions, as in StayAwakeWorker.run
+DEFAULT_SLEEP_AFTER = 15 * 60  # OS idle timeout in seconds
+
+# Timeline states
+AWAKE = "awake"    # Stay Awake keeps the machine awake
+IDLE = "idle"      # Normal sleep settings apply
+ASLEEP = "asleep"  # The OS idle timer ran out
+
+
+def settings_from_config(config):
+    """Return the EngineSettings the worker would run with for a config"""
+    config, _ = config_schema.load(config)
+    schedules = config["weekly_schedules"]
+    activity = config["activity_settings"]
+    return EngineSettings(
+        active=config["active"],
+        schedule_active=config["schedule"]["enabled"],
+        weekly_schedules=schedules,
+        date_overrides=config["date_overrides"],
+        compiled_schedule=CompiledSchedule(schedules, config["date_overrides"]),
+        app_monitoring_active=config["app_monitoring"]["enabled"],
+        excluded_apps=AppMatcher(config["app_monitoring"]["apps"]),
+        # Rules without a simulated source stay off
+        foreground_monitoring_active=False,
+        foreground_only_apps=AppMatcher(),
+        foreground_suspend_apps=AppMatcher(),
+        load_monitoring_active=False,
+        network_monitoring_active=False,
+        process_holds_active=False,
+        power_policy_active=config["power_policy"]["enabled"],  # Pass power_settings to Simulation
+        calendar_active=False,
+        session_lock_active=False,
+        session_lock_settings=dict(DEFAULT_LOCK_SETTINGS),
+        activity_type=activity["type"],
+        activity_interval=int(activity["interval"]),
+        custom_key_code=int(activity.get("custom_key", "7E"), 16)
+    )
+
+
+class SimulatedClock:
+    """Clock read by the rule engine; the simulation moves it forward"""
+
+    def __init__(self, start):
+        self.now = start
+
+    def __call__(self):
+        return self.now
+
+    def advance_to(self, moment):
+        self.now = max(self.now, moment)
+
+
+class SimulatedIdleSource:
+    """Time of the last input, real or injected, and the OS sleep timeout"""
+
+    def __init__(self, last_input, sleep_after=DEFAULT_SLEEP_AFTER):
+        self.last_input = last_input
+        self.sleep_after = sleep_after  # None: the machine never sleeps
+
+    def input(self, moment, until=None):
+        """Input at a moment, or continuous input from the moment until another"""
+        self.last_input = max(self.last_input, moment if until is None else until)
+
+    def idle_seconds(self, now):
+        return max(0.0, now - self.last_input)
+
+    def sleep_deadline(self):
+        """Return when the machine falls asleep without further input, or None"""
+        if not self.sleep_after:
+            return None
+        return self.last_input + self.sleep_after
+
+
+class CountingInjector:
+    """Records simulated activity instead of injecting input"""
+
+    def __init__(self):
+        self.injections = []  # (timestamp, activity type)
+
+    @property
+    def count(self):
+        return len(self.injections)
+
+    def inject(self, now, activity_type):
+        self.injections.append((now, activity_type))
+        return True
+
+
+class Scenario:
+    """Scripted events, given as naive wall clock datetimes in the scenario's time zone
+
+    Moments can also be given as timestamps.
+    """
+
+    def __init__(self, start, days=7, timezone=None):
+        self.start = start
+        if isinstance(start, datetime):
+            self.end = start + timedelta(days=days)
+        else:
+            self.end = start + days * 86400
+        self.timezone = timezone  # tzinfo, None for local time
+        self.processes = {}  # pid -> name of the processes running at the start
+        self.events = []  # (timestamp, order, kind, value)
+        self._order = itertools.count()
+        self._pids = itertools.count(1000)
+
+    def timestamp(self, moment):
+        if not isinstance(moment, datetime):
+            return float(moment)
+        if self.timezone is not None:
+            moment = moment.replace(tzinfo=self.timezone)
+        return moment.timestamp()
+
+    def _add(self, moment, kind, value=None):
+        self.events.append((self.timestamp(moment), next(self._order), kind, value))
+
+    def process_start(self, moment, name, pid=None):
+        """A process starts; returns its pid for process_exit"""
+        if pid is None:
+            pid = next(self._pids)
+        self._add(moment, "start", (pid, name))
+        return pid
+
+    def process_exit(self, moment, pid):
+        self._add(moment, "exit", pid)
+
+    def process_run(self, start, end, name):
+        """A process runs from start to end"""
+        self.process_exit(end, self.process_start(start, name))
+
+    def user_input(self, moment, minutes=0):
+        """The user is at the machine, from moment for a number of minutes"""
+        if isinstance(moment, datetime):
+            until = self.timestamp(moment + timedelta(minutes=minutes))
+        else:
+            until = moment + minutes * 60
+        self._add(moment, "input", until)
+
+    def battery(self, moment, percent, plugged):
+        """The battery state changes; percent None means no battery"""
+        self._add(moment, "battery", (percent, bool(plugged)))
+
+    def set_active(self, moment, active):
+        """The user turns Stay Awake on or off"""
+        self._add(moment, "active", bool(active))
+
+
+class Simulation:
+    """Runs the rule engine through a scenario on simulated time"""
+
+    def __init__(self, settings, scenario, clock=None, process_source=None, idle_source=None,
+                 injector=None, tick=TICK, power_settings=None):
+        self.settings = settings
+        self.scenario = scenario
+        self.start = scenario.timestamp(scenario.start)
+        self.end = scenario.timestamp(scenario.end)
+        self.tick = tick
+        self.clock = clock or SimulatedClock(self.start)
+        self.process_source = process_source or FakeProcessEventSource(
+            {pid: (0, name) for pid, name in scenario.processes.items()})
+        self.idle_source = idle_source or SimulatedIdleSource(self.start)
+        self.injector = injector or CountingInjector()
+        self.battery = FakeBatterySource(present=False)
+        self.power_policy = PowerPolicy(power_settings, source=self.battery, clock=self.clock)
+        self.tracker = ProcessTracker(settings.excluded_apps, sources=[self.process_source],
+                                      on_change=lambda: self.engine.invalidate("excluded_apps"))
+        self.engine = create_default_engine(self.tracker, power_policy=self.power_policy)
+        self.engine.clock = self.clock
+        self.schedule_rule = self.engine.get_rule("schedule")
+        self.schedule_rule.timezone = scenario.timezone
+        self.timeline = []  # (timestamp, state, reason) whenever the state or reason changes
+        self.evaluations = 0
+        self.seconds = {AWAKE: 0.0, IDLE: 0.0, ASLEEP: 0.0}
+
+    def _record(self, moment, state, reason):
+        if self.timeline:
+            previous_moment, previous_state, previous_reason = self.timeline[-1]
+            if (state, reason) == (previous_state, previous_reason):
+                return
+            self.seconds[previous_state] += moment - previous_moment
+        self.timeline.append((moment, state, reason))
+
+    def _apply(self, kind, value):
+        if kind == "start":
+            self.process_source.emit_start(*value)
+        elif kind == "exit":
+            self.process_source.emit_exit(value)
+        elif kind == "active":
+            self.settings = self.settings._replace(active=value)
+        elif kind == "battery":
+            percent, plugged = value
+            self.battery.present = percent is not None
+            self.battery.percent = percent
+            self.battery.plugged = plugged
+            # Like WM_POWERBROADCAST, the change is pushed rather than polled
+            self.power_policy.notify_change()
+
+    def _next_tick(self, now, target, strict=False):
+        """Return the first tick after now at (or strictly after) target"""
+        ticks = max(1, -(-(target - now) // self.tick))
+        moment = now + ticks * self.tick
+        if strict and moment <= target:
+            moment += self.tick
+        return moment
+
+    def run(self):
+        """Run the scenario to its end and return self"""
+        events = sorted(self.scenario.events)
+        index = 0
+        last_action = self.start  # The worker starts counting from its start
+        next_schedule = None  # (valid for settings, next transition or recheck time)
+        self.tracker.start()
+        now = self.start
+        while now < self.end:
+            self.clock.advance_to(now)
+            while index < len(events) and events[index][0] <= now:
+                moment, _, kind, value = events[index]
+                if kind == "input":
+                    self.idle_source.input(moment, value)
+                else:
+                    self._apply(kind, value)
+                index += 1
+
+            # The decision of one worker tick
+            settings = self.settings
+            self.evaluations += 1
+            keeping_awake = settings.active and not self.engine.should_be_inactive(settings, now)
+            interval = settings.activity_interval
+            inhibiting = False
+            if keeping_awake and settings.power_policy_active:
+                interval = self.power_policy.effective_interval(interval)
+                inhibiting = self.power_policy.inhibit_only()
+            if keeping_awake:
+                if inhibiting:
+                    # A power inhibit keeps the machine awake without injecting input
+                    self.idle_source.input(now)
+                elif now - last_action > interval:
+                    if self.injector.inject(now, settings.activity_type):
+                        last_action = now
+                        self.idle_source.input(now)
+                self._record(now, AWAKE, None)
+            else:
+                reason = self.engine.last_reason() if settings.active else "Turned off"
+                self._record(now, IDLE, reason)
+
+            # Jump to the next tick where anything can change
+            if next_schedule is None or next_schedule[0] is not settings.compiled_schedule \
+                    or now >= next_schedule[1]:
+                transition = self.schedule_rule.next_transition(settings, now)
+                next_schedule = (settings.compiled_schedule,
+                                 transition if transition is not None else now + 7 * 86400)
+            target = min(next_schedule[1], events[index][0] if index < len(events) else self.end)
+            following = self._next_tick(now, target)
+            if keeping_awake and not inhibiting:
+                following = min(following, self._next_tick(now, last_action + interval, strict=True))
+
+            deadline = self.idle_source.sleep_deadline()
+            if inhibiting:
+                deadline = None
+            # Input scripted before the deadline keeps the machine awake
+            pending = index
+            while deadline is not None and pending < len(events) and events[pending][0] <= deadline:
+                if events[pending][2] == "input":
+                    deadline = None
+                pending += 1
+            if deadline is not None and deadline < min(following, self.end):
+                # The idle timer runs out before the next tick: sleep until the user is back
+                self._record(max(deadline, now), ASLEEP, None)
+                wake = next((event[0] for event in events[index:] if event[2] == "input"
+                             and event[0] > deadline), self.end)
+                now = wake
+                continue
+            now = following
+
+        if self.timeline:
+            moment, state, _ = self.timeline[-1]
+            self.seconds[state] += self.end - moment
+        self.tracker.stop()
+        return self
+
+    def format_timeline(self):
+        lines = []
+        for moment, state, reason in self.timeline:
+            local = datetime.fromtimestamp(moment, self.scenario.timezone)
+            when = local.strftime("%a %Y-%m-%d %H:%M:%S %Z").rstrip()
+            lines.append(f"{when}  {state:6}  {reason or ''}".rstrip())
+        return lines
+
+    def summary(self):
+        hours = {state: seconds / 3600 for state, seconds in self.seconds.items()}
+        return (f"{self.injector.count} injections, {len(self.timeline)} decision changes, "
+                f"{self.evaluations} evaluations; awake {hours[AWAKE]:.1f} h, "
+                f"idle {hours[IDLE]:.1f} h, asleep {hours[ASLEEP]:.1f} h")
+
+
+def demo_config():
+    """Weekdays 9-17, an overnight Friday, a Sunday period across the DST shift, excluded apps"""
+    config = config_schema.default_config()
+    schedules = config["weekly_schedules"]
+    schedules["Friday"].update(use_global=False, periods=[
+        {"enabled": True, "start_hour": 9, "start_minute": 0, "end_hour": 17, "end_minute": 0},
+        {"enabled": True, "start_hour": 22, "start_minute": 0, "end_hour": 6, "end_minute": 0}])
+    schedules["Saturday"].update(enabled=True, use_global=False, periods=[
+        {"enabled": True, "start_hour": 10, "start_minute": 0, "end_hour": 14, "end_minute": 0}])
+    schedules["Sunday"].update(enabled=True, use_global=False, periods=[
+        {"enabled": True, "start_hour": 1, "start_minute": 0, "end_hour": 3, "end_minute": 30}])
+    config["app_monitoring"] = {"enabled": True, "apps": ["game.exe", "re:^backup.*"]}
+    return config
+
+
+def demo_scenario(start, timezone=None):
+    """A week of a user at the machine in the morning, excluded apps, a manual toggle and late nights"""
+    scenario = Scenario(start, days=7, timezone=timezone)
+    for day in range(7):
+        date = start + timedelta(days=day)
+        scenario.user_input(date.replace(hour=8, minute=30), minutes=20)
+        scenario.user_input(date.replace(hour=13, minute=0), minutes=10)
+    scenario.process_run(start + timedelta(days=1, hours=11), start + timedelta(days=1, hours=12, minutes=30),
+                         "game.exe")
+    scenario.process_run(start + timedelta(days=3, hours=10), start + timedelta(days=3, hours=11),
+                         "backup_tool.exe")
+    # Late on Friday into the overnight period, and at night across the DST shift on Sunday
+    scenario.user_input(start + timedelta(days=4, hours=21, minutes=50), minutes=15)
+    scenario.user_input(start + timedelta(days=6, minutes=50), minutes=15)
+    scenario.set_active(start + timedelta(days=2, hours=12), False)
+    scenario.set_active(start + timedelta(days=2, hours=12, minutes=45), True)
+    return scenario
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="Simulate the keep-awake engine through a week")
+    parser.add_argument("--timezone", default="Europe/Berlin", help="IANA time zone, or 'local'")
+    parser.add_argument("--start", default="2026-03-23", help="First day (YYYY-MM-DD)")
+    parser.add_argument("--config", help="Config file to simulate instead of the demo config")
+    parser.add_argument("--sleep-after", type=float, default=DEFAULT_SLEEP_AFTER / 60,
+                        help="OS idle timeout in minutes, 0 for never")
+    parser.add_argument("--quiet", action="store_true", help="Only print the summary")
+    args = parser.parse_args(argv)
+
+    timezone = None
+    if args.timezone != "local":
+        from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+        try:
+            timezone = ZoneInfo(args.timezone)
+        except ZoneInfoNotFoundError:
+            print(f"Unknown time zone {args.timezone} (is tzdata from requirements.txt installed?)")
+            return 2
+    start = datetime.strptime(args.start, "%Y-%m-%d")
+    if args.config:
+        with open(args.config, "r") as f:
+            config = json.load(f)
+    else:
+        config = demo_config()
+
+    config, _ = config_schema.load(config)
+    scenario = demo_scenario(start, timezone)
+    began = time.perf_counter()
+    simulation = Simulation(settings_from_config(config), scenario,
+                            idle_source=SimulatedIdleSource(scenario.timestamp(start),
+                                                            args.sleep_after * 60),
+                            power_settings=config["power_policy"])
+    simulation.run()
+    elapsed = time.perf_counter() - began
+
+    if not args.quiet:
+        for line in simulation.format_timeline():
+            print(line)
+    print(simulation.summary())
+    print(f"Simulated {(simulation.end - simulation.start) / 86400:.1f} days in {elapsed * 1000:.1f} ms")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,93 @@
+"""
+Binary startup cache of the compiled configuration.
+
+Starting normally means reading the JSON config, migrating and validating it,
+compiling the weekly schedules and excluded app patterns and deriving the
+schedule summary. The cache stores the result of all that as a pickled Snapshot
+next to a key made from the config file contents, the application version, the
+config schema version and the cache format. When the key matches, startup uses
+the snapshot and skips parsing and compiling.
+
+The cache lives in the local, non-roaming cache directory, so it adds no file
+traffic to roaming home directories. It is only a cache: a missing, stale or
+unreadable file means a normal start, and it is rewritten on the next exit. The
+file is only ever read back by the user who wrote it, with the same trust as the
+config file itself.
+"""
+import os
+import sys
+import pickle
+import hashlib
+
+import config_schema
+
+# Bump when Snapshot or the compiled classes change shape
+CACHE_FORMAT = 3
+
+MAGIC = b"SACC"
+KEY_SIZE = 32  # sha256 digest
+
+
+def cache_directory():
+    """Return the local (non-roaming) cache directory for this platform"""
+    if sys.platform == "win32":
+        base = os.environ.get("LOCALAPPDATA") or os.path.join(os.path.expanduser("~"), "AppData", "Local")
+        return os.path.join(base, "StayAwake")
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "stay_awake")
+
+
+CACHE_FILE = os.path.join(cache_directory(), "startup.cache")
+
+
+class Snapshot:
+    """Ready-to-apply state derived from one version of the config file"""
+
+    def __init__(self, config, compiled_schedule, excluded_apps, schedule_summary):
+        self.config = config                        # Migrated and validated config
+        self.compiled_schedule = compiled_schedule  # CompiledSchedule of the weekly schedules and date overrides
+        self.excluded_apps = excluded_apps          # AppMatcher of config["app_monitoring"]["apps"]
+        self.schedule_summary = schedule_summary    # compiled_schedule.summarize() result
+
+
+def cache_key(config_bytes, app_version):
+    """Return the key for a config file's exact contents"""
+    digest = hashlib.sha256()
+    digest.update(f"{app_version}\0{config_schema.SCHEMA_VERSION}\0{CACHE_FORMAT}\0".encode("utf-8"))
+    digest.update(config_bytes)
+    return digest.digest()
+
+
+def load_snapshot(key, path=CACHE_FILE):
+    """Return the cached Snapshot for a key, or None on a miss"""
+    try:
+        with open(path, "rb") as f:
+            # Compare the key before unpickling anything
+            if f.read(len(MAGIC) + KEY_SIZE) != MAGIC + key:
+                return None
+            snapshot = pickle.load(f)
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        print(f"Ignoring unreadable startup cache {path}: {str(e)}")
+        return None
+    return snapshot if isinstance(snapshot, Snapshot) else None
+
+
+def save_snapshot(key, snapshot, path=CACHE_FILE):
+    """Write the Snapshot for a key, replacing the previous cache atomically"""
+    temporary = f"{path}.tmp"
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(temporary, "wb") as f:
+            f.write(MAGIC + key)
+            pickle.dump(snapshot, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temporary, path)
+        return True
+    except Exception as e:
+        print(f"Error writing startup cache {path}: {str(e)}")
+        try:
+            os.remove(temporary)
+        except OSError:
+            pass
+        return False
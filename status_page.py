@@ -0,0 +1,157 @@
+"""
+Shared-memory status page for status bars, monitoring agents and scripts.
+
+The worker publishes its state into a small fixed-layout file that readers map
+into memory, so asking "is Stay Awake holding the machine awake, and why" costs
+no socket round-trip and never blocks the worker. Updates are guarded by a
+seqlock: the writer makes the sequence number odd, writes the fields and makes
+it even again. A reader copies the page and retries if the sequence number was
+odd or changed in between.
+
+This module only uses the standard library, so readers can import it without Qt
+or psutil:
+
+    from status_page import read_status
+    status = read_status()  # None if Stay Awake is not running
+
+Run `python status_page.py [--json]` to print the current status.
+"""
+import os
+import sys
+import mmap
+import time
+import struct
+
+STATUS_PAGE_FILE = os.path.join(os.path.expanduser("~"), ".stay_awake_status")
+
+MAGIC = b"SAWS"
+VERSION = 1
+
+# Header: magic, layout version, sequence number
+HEADER = struct.Struct("<4sI Q")
+# Payload: active, keeping awake, power inhibit held, pad, pid,
+# updated at, last injection, next transition (0 = none),
+# injection count, evaluation count, lease count, pad, reason (UTF-8, NUL padded)
+REASON_SIZE = 128
+PAYLOAD = struct.Struct(f"<B B B x I d d d Q Q I 4x {REASON_SIZE}s")
+SEQUENCE_OFFSET = 8
+PAGE_SIZE = HEADER.size + PAYLOAD.size
+
+# Reader attempts before giving up on a page that keeps changing
+MAX_READ_ATTEMPTS = 100
+
+
+class StatusPageWriter:
+    """Publishes the worker state, used by the single running instance only"""
+
+    def __init__(self, path=STATUS_PAGE_FILE):
+        self.path = path
+        self.sequence = 0
+        with open(path, "w+b") as f:
+            f.write(b"\0" * PAGE_SIZE)
+            f.flush()
+            self._map = mmap.mmap(f.fileno(), PAGE_SIZE)
+        HEADER.pack_into(self._map, 0, MAGIC, VERSION, self.sequence)
+
+    def write(self, active, keeping_awake, inhibiting, last_injection, next_transition,
+              injection_count, evaluation_count, lease_count, reason):
+        """Publish a new state; readers never see a half written page"""
+        encoded = (reason or "").encode("utf-8")[:REASON_SIZE]
+        self.sequence += 1  # Odd: write in progress
+        struct.pack_into("<Q", self._map, SEQUENCE_OFFSET, self.sequence)
+        PAYLOAD.pack_into(self._map, HEADER.size, bool(active), bool(keeping_awake), bool(inhibiting),
+                          os.getpid(), time.time(), last_injection or 0.0, next_transition or 0.0,
+                          injection_count, evaluation_count, lease_count, encoded)
+        self.sequence += 1  # Even: page is consistent
+        struct.pack_into("<Q", self._map, SEQUENCE_OFFSET, self.sequence)
+
+    def close(self):
+        """Unpublish the page so readers see that Stay Awake is not running"""
+        if self._map is None:
+            return
+        self._map.close()
+        self._map = None
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+
+class StatusPageReader:
+    """Reads the status page of the running instance without blocking it"""
+
+    def __init__(self, path=STATUS_PAGE_FILE):
+        with open(path, "rb") as f:
+            self._map = mmap.mmap(f.fileno(), PAGE_SIZE, access=mmap.ACCESS_READ)
+        magic, version, _ = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC or version != VERSION:
+            self.close()
+            raise ValueError(f"{path} is not a Stay Awake status page (version {VERSION})")
+
+    def read(self):
+        """Return a consistent copy of the status as a dict, or None if the writer is too busy"""
+        for _ in range(MAX_READ_ATTEMPTS):
+            before = struct.unpack_from("<Q", self._map, SEQUENCE_OFFSET)[0]
+            if before & 1:
+                continue
+            data = self._map[HEADER.size:PAGE_SIZE]
+            if struct.unpack_from("<Q", self._map, SEQUENCE_OFFSET)[0] == before:
+                return self._decode(data)
+        return None
+
+    @staticmethod
+    def _decode(data):
+        (active, keeping_awake, inhibiting, pid, updated_at, last_injection, next_transition,
+         injection_count, evaluation_count, lease_count, reason) = PAYLOAD.unpack(data)
+        return {
+            "active": bool(active),
+            "keeping_awake": bool(keeping_awake),
+            "inhibiting": bool(inhibiting),
+            "pid": pid,
+            "updated_at": updated_at,
+            "last_injection": last_injection or None,
+            "next_transition": next_transition or None,
+            "injection_count": injection_count,
+            "evaluation_count": evaluation_count,
+            "lease_count": lease_count,
+            "reason": reason.rstrip(b"\0").decode("utf-8", "replace") or None
+        }
+
+    def close(self):
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+
+
+def read_status(path=STATUS_PAGE_FILE):
+    """Read the status page once, returns None if Stay Awake is not running"""
+    try:
+        reader = StatusPageReader(path)
+    except (OSError, ValueError):
+        return None
+    try:
+        return reader.read()
+    finally:
+        reader.close()
+
+
+def main(argv):
+    import json
+
+    status = read_status()
+    if "--json" in argv:
+        print(json.dumps(status))
+    elif status is None:
+        print("Stay Awake is not running")
+    else:
+        state = "keeping the computer awake" if status["keeping_awake"] else "idle"
+        print(f"Stay Awake is {'ON' if status['active'] else 'OFF'}, {state}")
+        if status["reason"]:
+            print(f"Reason: {status['reason']}")
+        if status["next_transition"]:
+            print(f"Next change: {time.strftime('%a %H:%M', time.localtime(status['next_transition']))}")
+    return 0 if status is not None else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -1,9 +1,25 @@
 import sys
 import os
+from instance import is_control_command, run_client
+
+if __name__ == "__main__" and sys.argv[1:2] == ["run"]:
+    # `stay_awake.py run -- COMMAND`: keep awake while the command runs, without Qt.
+    # Checked first, as the command may have arguments that look like control flags
+    from keep_awake import main as run_main
+    sys.exit(run_main(sys.argv[2:]))
+
+if __name__ == "__main__" and is_control_command(sys.argv[1:]):
+    # Talk to the running instance and exit before paying for the Qt import
+    sys.exit(run_client(sys.argv[1:]))
+
 import time
+import re
 import json
+import copy
 import threading
-from datetime import datetime, time as dt_time
+import concurrent.futures
+import psutil
+from datetime import datetime, timedelta
 from PyQt6.QtWidgets import (QApplication, QMainWindow, QSystemTrayIcon, QMenu, 
                            QWidget, QVBoxLayout, QHBoxLayout, QLabel, QPushButton, 
                            QTimeEdit, QCheckBox, QListWidget, QListWidgetItem, QFileDialog,
@@ -13,54 +29,40 @@ from PyQt6.QtCore import Qt, QTime, pyqtSignal, QObject, QThread
 from PyQt6.QtGui import QIcon, QAction
 import win32api
 import win32con
-import psutil
-import win32gui
-import win32process
 from weekly_schedule_dialog import WeeklyScheduleDialog
+from history_view import HistoryTab
+from rules import create_default_engine
+from app_matcher import AppMatcher
+from compiled_schedule import CompiledSchedule, summarize
+from engine_settings import EngineSettings, SettingsHolder, setting_property
+from process_events import ProcessTracker
+from process_tree import ProcessTreeWatcher
+from foreground import ForegroundTracker
+from load_monitor import LoadMonitor
+from network_monitor import NetworkMonitor
+from meeting_calendar import MeetingCalendar
+from power_policy import PowerPolicy, PowerInhibitor
+from instance import InstanceLock, send_request
+from control_server import ControlServer, RpcError, INVALID_PARAMS, METHOD_NOT_FOUND, INTERNAL_ERROR
+from leases import LeaseTable
+from activity_trace import TraceRecorder, read_user_idle_seconds
+from activity_history import ActivityHistory, STATE_NAMES, minutes
+from status_page import StatusPageWriter
+from config_watcher import ConfigWatcher
+import config_schema
+import startup_cache
+from session_lock import (SessionLockMonitor, WindowsSessionSource, LogindLockSource,
+                          DEFAULT_LOCK_SETTINGS, WHEN_LOCKED_INHIBIT)
 
 # Use an absolute path for the config file in user's home directory
 CONFIG_FILE = os.path.join(os.path.expanduser("~"), "stay_awake_config.json")
 
-def is_time_between(start_time, end_time, check_time=None):
-    """Check if current time is between start and end time"""
-    # If check time is not given, default to current time
-    check_time = check_time or datetime.now().time()
-    
-    # Handle case where start is after end (spans midnight)
-    if start_time <= end_time:
-        return start_time <= check_time <= end_time
-    else:  # Over midnight
-        return check_time >= start_time or check_time <= end_time
-
-def get_active_window_process():
-    """Get the process name of the currently active window"""
-    try:
-        # Get handle of active window
-        hwnd = win32gui.GetForegroundWindow()
-        
-        # Get PID from window handle
-        _, pid = win32process.GetWindowThreadProcessId(hwnd)
-        
-        # Get process name from PID
-        process = psutil.Process(pid)
-        return process.name()
-    except:
-        return None
-
-def is_app_running(app_names):
-    """Check if any of the specified apps are running"""
-    if not app_names:
-        return False
-        
-    try:
-        # Get all running processes
-        for proc in psutil.process_iter(['name']):
-            if proc.info['name'] in app_names:
-                return True
-        return False
-    except:
-        return False
+# Bump on every release; a new version also invalidates the startup cache
+APP_VERSION = "1.0"
 
+# Windows power broadcast message, sent to top-level windows when the power status changes
+WM_POWERBROADCAST = 0x0218
+PBT_APMPOWERSTATUSCHANGE = 0x000A
 
 class StayAwakeWorker(QThread):
     """Worker thread to handle the stay awake functionality"""
@@ -75,44 +77,335 @@ class StayAwakeWorker(QThread):
     # Default key is F15 (0x7E) - usually not present on keyboards
     DEFAULT_KEY_CODE = 0x7E
     
+    # Read-only views of the current settings snapshot; change them with the setters
+    active = setting_property("active")
+    schedule_active = setting_property("schedule_active")
+    weekly_schedules = setting_property("weekly_schedules")
+    date_overrides = setting_property("date_overrides")
+    compiled_schedule = setting_property("compiled_schedule")
+    app_monitoring_active = setting_property("app_monitoring_active")
+    excluded_apps = setting_property("excluded_apps")
+    foreground_monitoring_active = setting_property("foreground_monitoring_active")
+    foreground_only_apps = setting_property("foreground_only_apps")
+    foreground_suspend_apps = setting_property("foreground_suspend_apps")
+    load_monitoring_active = setting_property("load_monitoring_active")
+    network_monitoring_active = setting_property("network_monitoring_active")
+    process_holds_active = setting_property("process_holds_active")
+    power_policy_active = setting_property("power_policy_active")
+    calendar_active = setting_property("calendar_active")
+    session_lock_active = setting_property("session_lock_active")
+    session_lock_settings = setting_property("session_lock_settings")
+    activity_type = setting_property("activity_type")
+    activity_interval = setting_property("activity_interval")
+    custom_key_code = setting_property("custom_key_code")
+    
     def __init__(self):
         super().__init__()
-        self.active = False
         self.running = True
-        self.schedule_active = False
-        self.app_monitoring_active = False
-        self.excluded_apps = []
+        # Settings are published as immutable snapshots, the run loop reads one per tick
+        self._settings = SettingsHolder(EngineSettings(
+            active=False,
+            schedule_active=False,
+            weekly_schedules=None,  # Will be populated with weekly schedules
+            date_overrides={},  # ISO date -> override of the weekly schedule on that date
+            compiled_schedule=None,  # Weekly schedules resolved into minute intervals
+            app_monitoring_active=False,
+            excluded_apps=AppMatcher(),  # Compiled excluded app names and patterns
+            foreground_monitoring_active=False,
+            foreground_only_apps=AppMatcher(),  # Stay awake only while one of these is focused
+            foreground_suspend_apps=AppMatcher(),  # Stay inactive while one of these is focused
+            load_monitoring_active=False,
+            network_monitoring_active=False,
+            process_holds_active=False,
+            power_policy_active=False,
+            calendar_active=False,
+            session_lock_active=False,
+            session_lock_settings=dict(DEFAULT_LOCK_SETTINGS),
+            activity_type=self.ACTIVITY_MOUSE_MOVEMENT,  # Default simulation type
+            activity_interval=50,  # Seconds between activity simulations
+            custom_key_code=self.DEFAULT_KEY_CODE  # Default to F15 key
+        ))
         self.last_action_time = time.time()
-        self.weekly_schedules = None  # Will be populated with weekly schedules
-        self.activity_interval = 50  # Seconds between activity simulations
-        self.activity_type = self.ACTIVITY_MOUSE_MOVEMENT  # Default simulation type
-        self.custom_key_code = self.DEFAULT_KEY_CODE  # Default to F15 key
+        self.keeping_awake = False  # Result of the most recent decision
+        self.status_reason = None  # Rule behind the most recent decision
+        self.last_injection_time = None  # Time of the last successful simulation
+        self.injection_count = 0
+        self.evaluation_count = 0
+        self.status_page = None  # Shared-memory status page for external readers
+        self.history = ActivityHistory()  # Minute bitmaps of kept-awake and suppressed time per day
+        # Live process table fed by process start/stop events
+        self.process_tracker = ProcessTracker(
+            self.excluded_apps, on_change=lambda: self.rule_engine.invalidate("excluded_apps"))
+        self.process_tree = ProcessTreeWatcher()  # Watched processes and their descendants
+        self.process_tree.attach(self.process_tracker)
+        self.trace_recorder = None  # Records a trace for activity_trace.py replays
+        self.process_tracker.add_listener(self._trace_process_started, self._trace_process_exited,
+                                          self._trace_processes)
+        self.foreground_tracker = ForegroundTracker()  # Cached foreground window -> app name
+        self.load_monitor = LoadMonitor()  # Smoothed CPU and disk load
+        self.network_monitor = NetworkMonitor()  # Watched network sessions and throughput
+        self.calendar = MeetingCalendar()  # Meetings from a local .ics file
+        self.power_policy = PowerPolicy()  # Battery and power source aware behaviour
+        self.power_inhibitor = PowerInhibitor()  # Used instead of injecting input when requested
+        self.session_monitor = SessionLockMonitor()  # Pushed session lock and display state
+        self.session_monitor.listeners.append(lambda: self.rule_engine.invalidate("session_lock"))
+        self.lock_source = None  # logind lock signals on Linux; Windows uses the main window
+        self.leases = LeaseTable()  # Time-limited holds taken by scripts over the control server
+        self.leases.listeners.append(self._leases_changed)
+        self.state_listeners = []  # Called with get_status() whenever it changes
+        self._wake = threading.Event()  # Set to re-evaluate before the next tick
+        self.rule_engine = create_default_engine(
+            self.process_tracker, self.foreground_tracker, self.load_monitor,
+            self.network_monitor, self.process_tree, self.power_policy,
+            self.session_monitor, self.leases, self.calendar)  # Decides when to stay inactive
+        
+    @property
+    def settings(self):
+        """The current immutable EngineSettings snapshot"""
+        return self._settings.current
         
     def toggle_active(self, state):
-        self.active = state
+        self._settings.update(active=state)
         status = "Active" if state else "Inactive"
         self.status_update.emit(f"Status: {status}")
+        self.wake()
         
     def toggle_schedule(self, state):
-        self.schedule_active = state
+        self._settings.update(schedule_active=state)
+        self.rule_engine.invalidate("schedule")
         # Don't emit status update from worker - let the UI handle it
         
     def toggle_app_monitoring(self, state):
-        self.app_monitoring_active = state
+        self._settings.update(app_monitoring_active=state)
+        self._update_process_tracking()
+        self.rule_engine.invalidate("excluded_apps")
         # Don't emit status update from worker - let the UI handle it
     
-    def set_weekly_schedules(self, schedules):
-        self.weekly_schedules = schedules
+    def toggle_foreground_monitoring(self, state):
+        self._settings.update(foreground_monitoring_active=state)
+        # Only keep the foreground hook installed while it is needed
+        if state:
+            self.foreground_tracker.start()
+        else:
+            self.foreground_tracker.stop()
+        self.rule_engine.invalidate("foreground_only")
+        self.rule_engine.invalidate("foreground_suspend")
+        
+    def set_foreground_apps(self, only_apps, suspend_apps):
+        """Set the apps that must be, or must not be, in the foreground"""
+        self._settings.update(foreground_only_apps=AppMatcher(only_apps),
+                              foreground_suspend_apps=AppMatcher(suspend_apps))
+        self.rule_engine.invalidate("foreground_only")
+        self.rule_engine.invalidate("foreground_suspend")
+    
+    def toggle_load_monitoring(self, state):
+        self._settings.update(load_monitoring_active=state)
+        if not state:
+            self.load_monitor.reset()
+        self.rule_engine.invalidate("system_load")
+        
+    def set_load_settings(self, settings):
+        """Set the CPU and disk load thresholds"""
+        self.load_monitor.configure({key: value for key, value in settings.items() if key != "enabled"})
+        self.rule_engine.invalidate("system_load")
+    
+    def toggle_network_monitoring(self, state):
+        self._settings.update(network_monitoring_active=state)
+        if not state:
+            self.network_monitor.reset()
+        self.rule_engine.invalidate("network_activity")
+        
+    def set_network_settings(self, settings):
+        """Set the watched ports and throughput threshold"""
+        self.network_monitor.configure({key: value for key, value in settings.items() if key != "enabled"})
+        self.rule_engine.invalidate("network_activity")
+    
+    def toggle_calendar(self, state):
+        self._settings.update(calendar_active=state)
+        if not state:
+            self.calendar.reset()
+        self.rule_engine.invalidate("meetings")
+        self.wake()
+        
+    def set_calendar_settings(self, settings):
+        """Set the calendar file and how long before and after meetings to stay awake"""
+        self.calendar.configure({key: value for key, value in settings.items() if key != "enabled"})
+        self.rule_engine.invalidate("meetings")
+        self.wake()
+    
+    def set_weekly_schedules(self, schedules, compiled=None):
+        """Set the weekly schedules, compiling them unless a compiled copy is given
+
+        The worker keeps its own copy, so callers may go on editing theirs.
+        """
+        schedules = copy.deepcopy(schedules)
+        if compiled is None:
+            compiled = CompiledSchedule(schedules, self.date_overrides)
+        self._settings.update(weekly_schedules=schedules, compiled_schedule=compiled)
+        self.rule_engine.invalidate("schedule")
         # Only emit if significant (used for debugging)
         # self.status_update.emit(f"Weekly schedules updated")
         
+    def set_date_overrides(self, overrides, compiled=None):
+        """Set the holidays and one-off days, recompiling the schedule unless a compiled copy is given"""
+        overrides = copy.deepcopy(overrides)
+        if compiled is None:
+            compiled = CompiledSchedule(self.weekly_schedules, overrides)
+        self._settings.update(date_overrides=overrides, compiled_schedule=compiled)
+        self.rule_engine.invalidate("schedule")
+        
     def set_excluded_apps(self, apps):
-        self.excluded_apps = apps
+        """Set the excluded apps from a list of entries or an already compiled AppMatcher"""
+        matcher = apps if isinstance(apps, AppMatcher) else AppMatcher(apps)
+        self._settings.update(excluded_apps=matcher)
+        self.process_tracker.set_matcher(matcher)
+        self._update_process_tracking()
+        self.rule_engine.invalidate("excluded_apps")
         # Only emit if significant (used for debugging)
         # self.status_update.emit(f"App list updated: {len(apps)} apps")
         
+    def add_excluded_app(self, app):
+        """Add a single app name or pattern to the excluded apps"""
+        # Published matchers are never changed, so add to a copy and publish that
+        matcher = self.excluded_apps.copy()
+        if matcher.add(app):
+            self._settings.update(excluded_apps=matcher)
+            self.process_tracker.set_matcher(matcher)
+            self._update_process_tracking()
+            self.rule_engine.invalidate("excluded_apps")
+            
+    def remove_excluded_app(self, app):
+        """Remove a single app name or pattern from the excluded apps"""
+        matcher = self.excluded_apps.copy()
+        if matcher.remove(app):
+            self._settings.update(excluded_apps=matcher)
+            self.process_tracker.set_matcher(matcher)
+            self._update_process_tracking()
+            self.rule_engine.invalidate("excluded_apps")
+
+    def toggle_power_policy(self, state):
+        self._settings.update(power_policy_active=state)
+        self.rule_engine.invalidate("power")
+        
+    def set_power_settings(self, settings):
+        """Set the battery threshold and on-battery behaviour"""
+        self.power_policy.configure({key: value for key, value in settings.items() if key != "enabled"})
+        self.rule_engine.invalidate("power")
+        
+    def toggle_session_lock(self, state):
+        self._settings.update(session_lock_active=state)
+        if sys.platform.startswith("linux"):
+            if state and self.lock_source is None:
+                try:
+                    self.lock_source = LogindLockSource(self.session_monitor)
+                    self.lock_source.start()
+                except Exception as e:
+                    print(f"Session lock notifications unavailable: {str(e)}")
+                    self.lock_source = None
+            elif not state and self.lock_source is not None:
+                self.lock_source.stop()
+                self.lock_source = None
+        self.rule_engine.invalidate("session_lock")
+        
+    def set_session_lock_settings(self, settings):
+        """Set what happens while the session is locked or the screen is off"""
+        lock_settings = dict(self.session_lock_settings)
+        lock_settings.update({key: value for key, value in settings.items() if key != "enabled"})
+        self._settings.update(session_lock_settings=lock_settings)
+        self.rule_engine.invalidate("session_lock")
+        
+    def toggle_process_holds(self, state):
+        self._settings.update(process_holds_active=state)
+        self._update_process_tracking()
+        self.rule_engine.invalidate("process_tree")
+        
+    def set_process_hold_patterns(self, patterns):
+        """Stay awake while processes matching these patterns, or their descendants, run"""
+        self.process_tree.set_patterns(patterns)
+        self._update_process_tracking()
+        self.rule_engine.invalidate("process_tree")
+        
+    def watch_process(self, pid):
+        """Stay awake while a running process, or anything it spawns, is alive"""
+        self.process_tree.watch_pid(pid)
+        self._update_process_tracking()
+        self.rule_engine.invalidate("process_tree")
+        
+    def unwatch_process(self, pid):
+        """Stop watching a process passed to watch_process"""
+        self.process_tree.unwatch_pid(pid)
+        self._update_process_tracking()
+        self.rule_engine.invalidate("process_tree")
+
+    def _update_process_tracking(self):
+        """Only listen for process events while app monitoring or process holds need them"""
+        needed_for_apps = self.app_monitoring_active and self.excluded_apps
+        needed_for_holds = self.process_holds_active and self.process_tree.has_watches()
+        if needed_for_apps or needed_for_holds or self.trace_recorder is not None:
+            self.process_tracker.start()
+        else:
+            self.process_tracker.stop()
+
+    def start_trace(self, path, config=None):
+        """Record a trace of processes, input, power and toggles to a file"""
+        recorder = TraceRecorder(path, config)
+        self.stop_trace()
+        self.trace_recorder = recorder
+        if self.process_tracker.running:
+            recorder.processes(dict(self.process_tracker.processes))
+        else:
+            self._update_process_tracking()
+        self.status_update.emit(f"Recording a trace to {path}")
+        self.wake()
+        return recorder
+
+    def stop_trace(self):
+        """Stop recording, returns the finished recorder or None"""
+        recorder = self.trace_recorder
+        if recorder is None:
+            return None
+        self.trace_recorder = None
+        recorder.close()
+        self._update_process_tracking()
+        self.status_update.emit(f"Trace recorded to {recorder.path}")
+        return recorder
+
+    def _trace_process_started(self, pid, ppid, name):
+        recorder = self.trace_recorder
+        if recorder is not None:
+            recorder.process_started(pid, ppid, name)
+
+    def _trace_process_exited(self, pid):
+        recorder = self.trace_recorder
+        if recorder is not None:
+            recorder.process_exited(pid)
+
+    def _trace_processes(self, snapshot):
+        recorder = self.trace_recorder
+        if recorder is not None:
+            recorder.processes(snapshot)
+
+    def wake(self):
+        """Re-evaluate the rules now instead of at the next tick"""
+        self._wake.set()
+        
+    def _leases_changed(self):
+        self.rule_engine.invalidate("leases")
+        self.wake()
+        
     def stop(self):
         self.running = False
+        self.wake()
+        self.stop_trace()
+        self.history.flush()
+        self.process_tracker.stop()
+        self.foreground_tracker.stop()
+        if self.lock_source is not None:
+            self.lock_source.stop()
+            self.lock_source = None
+        if self.load_monitor.sample_count:
+            print(f"Load sampling overhead: {self.load_monitor.overhead() * 100:.4f}% CPU "
+                  f"over {self.load_monitor.sample_count} samples")
         
     def simulate_mouse_movement(self):
         """Simulate a tiny mouse movement"""
@@ -139,11 +432,13 @@ class StayAwakeWorker(QThread):
             self.status_update.emit(f"Error simulating key press: {str(e)}")
             return False
             
-    def simulate_custom_key_press(self):
+    def simulate_custom_key_press(self, key_code=None):
         """Simulate a user-defined custom key press"""
+        if key_code is None:
+            key_code = self.custom_key_code
         try:
-            win32api.keybd_event(self.custom_key_code, 0, 0, 0)  # Key down
-            win32api.keybd_event(self.custom_key_code, 0, win32con.KEYEVENTF_KEYUP, 0)  # Key up
+            win32api.keybd_event(key_code, 0, 0, 0)  # Key down
+            win32api.keybd_event(key_code, 0, win32con.KEYEVENTF_KEYUP, 0)  # Key up
             return True
         except Exception as e:
             self.status_update.emit(f"Error simulating custom key press: {str(e)}")
@@ -152,29 +447,30 @@ class StayAwakeWorker(QThread):
     def set_custom_key(self, key_code):
         """Set the custom key code to use"""
         try:
-            self.custom_key_code = int(key_code, 16)  # Convert hex string to int
+            self._settings.update(custom_key_code=int(key_code, 16))  # Convert hex string to int
             self.status_update.emit(f"Custom key set to: 0x{key_code}")
             return True
         except Exception as e:
             self.status_update.emit(f"Error setting custom key: {str(e)}")
             return False
             
-    def simulate_activity(self):
+    def simulate_activity(self, settings=None):
         """Simulate activity based on selected activity type"""
         success = False
         activity_type_str = ""
+        settings = settings or self.settings
         
         try:
-            if self.activity_type == self.ACTIVITY_MOUSE_MOVEMENT:
+            if settings.activity_type == self.ACTIVITY_MOUSE_MOVEMENT:
                 success = self.simulate_mouse_movement()
                 activity_type_str = "Mouse movement"
-            elif self.activity_type == self.ACTIVITY_KEY_PRESS:
+            elif settings.activity_type == self.ACTIVITY_KEY_PRESS:
                 success = self.simulate_key_press()
                 activity_type_str = "Key press (F15)"
-            elif self.activity_type == self.ACTIVITY_CUSTOM_KEY:
-                success = self.simulate_custom_key_press()
-                activity_type_str = f"Custom key press (0x{self.custom_key_code:X})"
-            elif self.activity_type == self.ACTIVITY_BOTH:
+            elif settings.activity_type == self.ACTIVITY_CUSTOM_KEY:
+                success = self.simulate_custom_key_press(settings.custom_key_code)
+                activity_type_str = f"Custom key press (0x{settings.custom_key_code:X})"
+            elif settings.activity_type == self.ACTIVITY_BOTH:
                 mouse_success = self.simulate_mouse_movement()
                 key_success = self.simulate_key_press()
                 success = mouse_success or key_success
@@ -182,6 +478,11 @@ class StayAwakeWorker(QThread):
                 
             if success:
                 self.last_action_time = time.time()
+                self.last_injection_time = self.last_action_time
+                self.injection_count += 1
+                recorder = self.trace_recorder
+                if recorder is not None:
+                    recorder.injected()
                 self.status_update.emit(f"{activity_type_str} simulated at {datetime.now().strftime('%H:%M:%S')}")
             
         except Exception as e:
@@ -189,12 +490,16 @@ class StayAwakeWorker(QThread):
     
     def set_activity_interval(self, seconds):
         """Set the interval between activity simulations"""
-        self.activity_interval = int(seconds)
+        self._settings.update(activity_interval=int(seconds))
         self.status_update.emit(f"Activity interval set to {seconds} seconds")
         
+    def set_activity_settings(self, activity_type, seconds):
+        """Set the activity type and interval together, without status messages"""
+        self._settings.update(activity_type=activity_type, activity_interval=int(seconds))
+        
     def set_activity_type(self, activity_type):
         """Set the type of activity to simulate"""
-        self.activity_type = activity_type
+        self._settings.update(activity_type=activity_type)
         type_names = {
             self.ACTIVITY_MOUSE_MOVEMENT: "Mouse movement",
             self.ACTIVITY_KEY_PRESS: "Key press (F15)",
@@ -204,59 +509,159 @@ class StayAwakeWorker(QThread):
         self.status_update.emit(f"Activity type set to {type_names.get(activity_type, 'Unknown')}")
         
     def run(self):
+        published = None
+        try:
+            self.status_page = StatusPageWriter()
+        except (OSError, ValueError) as e:
+            print(f"Status page unavailable: {str(e)}")
         while self.running:
-            # Check if we should be active
-            if self.active and not self._should_be_inactive():
-                # If more than the activity_interval seconds have passed since last action
-                if time.time() - self.last_action_time > self.activity_interval:
-                    self.simulate_activity()
-            time.sleep(5)  # Check every 5 seconds
+            # One snapshot per tick; the GUI thread publishes changes as new snapshots
+            settings = self.settings
             
-    def _should_be_inactive(self):
-        """Check if stay awake should be inactive based on schedule or running apps"""
-        # Check schedule
-        if self.schedule_active and self.weekly_schedules:
-            # Get current day and time
-            current_day = datetime.now().strftime("%A")
-            current_time = datetime.now().time()
-            
-            # Check if today has a schedule
-            if current_day in self.weekly_schedules:
-                day_schedule = self.weekly_schedules[current_day]
+            # Keep the smoothed load history current, whatever the other rules say
+            if settings.load_monitoring_active:
+                self.load_monitor.maybe_sample()
+            if settings.network_monitoring_active:
+                self.network_monitor.maybe_sample()
+            # Re-reads the calendar file only when it changed
+            if settings.calendar_active:
+                try:
+                    self.calendar.maybe_reload()
+                except Exception as e:
+                    print(f"Error reading the calendar: {str(e)}")
+                    self.status_update.emit(f"Meeting calendar turned off: {str(e)}")
+                    self.toggle_calendar(False)
+                    settings = self.settings
                 
-                # Check if day is enabled
-                if day_schedule["enabled"]:
-                    # If using global schedule
-                    if day_schedule["use_global"]:
-                        if self.weekly_schedules["global"]["enabled"]:
-                            # Check each period in global schedule
-                            for period in self.weekly_schedules["global"]["periods"]:
-                                if period["enabled"]:
-                                    start_time = dt_time(period["start_hour"], period["start_minute"])
-                                    end_time = dt_time(period["end_hour"], period["end_minute"])
-                                    if is_time_between(start_time, end_time, current_time):
-                                        # We're in an active period, so should NOT be inactive
-                                        return False
-                            # No active periods found in global schedule
-                            return True
-                    else:
-                        # Using custom schedule for this day
-                        for period in day_schedule["periods"]:
-                            if period["enabled"]:
-                                start_time = dt_time(period["start_hour"], period["start_minute"])
-                                end_time = dt_time(period["end_hour"], period["end_minute"])
-                                if is_time_between(start_time, end_time, current_time):
-                                    # We're in an active period, so should NOT be inactive
-                                    return False
-                        # No active periods found in day schedule
-                        return True
-                        
-        # Check monitored apps
-        if self.app_monitoring_active and self.excluded_apps:
-            if is_app_running(self.excluded_apps):
-                return True
+            # Check if we should be active; a held lease counts as being turned on
+            engaged = settings.active or self.leases.is_held()
+            self.keeping_awake = engaged and not self._should_be_inactive(settings)
+            self.status_reason = self.rule_engine.last_reason() if engaged else None
+            self.evaluation_count += 1
+            suppressed_by = None
+            if engaged and not self.keeping_awake and self.rule_engine.last_rule is not None:
+                suppressed_by = self.rule_engine.last_rule.name
+            self.history.record(self.keeping_awake, suppressed_by == "schedule",
+                                suppressed_by == "excluded_apps")
+            if self.keeping_awake:
+                if self._inhibit_only(settings):
+                    # Hold a power inhibit instead of injecting input
+                    self.power_inhibitor.acquire()
+                else:
+                    self.power_inhibitor.release()
+                    # If more than the activity_interval seconds have passed since last action
+                    if time.time() - self.last_action_time > self._effective_interval(settings):
+                        self.simulate_activity(settings)
+            else:
+                self.power_inhibitor.release()
+                
+            recorder = self.trace_recorder
+            if recorder is not None:
+                recorder.sample(settings.active, self.keeping_awake, read_user_idle_seconds(),
+                                self.power_policy.state())
+                
+            if self.status_page is not None:
+                self.status_page.write(settings.active, self.keeping_awake, self.power_inhibitor.held,
+                                       self.last_injection_time, self.next_transition(settings),
+                                       self.injection_count, self.evaluation_count,
+                                       len(self.leases), self.status_reason)
                 
-        return False
+            status = self.get_status(settings)
+            if status != published:
+                published = status
+                for listener in self.state_listeners:
+                    try:
+                        listener(status)
+                    except Exception as e:
+                        print(f"Error in status listener: {str(e)}")
+                        
+            # Check every 5 seconds, or earlier when woken
+            self._wake.wait(5)
+            self._wake.clear()
+            
+        # The inhibit belongs to this thread, so it has to be released here
+        self.power_inhibitor.release()
+        if self.status_page is not None:
+            self.status_page.close()
+            self.status_page = None
+            
+    def get_status(self, settings=None):
+        """Return the current state as a JSON serializable dict"""
+        settings = settings or self.settings
+        return {
+            "active": settings.active,
+            "keeping_awake": self.keeping_awake,
+            "reason": self.status_reason,
+            "activity_type": settings.activity_type,
+            "activity_interval": settings.activity_interval,
+            "last_action_time": self.last_action_time,
+            "injection_count": self.injection_count,
+            "leases": len(self.leases)
+        }
+        
+    def next_transition(self, settings=None):
+        """Return the time of the next scheduled state change, or None"""
+        transitions = []
+        for name in ("schedule", "meetings"):
+            rule = self.rule_engine.get_rule(name)
+            if rule is not None:
+                transitions.append(rule.next_transition(settings or self.settings, time.time()))
+        deadline = self.leases.next_deadline()
+        if deadline is not None:
+            # Lease deadlines are monotonic, the page holds wall clock times
+            transitions.append(time.time() + deadline - self.leases.clock())
+        transitions = [t for t in transitions if t is not None]
+        return min(transitions) if transitions else None
+            
+    def _inhibit_only(self, settings):
+        """Check if a power inhibit should be used instead of injecting input"""
+        lock_settings = settings.session_lock_settings
+        if (settings.session_lock_active and lock_settings["when_locked"] == WHEN_LOCKED_INHIBIT
+                and self.session_monitor.is_idle(lock_settings["include_screen_off"])):
+            # Injected input is wasted on a locked session and may fight the lock screen
+            return True
+        return settings.power_policy_active and self.power_policy.inhibit_only()
+        
+    def _effective_interval(self, settings):
+        """Return the activity interval adjusted for the current power state"""
+        if settings.power_policy_active:
+            return self.power_policy.effective_interval(settings.activity_interval)
+        return settings.activity_interval
+            
+    def _should_be_inactive(self, settings):
+        """Check if stay awake should be inactive based on the configured rules"""
+        return self.rule_engine.should_be_inactive(settings)
+
+
+class ControlBridge(QObject):
+    """Runs functions submitted from background threads on the GUI thread"""
+    request_received = pyqtSignal(object)
+    
+    def __init__(self):
+        super().__init__()
+        self.request_received.connect(self._handle, Qt.ConnectionType.QueuedConnection)
+        
+    def _handle(self, pending):
+        func, future = pending
+        if not future.set_running_or_notify_cancel():
+            return
+        try:
+            future.set_result(func())
+        except Exception as e:
+            future.set_exception(e)
+            
+    def submit(self, func, *args):
+        """Schedule func(*args) on the GUI thread, returns a concurrent.futures.Future"""
+        future = concurrent.futures.Future()
+        self.request_received.emit((lambda: func(*args), future))
+        return future
+        
+    def call(self, handler, request, timeout=5.0):
+        """Run a control request on the GUI thread and wait for its response"""
+        try:
+            return self.submit(handler, request).result(timeout)
+        except concurrent.futures.TimeoutError:
+            return {"ok": False, "error": "Timed out waiting for the application"}
 
 
 class StayAwakeApp(QMainWindow):
@@ -274,6 +679,14 @@ class StayAwakeApp(QMainWindow):
         # Initialize activity message tracking
         self.last_activity_message = ""
         
+        # Reload the config when it is edited outside the app (started below)
+        self.config_watcher = None
+        self._reloading = False
+        
+        # Compiled state from the startup cache, keyed by the config file contents
+        self.startup_snapshot = None
+        self._config_key = None
+        
         # Load config
         self.config = self.load_config()
         
@@ -283,6 +696,7 @@ class StayAwakeApp(QMainWindow):
         # Create the worker thread
         self.worker = StayAwakeWorker()
         self.worker.status_update.connect(self.update_status)
+        self.history_tab.history = self.worker.history
         
         # Apply loaded settings to worker
         self.apply_config_to_worker()
@@ -290,6 +704,16 @@ class StayAwakeApp(QMainWindow):
         # Setup tray
         self.setup_tray()
         
+        # Receive session lock and display state changes on Windows
+        self.session_source = None
+        if sys.platform == "win32":
+            try:
+                self.session_source = WindowsSessionSource(self.worker.session_monitor)
+                self.session_source.register(int(self.winId()))
+            except Exception as e:
+                print(f"Session lock notifications unavailable: {str(e)}")
+                self.session_source = None
+        
         # Update initial status indicator based on config
         if self.config["active"]:
             self.status_indicator.setStyleSheet("color: green;")
@@ -301,6 +725,47 @@ class StayAwakeApp(QMainWindow):
         # Start worker
         self.worker.start()
         
+        # Serve requests from `stay_awake.py --toggle` and friends, and JSON-RPC clients
+        self.control_bridge = ControlBridge()
+        self.rpc_methods = {
+            "status.get": lambda params: self.worker.get_status(),
+            "active.set": self.rpc_set_active,
+            "settings.get": lambda params: self.rpc_get_settings(),
+            "settings.set": self.rpc_set_settings,
+            "schedules.get": lambda params: self.rpc_get_schedules(),
+            "schedules.set": self.rpc_set_schedules,
+            "excluded_apps.get": lambda params: self.rpc_get_excluded_apps(),
+            "excluded_apps.set": self.rpc_set_excluded_apps,
+            "excluded_apps.add": self.rpc_add_excluded_apps,
+            "excluded_apps.remove": self.rpc_remove_excluded_apps,
+            "trace.start": self.rpc_start_trace,
+            "trace.stop": lambda params: self.rpc_stop_trace(),
+            "history.get": self.rpc_get_history,
+            "calendar.get": self.rpc_get_calendar,
+            "process_holds.get": lambda params: self.rpc_get_process_holds(),
+            "process_holds.watch": self.rpc_watch_process,
+            "process_holds.unwatch": self.rpc_unwatch_process
+        }
+        self.instance_server = ControlServer(
+            lambda request: self.control_bridge.call(self.handle_control_request, request),
+            lambda calls: self.control_bridge.submit(self.execute_rpc_calls, calls),
+            self.worker.leases)
+        self.worker.state_listeners.append(self.instance_server.publish)
+        try:
+            self.instance_server.start()
+        except Exception as e:
+            print(f"Control server unavailable: {str(e)}")
+            self.instance_server = None
+            
+        # Changes are detected on a background thread and applied on the GUI thread
+        self.config_watcher = ConfigWatcher(
+            CONFIG_FILE, lambda text: self.control_bridge.submit(self.reload_config, text))
+        self.config_watcher.start()
+        
+        # Next start can skip parsing and compiling this config
+        if self.startup_snapshot is None:
+            self.save_startup_cache(self.config)
+        
     def load_icon(self):
         """Load the application icon from file"""
         icon = QIcon()
@@ -333,138 +798,216 @@ class StayAwakeApp(QMainWindow):
         return None
         
     def load_config(self):
-        """Load configuration from file"""
-        # Create a WeeklyScheduleDialog instance to get default schedules
-        temp_dialog = WeeklyScheduleDialog()
-        default_weekly_schedules = temp_dialog.get_schedules()
-        
-        default_config = {
-            "active": True,
-            "schedule": {
-                "enabled": True  # Enable scheduling by default
-            },
-            "weekly_schedules": default_weekly_schedules,
-            "app_monitoring": {
-                "enabled": False,
-                "apps": []
-            },
-            "activity_settings": {
-                "type": StayAwakeWorker.ACTIVITY_MOUSE_MOVEMENT,
-                "interval": 50,
-                "custom_key": "7E"  # F15 key by default (in hex)
-            },
-            "ui_settings": {
-                "start_minimized": False  # Start minimized to tray
-            }
-        }
-        
+        """Load configuration from file, or from the startup cache if the file is unchanged"""
         config = None  # Initialize config variable
+        loaded_from = None
+        data = None
         
         try:
-            # First try to load user's config file
-            if os.path.exists(CONFIG_FILE):
+            # First try to load user's config file, reading it only once
+            try:
+                with open(CONFIG_FILE, 'rb') as f:
+                    data = f.read()
+            except FileNotFoundError:
+                pass
+            if data is not None:
+                self._config_key = startup_cache.cache_key(data, APP_VERSION)
+                snapshot = startup_cache.load_snapshot(self._config_key)
+                if snapshot is not None:
+                    print(f"Loaded configuration for {CONFIG_FILE} from the startup cache")
+                    self.startup_snapshot = snapshot
+                    return snapshot.config
                 print(f"Loading configuration from {CONFIG_FILE}")
-                with open(CONFIG_FILE, 'r') as f:
-                    config = json.load(f)
-                print("Configuration loaded successfully")
+                loaded_from = CONFIG_FILE
             # If user config doesn't exist, try default config from the repository
             elif os.path.exists("default_config.json"):
                 print("User config not found, loading default_config.json from current directory")
-                with open("default_config.json", 'r') as f:
-                    config = json.load(f)
+                loaded_from = "default_config.json"
             # If running as PyInstaller executable, try to find default config in the executable
             elif hasattr(sys, '_MEIPASS'):
                 default_config_path = os.path.join(sys._MEIPASS, "default_config.json")
                 if os.path.exists(default_config_path):
                     print(f"Loading default config from PyInstaller bundle: {default_config_path}")
-                    with open(default_config_path, 'r') as f:
-                        config = json.load(f)
-            
+                    loaded_from = default_config_path
+                    
             # If we couldn't load config from any source, use the default
-            if config is None:
-                config = default_config
-                
-            # Handle migration from old config format to new
-            if "weekly_schedule" in config and "schedules" in config["weekly_schedule"]:
-                # Migrate from old format
-                config["weekly_schedules"] = config["weekly_schedule"]["schedules"]
-                config["schedule"]["enabled"] = config["weekly_schedule"]["enabled"]
-                # Remove old key
-                config.pop("weekly_schedule", None)
-                
-            # If we're upgrading from very old config with just basic schedule
-            elif "schedule" in config and "start_hour" in config["schedule"]:
-                # Create a default weekly schedule with the basic schedule times
-                for day in WeeklyScheduleDialog.DAYS_OF_WEEK:
-                    default_weekly_schedules[day]["periods"][0].update({
-                        "start_hour": config["schedule"]["start_hour"],
-                        "start_minute": config["schedule"]["start_minute"],
-                        "end_hour": config["schedule"]["end_hour"],
-                        "end_minute": config["schedule"]["end_minute"]
-                    })
-                # Update the global schedule too
-                default_weekly_schedules["global"]["periods"][0].update({
-                    "start_hour": config["schedule"]["start_hour"],
-                    "start_minute": config["schedule"]["start_minute"],
-                    "end_hour": config["schedule"]["end_hour"],
-                    "end_minute": config["schedule"]["end_minute"]
-                })
-                config["weekly_schedules"] = default_weekly_schedules
-            
-            # Ensure all required sections exist in older config files
-            if "weekly_schedules" not in config:
-                config["weekly_schedules"] = default_weekly_schedules
-                
-            if "activity_settings" not in config:
-                config["activity_settings"] = default_config["activity_settings"]
-            elif "custom_key" not in config["activity_settings"]:
-                config["activity_settings"]["custom_key"] = default_config["activity_settings"]["custom_key"]
-                
-            if "ui_settings" not in config:
-                config["ui_settings"] = default_config["ui_settings"]
+            if loaded_from is None:
+                return config_schema.default_config()
                 
+            if data is None:
+                with open(loaded_from, 'rb') as f:
+                    data = f.read()
+            # Older formats are migrated once; persist the result so the next start skips it
+            config, migrated = config_schema.load_text(data)
+            if migrated and loaded_from == CONFIG_FILE:
+                print(f"Configuration migrated to schema version {config_schema.SCHEMA_VERSION}")
+                data = json.dumps(config, indent=2).encode("utf-8")
+                with open(CONFIG_FILE, 'wb') as f:
+                    f.write(data)
+                self._config_key = startup_cache.cache_key(data, APP_VERSION)
+            print("Configuration loaded successfully")
             return config
+        except config_schema.ConfigError as e:
+            print(f"Invalid configuration in {loaded_from}:")
+            for error in e.errors:
+                print(f"  {error}")
+            print(f"Using hardcoded default configuration")
+            return config_schema.default_config()
         except Exception as e:
             print(f"Error loading configuration: {str(e)}")
             print(f"Using hardcoded default configuration")
             # Log the path to help with debugging
             print(f"Expected config path was: {CONFIG_FILE}")
-            return default_config
+            return config_schema.default_config()
             
-    def save_config(self):
-        """Save configuration to file"""
-        config = {
-            "active": self.worker.active,
+    def current_config(self):
+        """Return the configuration as currently applied to the worker and UI"""
+        settings = self.worker.settings
+        return {
+            "schema_version": config_schema.SCHEMA_VERSION,
+            "active": settings.active,
             "schedule": {
-                "enabled": self.worker.schedule_active
+                "enabled": settings.schedule_active
             },
-            "weekly_schedules": self.worker.weekly_schedules,
+            "weekly_schedules": settings.weekly_schedules,
+            "date_overrides": settings.date_overrides,
             "app_monitoring": {
-                "enabled": self.worker.app_monitoring_active,
+                "enabled": settings.app_monitoring_active,
                 "apps": self.get_app_list()
             },
+            "foreground_monitoring": {
+                "enabled": settings.foreground_monitoring_active,
+                "only_apps": settings.foreground_only_apps.entries,
+                "suspend_apps": settings.foreground_suspend_apps.entries
+            },
+            "load_monitoring": dict(self.worker.load_monitor.settings, enabled=settings.load_monitoring_active),
+            "network_monitoring": dict(self.worker.network_monitor.settings,
+                                       enabled=settings.network_monitoring_active),
+            "process_holds": {
+                "enabled": settings.process_holds_active,
+                "patterns": self.worker.process_tree.matcher.entries
+            },
+            "power_policy": dict(self.worker.power_policy.settings, enabled=settings.power_policy_active),
+            "calendar": dict(self.worker.calendar.settings, enabled=settings.calendar_active),
+            "session_lock": dict(settings.session_lock_settings, enabled=settings.session_lock_active),
             "activity_settings": {
-                "type": self.worker.activity_type,
-                "interval": self.worker.activity_interval,
-                "custom_key": f"{self.worker.custom_key_code:X}"
+                "type": settings.activity_type,
+                "interval": settings.activity_interval,
+                "custom_key": f"{settings.custom_key_code:X}"
             },
             "ui_settings": {
                 "start_minimized": getattr(self, 'start_minimized_preference', False)
             }
         }
         
+    def save_config(self):
+        """Save configuration to file"""
+        if self._reloading:
+            # The file already holds what is being applied
+            return
+        config = self.current_config()
+        
         try:
             # Ensure directory exists
             config_dir = os.path.dirname(CONFIG_FILE)
             if not os.path.exists(config_dir) and config_dir:
                 os.makedirs(config_dir)
                 
-            with open(CONFIG_FILE, 'w') as f:
-                json.dump(config, f, indent=2)
+            text = json.dumps(config, indent=2)
+            if self.config_watcher is not None:
+                # Our own write must not come back as a reload
+                self.config_watcher.mark_written(text)
+            # Written as bytes so the file matches the digests and the startup cache key
+            data = text.encode("utf-8")
+            self._config_key = None  # Unknown contents if the write fails
+            with open(CONFIG_FILE, 'wb') as f:
+                f.write(data)
+            self._config_key = startup_cache.cache_key(data, APP_VERSION)
             print(f"Configuration saved successfully to {CONFIG_FILE}")
         except Exception as e:
             print(f"Error saving configuration: {str(e)}")
             
+    def save_startup_cache(self, config):
+        """Store the compiled state for the config file as last read or written"""
+        if self._config_key is None:
+            return
+        settings = self.worker.settings
+        snapshot = startup_cache.Snapshot(config, settings.compiled_schedule, settings.excluded_apps,
+                                          summarize(settings.weekly_schedules))
+        if startup_cache.save_snapshot(self._config_key, snapshot):
+            print(f"Startup cache written to {startup_cache.CACHE_FILE}")
+            
+    def reload_config(self, text):
+        """Apply an externally edited config file, changing only what differs (GUI thread)"""
+        try:
+            config, _ = config_schema.load_text(text)
+        except ValueError as e:
+            print(f"Ignoring invalid configuration in {CONFIG_FILE}: {str(e)}")
+            self.update_status(f"Config not reloaded: {str(e)}")
+            return
+            
+        current = self.current_config()
+        changed = [section for section in config if section in current and config[section] != current[section]]
+        if not changed:
+            return
+        print(f"Reloading configuration sections: {', '.join(changed)}")
+        self._reloading = True
+        try:
+            for section in changed:
+                self.apply_config_section(section, config[section], current[section])
+        finally:
+            self._reloading = False
+        self.config = config
+        
+    def apply_config_section(self, section, value, previous):
+        """Apply one changed config section to the worker and the UI"""
+        if isinstance(value, dict) and isinstance(previous, dict):
+            changed = {key: item for key, item in value.items() if previous.get(key) != item}
+        else:
+            changed = {}
+        settings_changed = any(key != "enabled" for key in changed)
+        
+        if section == "active":
+            if value != self.worker.active:
+                self.toggle_active()
+        elif section == "weekly_schedules":
+            self.rpc_set_schedules({"weekly_schedules": value})
+        elif section == "date_overrides":
+            self.rpc_set_schedules({"date_overrides": value})
+        elif section == "schedule":
+            self.rpc_set_schedules({"enabled": value.get("enabled", False)})
+        elif section == "app_monitoring":
+            self.rpc_set_excluded_apps(changed)
+        elif section == "activity_settings":
+            keys = {"type": "activity_type", "interval": "activity_interval", "custom_key": "custom_key"}
+            self.rpc_set_settings({keys[key]: item for key, item in changed.items() if key in keys})
+        elif section == "foreground_monitoring":
+            if settings_changed:
+                self.worker.set_foreground_apps(value.get("only_apps", []), value.get("suspend_apps", []))
+            if "enabled" in changed:
+                self.worker.toggle_foreground_monitoring(value["enabled"])
+        elif section == "process_holds":
+            if settings_changed:
+                self.worker.set_process_hold_patterns(value.get("patterns", []))
+            if "enabled" in changed:
+                self.worker.toggle_process_holds(value["enabled"])
+        elif section == "ui_settings":
+            self.start_minimized_preference = value.get("start_minimized", False)
+        else:
+            setters = {
+                "load_monitoring": (self.worker.set_load_settings, self.worker.toggle_load_monitoring),
+                "network_monitoring": (self.worker.set_network_settings, self.worker.toggle_network_monitoring),
+                "power_policy": (self.worker.set_power_settings, self.worker.toggle_power_policy),
+                "calendar": (self.worker.set_calendar_settings, self.worker.toggle_calendar),
+                "session_lock": (self.worker.set_session_lock_settings, self.worker.toggle_session_lock)
+            }
+            if section in setters:
+                set_settings, toggle = setters[section]
+                if settings_changed:
+                    set_settings(value)
+                if "enabled" in changed:
+                    toggle(value["enabled"])
+                    
     def apply_config_to_worker(self):
         """Apply loaded config settings to the worker"""
         # Set weekly schedules
@@ -475,15 +1018,47 @@ class StayAwakeApp(QMainWindow):
         else:
             print("Warning: Could not find global schedule start time in config")
             
-        self.worker.set_weekly_schedules(self.config["weekly_schedules"])
+        # Use the compiled schedule and app matcher from the startup cache when there is one
+        snapshot = self.startup_snapshot
+        if snapshot is not None:
+            self.worker.set_date_overrides(self.config["date_overrides"], snapshot.compiled_schedule)
+            self.worker.set_weekly_schedules(self.config["weekly_schedules"], snapshot.compiled_schedule)
+        else:
+            self.worker.set_date_overrides(self.config["date_overrides"])
+            self.worker.set_weekly_schedules(self.config["weekly_schedules"])
         
         # Set app list
-        self.worker.set_excluded_apps(self.config["app_monitoring"]["apps"])
+        if snapshot is not None:
+            self.worker.set_excluded_apps(snapshot.excluded_apps)
+        else:
+            self.worker.set_excluded_apps(self.config["app_monitoring"]["apps"])
+        
+        # Set foreground app lists
+        foreground = self.config["foreground_monitoring"]
+        self.worker.set_foreground_apps(foreground.get("only_apps", []), foreground.get("suspend_apps", []))
+        
+        # Set load thresholds
+        self.worker.set_load_settings(self.config["load_monitoring"])
+        
+        # Set watched network ports and throughput threshold
+        self.worker.set_network_settings(self.config["network_monitoring"])
+        
+        # Set process tree holds
+        self.worker.set_process_hold_patterns(self.config["process_holds"].get("patterns", []))
+        
+        # Set battery policy
+        self.worker.set_power_settings(self.config["power_policy"])
+        
+        # Set session lock behaviour
+        self.worker.set_session_lock_settings(self.config["session_lock"])
+        
+        # Set the meeting calendar file
+        self.worker.set_calendar_settings(self.config["calendar"])
         
         # Set activity settings if they exist
         if "activity_settings" in self.config:
-            self.worker.activity_type = self.config["activity_settings"]["type"]
-            self.worker.activity_interval = self.config["activity_settings"]["interval"]
+            self.worker.set_activity_settings(self.config["activity_settings"]["type"],
+                                              self.config["activity_settings"]["interval"])
             
             # Set custom key if it exists
             if "custom_key" in self.config["activity_settings"]:
@@ -496,11 +1071,18 @@ class StayAwakeApp(QMainWindow):
             self.start_minimized_preference = False
         
         # Update the schedule summary
-        self.update_schedule_summary()
+        self.update_schedule_summary(snapshot.schedule_summary if snapshot is not None else None)
         
         # Enable features
         self.worker.toggle_schedule(self.config["schedule"]["enabled"])
         self.worker.toggle_app_monitoring(self.config["app_monitoring"]["enabled"])
+        self.worker.toggle_foreground_monitoring(self.config["foreground_monitoring"].get("enabled", False))
+        self.worker.toggle_load_monitoring(self.config["load_monitoring"].get("enabled", False))
+        self.worker.toggle_network_monitoring(self.config["network_monitoring"].get("enabled", False))
+        self.worker.toggle_process_holds(self.config["process_holds"].get("enabled", False))
+        self.worker.toggle_power_policy(self.config["power_policy"].get("enabled", False))
+        self.worker.toggle_session_lock(self.config["session_lock"].get("enabled", False))
+        self.worker.toggle_calendar(self.config["calendar"].get("enabled", False))
         self.worker.toggle_active(self.config["active"])
         
     def init_ui(self):
@@ -596,7 +1178,8 @@ class StayAwakeApp(QMainWindow):
         
         app_info = QLabel(
             "When any of the listed applications are running, "
-            "the stay awake feature will be temporarily disabled."
+            "the stay awake feature will be temporarily disabled. "
+            "Entries can use wildcards (chrome*) and are matched case-insensitively."
         )
         app_info.setWordWrap(True)
         app_layout.addWidget(app_info)
@@ -760,6 +1343,12 @@ class StayAwakeApp(QMainWindow):
         tabs.addTab(app_tab, "Applications")
         tabs.addTab(activity_tab, "Activity Settings")
         
+        # History tab, reloaded whenever it is shown; the worker's history is set once it exists
+        self.history_tab = HistoryTab(None)
+        tabs.addTab(self.history_tab, "History")
+        tabs.currentChanged.connect(
+            lambda index: self.history_tab.refresh() if tabs.widget(index) is self.history_tab else None)
+        
     def setup_tray(self):
         """Set up the system tray icon and menu"""
         self.tray_icon = QSystemTrayIcon(self)
@@ -819,16 +1408,20 @@ class StayAwakeApp(QMainWindow):
         self.schedule_status_label.setText("Schedule: " + ("Enabled" if state else "Disabled"))
         
         # If disabling schedule, set all days and global schedule to disabled
-        if not state and hasattr(self.worker, "weekly_schedules") and self.worker.weekly_schedules:
+        if not state and self.worker.weekly_schedules:
+            # The worker's schedules are read-only, change a copy and hand that over
+            schedules = copy.deepcopy(self.worker.weekly_schedules)
+            
             # Disable the global schedule
-            if "global" in self.worker.weekly_schedules:
-                self.worker.weekly_schedules["global"]["enabled"] = False
+            if "global" in schedules:
+                schedules["global"]["enabled"] = False
             
             # Get the list of days from the WeeklyScheduleDialog class
             from weekly_schedule_dialog import WeeklyScheduleDialog
             for day in WeeklyScheduleDialog.DAYS_OF_WEEK:
-                if day in self.worker.weekly_schedules:
-                    self.worker.weekly_schedules[day]["enabled"] = False
+                if day in schedules:
+                    schedules[day]["enabled"] = False
+            self.worker.set_weekly_schedules(schedules)
                     
         # Update schedule summary to reflect the new state
         self.update_schedule_summary()
@@ -844,19 +1437,21 @@ class StayAwakeApp(QMainWindow):
         
     def open_weekly_schedule_dialog(self):
         """Open dialog to configure weekly schedule"""
-        # Ensure weekly_schedules is initialized before opening dialog
-        if not hasattr(self.worker, "weekly_schedules"):
-            self.worker.weekly_schedules = {}
+        # The dialog edits its own copy; the worker only sees the result when it is accepted
+        schedules = copy.deepcopy(self.worker.weekly_schedules or {})
         
         # Update the global schedule enabled state based on main schedule toggle
         # This helps synchronize the global schedule state with the main schedule toggle
-        if "global" in self.worker.weekly_schedules:
-            self.worker.weekly_schedules["global"]["enabled"] = self.worker.schedule_active
+        if "global" in schedules and schedules["global"].get("enabled") != self.worker.schedule_active:
+            schedules["global"]["enabled"] = self.worker.schedule_active
+            self.worker.set_weekly_schedules(schedules)
             
-        dialog = WeeklyScheduleDialog(self, self.worker.weekly_schedules)
+        dialog = WeeklyScheduleDialog(self, schedules, copy.deepcopy(self.worker.date_overrides),
+                                      history=self.worker.history)
         if dialog.exec():
             # Get updated schedules
-            self.worker.weekly_schedules = dialog.get_schedules()
+            self.worker.set_date_overrides(dialog.get_date_overrides())
+            self.worker.set_weekly_schedules(dialog.get_schedules())
             
             # Sync the main schedule toggle with global schedule state
             global_enabled = self.worker.weekly_schedules.get("global", {}).get("enabled", False)
@@ -944,78 +1539,13 @@ class StayAwakeApp(QMainWindow):
         self.worker.set_activity_interval(value)
         self.save_config()
     
-    def update_schedule_summary(self):
+    def update_schedule_summary(self, summary=None):
         """Update the schedule summary display based on current schedules"""
-        schedules = self.worker.weekly_schedules
-        
-        # Format for displaying time periods
-        def format_time_periods(periods):
-            times = []
-            for p in periods:
-                if p.get("enabled", False):
-                    times.append(f"{p['start_hour']}:{p['start_minute']:02d}-{p['end_hour']}:{p['end_minute']:02d}")
-            return ", ".join(times) if times else "Not configured"
-        
-        # Weekday summary (Monday-Friday)
-        weekday_names = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday"]
-        
-        # Check if all weekdays use the same schedule (global or identical custom)
-        all_use_global = all(
-            day in schedules and 
-            schedules[day]["enabled"] and 
-            schedules[day]["use_global"]
-            for day in weekday_names
-        )
-        
-        if all_use_global and schedules.get("global", {}).get("enabled", False):
-            # All weekdays use global schedule
-            weekday_text = format_time_periods(schedules["global"]["periods"])
-            self.weekday_schedule_label.setText(f"Global schedule: {weekday_text}")
-        else:
-            # Check if each weekday is enabled
-            enabled_weekdays = [day for day in weekday_names 
-                               if day in schedules and schedules[day]["enabled"]]
-            
-            if not enabled_weekdays:
-                self.weekday_schedule_label.setText("No weekdays enabled")
-            else:
-                weekday_text = ", ".join(f"{day[:3]}" for day in enabled_weekdays)
-                self.weekday_schedule_label.setText(f"Enabled for: {weekday_text}")
-        
-        # Weekend summary (Saturday-Sunday)
-        weekend_names = ["Saturday", "Sunday"]
-        
-        # Check if both weekend days use the same schedule
-        all_use_global = all(
-            day in schedules and 
-            schedules[day]["enabled"] and 
-            schedules[day]["use_global"]
-            for day in weekend_names
-        )
-        
-        if all_use_global and schedules.get("global", {}).get("enabled", False):
-            # Both weekend days use global schedule
-            weekend_text = format_time_periods(schedules["global"]["periods"])
-            self.weekend_schedule_label.setText(f"Global schedule: {weekend_text}")
-        else:
-            # Check if each weekend day is enabled
-            enabled_weekends = [day for day in weekend_names 
-                              if day in schedules and schedules[day]["enabled"]]
-            
-            if not enabled_weekends:
-                self.weekend_schedule_label.setText("No weekend days enabled")
-            else:
-                weekend_text = ", ".join(day for day in enabled_weekends)
-                self.weekend_schedule_label.setText(f"Enabled for: {weekend_text}")
-        
-        # Custom day schedules
-        days_with_custom = []
-        for day in self.worker.weekly_schedules:
-            if day != "global" and self.worker.weekly_schedules[day].get("enabled", False):
-                if not self.worker.weekly_schedules[day].get("use_global", True):
-                    # This day has custom schedule
-                    periods = format_time_periods(self.worker.weekly_schedules[day]["periods"])
-                    days_with_custom.append(f"{day}: {periods}")
+        if summary is None:
+            summary = summarize(self.worker.weekly_schedules)
+        weekday_text, weekend_text, days_with_custom = summary
+        self.weekday_schedule_label.setText(weekday_text)
+        self.weekend_schedule_label.setText(weekend_text)
         
         if days_with_custom:
             self.custom_days_label.setVisible(True)
@@ -1030,7 +1560,7 @@ class StayAwakeApp(QMainWindow):
     def add_app(self):
         """Add an application to the monitoring list"""
         # Create a dialog with options
-        from PyQt6.QtWidgets import QDialog, QVBoxLayout, QHBoxLayout, QRadioButton, QGroupBox
+        from PyQt6.QtWidgets import QDialog, QVBoxLayout, QHBoxLayout, QRadioButton, QGroupBox, QInputDialog
         from running_apps_dialog import RunningAppsDialog
         
         option_dialog = QDialog(self)
@@ -1050,6 +1580,9 @@ class StayAwakeApp(QMainWindow):
         browse_radio = QRadioButton("Browse for executable file")
         option_layout.addWidget(browse_radio)
         
+        pattern_radio = QRadioButton("Enter a name or pattern (e.g. chrome*, *.vshost.exe)")
+        option_layout.addWidget(pattern_radio)
+        
         layout.addWidget(option_group)
         
         # Buttons
@@ -1076,6 +1609,22 @@ class StayAwakeApp(QMainWindow):
             running_dialog = RunningAppsDialog(self)
             if running_dialog.exec() == QDialog.DialogCode.Accepted:
                 app_name = running_dialog.get_selected_app()
+        elif pattern_radio.isChecked():
+            # Let the user type an exact name, a glob pattern or a "re:" regex
+            text, ok = QInputDialog.getText(
+                self,
+                "Add Application",
+                "Application name or pattern:\n"
+                "Use * and ? as wildcards, or prefix with re: for a regular expression.\n"
+                "Matching is case-insensitive."
+            )
+            if ok and text.strip():
+                app_name = text.strip()
+                try:
+                    AppMatcher([app_name])
+                except re.error as e:
+                    QMessageBox.warning(self, "Invalid Pattern", f"Invalid regular expression: {str(e)}")
+                    return
         else:
             # Browse for executable
             file_path, _ = QFileDialog.getOpenFileName(
@@ -1097,8 +1646,8 @@ class StayAwakeApp(QMainWindow):
                 item = QListWidgetItem(app_name)
                 self.app_list.addItem(item)
                 
-                # Update worker with new list
-                self.worker.set_excluded_apps(self.get_app_list())
+                # Update the worker's compiled matcher with the new entry
+                self.worker.add_excluded_app(app_name)
                 
                 # Save config
                 self.save_config()
@@ -1109,8 +1658,8 @@ class StayAwakeApp(QMainWindow):
         for item in selected_items:
             self.app_list.takeItem(self.app_list.row(item))
             
-        # Update worker with new list
-        self.worker.set_excluded_apps(self.get_app_list())
+            # Update the worker's compiled matcher for the removed entry
+            self.worker.remove_excluded_app(item.text())
         
         # Save config
         self.save_config()
@@ -1135,6 +1684,22 @@ class StayAwakeApp(QMainWindow):
             # For other messages, just update directly
             self.status_label.setText(message)
         
+    def nativeEvent(self, event_type, message):
+        """Forward Windows power, session and display notifications to the worker"""
+        # Messages also arrive while the window is still being constructed
+        if event_type == b"windows_generic_MSG" and hasattr(self, "worker"):
+            try:
+                import ctypes.wintypes
+                msg = ctypes.wintypes.MSG.from_address(int(message))
+                if msg.message == WM_POWERBROADCAST and msg.wParam == PBT_APMPOWERSTATUSCHANGE:
+                    self.worker.power_policy.notify_change()
+                    self.worker.rule_engine.invalidate("power")
+                elif getattr(self, "session_source", None) is not None:
+                    self.session_source.handle_message(msg.message, msg.wParam, msg.lParam)
+            except Exception as e:
+                print(f"Error handling power notification: {str(e)}")
+        return super().nativeEvent(event_type, message)
+        
     def closeEvent(self, event):
         """Override close event to minimize to tray instead of closing"""
         event.ignore()
@@ -1149,15 +1714,255 @@ class StayAwakeApp(QMainWindow):
             notification_icon
         )
         
+    def handle_control_request(self, request):
+        """Handle a request from another Stay Awake invocation (runs on the GUI thread)"""
+        command = request.get("command")
+        if command == "toggle":
+            self.toggle_active()
+        elif command == "activate":
+            if not self.worker.active:
+                self.toggle_active()
+        elif command == "deactivate":
+            if self.worker.active:
+                self.toggle_active()
+        elif command == "show":
+            self.show()
+            self.raise_()
+            self.activateWindow()
+        elif command != "status":
+            return {"ok": False, "error": f"Unknown command: {command}"}
+        return {"ok": True, "status": self.worker.get_status()}
+        
+    def execute_rpc_calls(self, calls):
+        """Run a batch of JSON-RPC calls on the GUI thread, saving the config once"""
+        results = []
+        changed = False
+        for method, params in calls:
+            handler = self.rpc_methods.get(method)
+            if handler is None:
+                results.append(("error", (METHOD_NOT_FOUND, f"Unknown method: {method}")))
+                continue
+            try:
+                results.append(("result", handler(params)))
+                changed = changed or not method.endswith(".get")
+            except RpcError as e:
+                results.append(("error", (e.code, e.message)))
+            except (KeyError, TypeError, ValueError) as e:
+                results.append(("error", (INVALID_PARAMS, f"Invalid params: {str(e)}")))
+            except Exception as e:
+                results.append(("error", (INTERNAL_ERROR, str(e))))
+        if changed:
+            self.save_config()
+        return results
+        
+    def rpc_set_active(self, params):
+        if bool(params["active"]) != self.worker.active:
+            self.toggle_active()
+        return self.worker.get_status()
+        
+    def rpc_start_trace(self, params):
+        path = str(params["path"])
+        try:
+            self.worker.start_trace(path, self.current_config())
+        except OSError as e:
+            raise ValueError(f"Cannot write {path}: {str(e)}")
+        return {"path": path}
+        
+    def rpc_stop_trace(self):
+        recorder = self.worker.stop_trace()
+        if recorder is None:
+            return {"path": None, "events": 0}
+        return {"path": recorder.path, "events": recorder.event_count}
+        
+    def rpc_get_history(self, params):
+        """Minutes per day in each history state, for the last days (default 30)"""
+        days = int(params.get("days", 30))
+        if not 1 <= days <= 3660:
+            raise ValueError("days must be between 1 and 3660")
+        last = datetime.now().date()
+        first = last - timedelta(days=days - 1)
+        keys = [name.lower().replace(" ", "_") for name in STATE_NAMES]
+        return [dict({"date": day.isoformat()}, **{key: minutes(bitmap) for key, bitmap in zip(keys, bitmaps)})
+                for day, bitmaps in sorted(self.worker.history.days(first, last).items())]
+        
+    def rpc_get_calendar(self, params):
+        """Meetings in progress and coming up (default 10), with the padding applied"""
+        count = int(params.get("count", 10))
+        if not 1 <= count <= 1000:
+            raise ValueError("count must be between 1 and 1000")
+        calendar = self.worker.calendar
+        now = time.time()
+        return {
+            "enabled": self.worker.calendar_active,
+            "path": calendar.settings["path"],
+            "events": len(calendar.events),
+            "in_meeting": self.worker.calendar_active and calendar.in_meeting(now),
+            "next_boundary": calendar.next_boundary(now),
+            "upcoming": [{"start": start, "end": end, "summary": event.summary}
+                         for start, end, event in calendar.upcoming(now, count)]
+        }
+        
+    def rpc_get_process_holds(self):
+        tree = self.worker.process_tree
+        return {
+            "enabled": self.worker.process_holds_active,
+            "patterns": tree.matcher.entries,
+            "watched": sorted(tree.root_pids),
+            "held": len(tree.held)
+        }
+        
+    def _rpc_pid(self, params):
+        pid = params["pid"]
+        if type(pid) is not int or pid <= 0:
+            raise ValueError("pid must be a positive integer")
+        return pid
+        
+    def rpc_watch_process(self, params):
+        """Keep awake while a running process, or anything it starts, is alive"""
+        pid = self._rpc_pid(params)
+        if not psutil.pid_exists(pid):
+            raise ValueError(f"No process with pid {pid} is running")
+        self.worker.watch_process(pid)
+        return self.rpc_get_process_holds()
+        
+    def rpc_unwatch_process(self, params):
+        self.worker.unwatch_process(self._rpc_pid(params))
+        return self.rpc_get_process_holds()
+        
+    def rpc_get_settings(self):
+        return {
+            "activity_type": self.worker.activity_type,
+            "activity_interval": self.worker.activity_interval,
+            "custom_key": f"{self.worker.custom_key_code:X}"
+        }
+        
+    def rpc_set_settings(self, params):
+        """Change activity settings, validating everything before applying anything"""
+        buttons = {
+            StayAwakeWorker.ACTIVITY_MOUSE_MOVEMENT: self.rb_mouse,
+            StayAwakeWorker.ACTIVITY_KEY_PRESS: self.rb_keyboard,
+            StayAwakeWorker.ACTIVITY_CUSTOM_KEY: self.rb_custom_key,
+            StayAwakeWorker.ACTIVITY_BOTH: self.rb_both
+        }
+        if "activity_type" in params and params["activity_type"] not in buttons:
+            raise ValueError(f"Unknown activity type: {params['activity_type']}")
+        if "activity_interval" in params:
+            interval = int(params["activity_interval"])
+            if not self.interval_slider.minimum() <= interval <= self.interval_slider.maximum():
+                raise ValueError(f"activity_interval must be between {self.interval_slider.minimum()} "
+                                 f"and {self.interval_slider.maximum()} seconds")
+        if "custom_key" in params:
+            int(str(params["custom_key"]), 16)  # Raises ValueError for a bad key code
+            
+        # Update the widgets without their change handlers saving the config each time
+        if "activity_type" in params:
+            for button in buttons.values():
+                button.blockSignals(True)
+            buttons[params["activity_type"]].setChecked(True)
+            for button in buttons.values():
+                button.blockSignals(False)
+            self.worker.set_activity_type(params["activity_type"])
+            self.custom_key_input.setEnabled(params["activity_type"] == StayAwakeWorker.ACTIVITY_CUSTOM_KEY)
+        if "activity_interval" in params:
+            self.interval_slider.blockSignals(True)
+            self.interval_slider.setValue(interval)
+            self.interval_slider.blockSignals(False)
+            self.interval_value.setText(f"{interval} seconds")
+            self.worker.set_activity_interval(interval)
+        if "custom_key" in params:
+            self.custom_key_input.blockSignals(True)
+            self.custom_key_input.setText(str(params["custom_key"]))
+            self.custom_key_input.blockSignals(False)
+            self.worker.set_custom_key(str(params["custom_key"]))
+        return self.rpc_get_settings()
+        
+    def rpc_get_schedules(self):
+        return {"enabled": self.worker.schedule_active, "weekly_schedules": self.worker.weekly_schedules,
+                "date_overrides": self.worker.date_overrides}
+        
+    def rpc_set_schedules(self, params):
+        # Validate everything before changing anything, with the rules the config file is loaded with
+        for name in ("weekly_schedules", "date_overrides"):
+            if name in params:
+                config_schema.validate_section(name, params[name])
+        if "weekly_schedules" in params:
+            self.worker.set_weekly_schedules(params["weekly_schedules"])
+        if "date_overrides" in params:
+            self.worker.set_date_overrides(params["date_overrides"])
+        if "enabled" in params:
+            enabled = bool(params["enabled"])
+            self.schedule_checkbox.blockSignals(True)
+            self.schedule_checkbox.setChecked(enabled)
+            self.schedule_checkbox.blockSignals(False)
+            self.worker.toggle_schedule(enabled)
+            self.schedule_status_label.setText("Schedule: " + ("Enabled" if enabled else "Disabled"))
+        self.update_schedule_summary()
+        return self.rpc_get_schedules()
+        
+    def rpc_get_excluded_apps(self):
+        return {"enabled": self.worker.app_monitoring_active, "apps": self.get_app_list()}
+        
+    def _rpc_app_list(self, params):
+        apps = params["apps"]
+        if not isinstance(apps, list) or not all(isinstance(app, str) and app for app in apps):
+            raise ValueError("apps must be a list of names or patterns")
+        try:
+            AppMatcher(apps)
+        except re.error as e:
+            raise ValueError(f"Invalid pattern: {str(e)}")
+        return apps
+        
+    def rpc_set_excluded_apps(self, params):
+        if "apps" in params:
+            apps = self._rpc_app_list(params)
+            self.app_list.clear()
+            for app in apps:
+                self.app_list.addItem(QListWidgetItem(app))
+            self.worker.set_excluded_apps(apps)
+        if "enabled" in params:
+            enabled = bool(params["enabled"])
+            self.app_checkbox.blockSignals(True)
+            self.app_checkbox.setChecked(enabled)
+            self.app_checkbox.blockSignals(False)
+            self.worker.toggle_app_monitoring(enabled)
+            self.app_monitoring_status_label.setText("App Monitoring: " + ("Enabled" if enabled else "Disabled"))
+        return self.rpc_get_excluded_apps()
+        
+    def rpc_add_excluded_apps(self, params):
+        existing = set(self.get_app_list())
+        for app in self._rpc_app_list(params):
+            if app not in existing:
+                existing.add(app)
+                self.app_list.addItem(QListWidgetItem(app))
+                self.worker.add_excluded_app(app)
+        return self.rpc_get_excluded_apps()
+        
+    def rpc_remove_excluded_apps(self, params):
+        removed = set(self._rpc_app_list(params))
+        for i in reversed(range(self.app_list.count())):
+            if self.app_list.item(i).text() in removed:
+                self.app_list.takeItem(i)
+        for app in removed:
+            self.worker.remove_excluded_app(app)
+        return self.rpc_get_excluded_apps()
+        
     def close_application(self):
         """Actually close the application"""
         # Save current config before exiting
         self.save_config()
+        self.save_startup_cache(self.current_config())
+        
+        if self.instance_server is not None:
+            self.instance_server.stop()
+        self.config_watcher.stop()
         
         # Stop the worker thread
         self.worker.stop()
         self.worker.wait()
         
+        if self.session_source is not None:
+            self.session_source.unregister()
+        
         # Hide tray icon and quit
         self.tray_icon.hide()
         QApplication.quit()
@@ -1174,6 +1979,15 @@ if __name__ == "__main__":
                        help='Start the application in startup mode (minimized)')
     args = parser.parse_args()
     
+    # Only one instance may inject input; a second launch brings the first to the front
+    instance_lock = InstanceLock()
+    if not instance_lock.acquire():
+        try:
+            send_request({"command": "show"})
+        except ConnectionError as e:
+            print(f"Another instance holds the lock but could not be reached: {str(e)}")
+        sys.exit(0)
+    
     app = QApplication(sys.argv)
     # Prevent app from exiting when last window is closed
     app.setQuitOnLastWindowClosed(False)
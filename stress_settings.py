@@ -0,0 +1,182 @@
+"""
+Stress test for the settings snapshots shared by the GUI and worker threads.
+
+Runs a real StayAwakeWorker and calls its setters from the main thread, standing
+in for the GUI, as fast as it can: weekly schedules (then editing the dict that
+was passed in, as the schedule dialog does), excluded apps (whole lists, single
+adds and removes), schedule toggling, activity type, interval and custom key.
+The worker is woken after every round so it ticks continuously, and every tick
+checks the snapshot it evaluates:
+
+- the compiled schedule matches the weekly schedules published with it
+- the excluded app matcher matches all of its own literal entries
+- the snapshot does not change while the tick is using it
+- no setting goes back to an older value
+
+No input is injected: simulate_activity is replaced by the same checks. The
+worker writes the status page, so this refuses to run next to Stay Awake.
+
+Usage: python stress_settings.py [--seconds 10] [--seed 1]
+"""
+import sys
+import json
+import time
+import random
+import argparse
+import threading
+
+from PyQt6.QtCore import QCoreApplication
+
+from stay_awake import StayAwakeWorker
+from compiled_schedule import CompiledSchedule
+from app_matcher import is_pattern
+from instance import InstanceLock
+import config_schema
+
+ACTIVITY_TYPES = [StayAwakeWorker.ACTIVITY_MOUSE_MOVEMENT, StayAwakeWorker.ACTIVITY_KEY_PRESS,
+                  StayAwakeWorker.ACTIVITY_CUSTOM_KEY, StayAwakeWorker.ACTIVITY_BOTH]
+
+
+def random_schedules(rng, generation):
+    """Return weekly schedules tagged with the round that published them"""
+    schedules = config_schema.default_weekly_schedules()
+    for name, schedule in schedules.items():
+        schedule["enabled"] = rng.random() < 0.7
+        if name != "global":
+            schedule["use_global"] = rng.random() < 0.5
+        schedule["periods"] = [{"enabled": rng.random() < 0.8,
+                                "start_hour": rng.randrange(24), "start_minute": rng.randrange(60),
+                                "end_hour": rng.randrange(24), "end_minute": rng.randrange(60)}
+                               for _ in range(rng.randrange(1, 4))]
+    schedules["global"]["generation"] = generation
+    return schedules
+
+
+def fingerprint(settings):
+    return (json.dumps(settings.weekly_schedules, sort_keys=True), tuple(settings.excluded_apps.entries),
+            settings.activity_type, settings.activity_interval, settings.custom_key_code,
+            settings.schedule_active)
+
+
+class SnapshotChecker:
+    """Checks every snapshot the worker evaluates, on the worker thread"""
+
+    def __init__(self):
+        self.errors = []
+        self.checks = 0
+        self.snapshots = 0  # Times a tick saw a different snapshot than the one before
+        self._previous = None
+        self._last = {"schedules": -1, "apps": -1, "key": -1}
+        self._lock = threading.Lock()
+
+    def error(self, message):
+        with self._lock:
+            if len(self.errors) < 20:
+                self.errors.append(message)
+
+    def check(self, settings):
+        self.checks += 1
+        if settings is not self._previous:
+            self.snapshots += 1
+            self._previous = settings
+        schedules = settings.weekly_schedules
+        if schedules is not None:
+            if CompiledSchedule(schedules, settings.date_overrides) != settings.compiled_schedule:
+                self.error("compiled schedule does not match the weekly schedules")
+            self._forward("schedules", schedules["global"].get("generation", -1))
+        for entry in settings.excluded_apps:
+            if not is_pattern(entry) and not settings.excluded_apps.matches(entry):
+                self.error(f"excluded app matcher does not match its entry {entry}")
+        generations = [int(entry[3:-4]) for entry in settings.excluded_apps if entry.startswith("gen")]
+        if len(generations) > 1:
+            self.error(f"excluded apps from several rounds: {generations}")
+        self._forward("apps", max(generations, default=-1))
+        self._forward("key", settings.custom_key_code if settings.custom_key_code != 0x7E else -1)
+
+    def _forward(self, name, generation):
+        if generation < self._last[name]:
+            self.error(f"{name} went back from round {self._last[name]} to {generation}")
+        self._last[name] = max(self._last[name], generation)
+
+    def wrap(self, worker):
+        """Check the snapshot around every rule evaluation and activity simulation"""
+        evaluate = worker.rule_engine.evaluate
+
+        def checked_evaluate(state, now=None):
+            before = fingerprint(state)
+            self.check(state)
+            verdict = evaluate(state, now)
+            if fingerprint(state) != before:
+                self.error("snapshot changed while it was being evaluated")
+            return verdict
+
+        def checked_simulate(settings=None):
+            if settings is not None:
+                self.check(settings)
+
+        worker.rule_engine.evaluate = checked_evaluate
+        worker.simulate_activity = checked_simulate
+
+
+def hammer(worker, rng, seconds):
+    """Call the worker setters from this (GUI) thread until the time is up"""
+    rounds = 0
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        rounds += 1
+        schedules = random_schedules(rng, rounds)
+        worker.set_weekly_schedules(schedules)
+        # Like the dialog, keep editing the dict that was handed over
+        for schedule in schedules.values():
+            schedule["enabled"] = not schedule["enabled"]
+            schedule["periods"].clear()
+
+        worker.set_excluded_apps([f"gen{rounds}.exe", "chrome*", "re:^python3?\\.exe$"])
+        worker.add_excluded_app(f"Extra{rounds}.exe")
+        worker.remove_excluded_app(f"Extra{rounds}.exe")
+        worker.toggle_schedule(rng.random() < 0.5)
+        worker.set_activity_type(rng.choice(ACTIVITY_TYPES))
+        worker.set_activity_interval(rng.randrange(config_schema.MIN_INTERVAL, config_schema.MAX_INTERVAL))
+        worker.set_custom_key(f"{rounds + 0x100:X}")
+        worker.wake()
+    return rounds
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="Stress the worker settings snapshots")
+    parser.add_argument("--seconds", type=float, default=10.0, help="How long to run")
+    parser.add_argument("--seed", type=int, default=1, help="Random seed")
+    args = parser.parse_args(argv)
+
+    lock = InstanceLock()
+    if not lock.acquire():
+        print("Stay Awake is running; close it first, this test writes its status page")
+        return 2
+    app = QCoreApplication(sys.argv)
+
+    worker = StayAwakeWorker()
+    checker = SnapshotChecker()
+    checker.wrap(worker)
+    worker.set_activity_interval(0)
+    worker.toggle_app_monitoring(True)
+    worker.toggle_active(True)
+    worker.start()
+    try:
+        rounds = hammer(worker, random.Random(args.seed), args.seconds)
+    finally:
+        worker.stop()
+        worker.wait()
+        lock.release()
+    app.processEvents()
+
+    print(f"{rounds} setter rounds, {checker.checks} snapshot checks "
+          f"over {checker.snapshots} snapshot changes")
+    for message in checker.errors:
+        print(f"FAIL: {message}")
+    if not checker.errors:
+        print("OK: every tick saw a consistent, unchanging snapshot")
+    return 1 if checker.errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,51 @@
+"""Config validation across fields, and the headless imports of config_schema"""
+import os
+import sys
+import subprocess
+
+import pytest
+
+import config_schema
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def errors_of(config):
+    with pytest.raises(config_schema.ConfigError) as info:
+        config_schema.validate(config)
+    return info.value.errors
+
+
+@pytest.mark.parametrize("section, changes, error", [
+    ("load_monitoring", {"cpu_low": 40, "cpu_high": 30}, "load_monitoring.cpu_low: must not be above cpu_high"),
+    ("load_monitoring", {"disk_low": 9}, "load_monitoring.disk_low: must not be above disk_high"),
+    ("network_monitoring", {"min_interval": 100, "max_interval": 60},
+     "network_monitoring.min_interval: must not be above max_interval"),
+])
+def test_low_above_high_is_rejected(section, changes, error):
+    config = config_schema.default_config()
+    config[section].update(changes)
+    errors = errors_of(config)
+    assert len(errors) == 1
+    assert errors[0].startswith(error)
+
+
+def test_missing_fields_are_compared_with_their_defaults():
+    config = config_schema.default_config()
+    config["load_monitoring"] = {"enabled": True, "cpu_low": 50}
+    assert errors_of(config)[0].startswith("load_monitoring.cpu_low: must not be above cpu_high")
+    config["load_monitoring"] = {"enabled": True, "cpu_low": 10, "cpu_high": 10}
+    config_schema.validate(config)
+
+
+def test_wrong_types_are_reported_once():
+    config = config_schema.default_config()
+    config["network_monitoring"]["min_interval"] = "5"
+    assert errors_of(config) == ["network_monitoring.min_interval: must be a number between 1 and 3600 (got '5')"]
+
+
+def test_import_pulls_in_no_monitors():
+    code = ("import sys, config_schema; "
+            "print(sorted({'psutil', 'subprocess', 'meeting_calendar', 'load_monitor'} & set(sys.modules)))")
+    output = subprocess.run([sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True, check=True)
+    assert output.stdout.strip() == "[]"
@@ -0,0 +1,109 @@
+"""SettingsHolder snapshots published by writer threads while readers use them"""
+import sys
+import threading
+
+import pytest
+
+import config_schema
+from app_matcher import AppMatcher
+from compiled_schedule import CompiledSchedule
+from engine_settings import EngineSettings, SettingsHolder
+
+ROUNDS = 2000
+
+
+@pytest.fixture
+def fast_switching():
+    """Switch threads as often as possible so races show up"""
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    yield
+    sys.setswitchinterval(interval)
+
+
+def make_settings(**fields):
+    settings = EngineSettings(**dict.fromkeys(EngineSettings._fields))
+    return settings._replace(**fields)
+
+
+def schedules_for(generation):
+    """Weekly schedules whose global period starts at a minute derived from the generation"""
+    schedules = config_schema.default_weekly_schedules()
+    period = schedules["global"]["periods"][0]
+    period["start_hour"], period["start_minute"] = divmod(generation % (8 * 60), 60)
+    schedules["global"]["generation"] = generation
+    return schedules
+
+
+def test_update_publishes_a_new_snapshot():
+    holder = SettingsHolder(make_settings(activity_interval=60, custom_key_code=0x7E))
+    before = holder.current
+    after = holder.update(activity_interval=30)
+    assert holder.current is after
+    assert after is not before
+    assert before.activity_interval == 60
+    assert after.activity_interval == 30
+    assert after.custom_key_code == 0x7E
+
+
+def test_readers_never_see_torn_snapshots(fast_switching):
+    """Fields published together are always read together, and never go back"""
+    schedules = schedules_for(0)
+    holder = SettingsHolder(make_settings(weekly_schedules=schedules,
+                                          compiled_schedule=CompiledSchedule(schedules),
+                                          excluded_apps=AppMatcher(["gen0.exe"]),
+                                          activity_interval=0, custom_key_code=0))
+    done = threading.Event()
+    errors = []
+
+    def read():
+        last = -1
+        while not done.is_set():
+            settings = holder.current
+            generation = settings.weekly_schedules["global"]["generation"]
+            if not (generation == settings.activity_interval == settings.custom_key_code):
+                errors.append(f"torn snapshot: {generation}, {settings.activity_interval}, "
+                              f"{settings.custom_key_code}")
+            if CompiledSchedule(settings.weekly_schedules) != settings.compiled_schedule:
+                errors.append(f"compiled schedule does not match round {generation}")
+            if not settings.excluded_apps.matches(f"gen{generation}.exe"):
+                errors.append(f"excluded apps do not match round {generation}")
+            if generation < last:
+                errors.append(f"went back from round {last} to {generation}")
+            last = generation
+
+    readers = [threading.Thread(target=read) for _ in range(2)]
+    for reader in readers:
+        reader.start()
+    try:
+        for generation in range(1, ROUNDS):
+            schedules = schedules_for(generation)
+            holder.update(weekly_schedules=schedules, compiled_schedule=CompiledSchedule(schedules),
+                          excluded_apps=AppMatcher([f"gen{generation}.exe"]),
+                          activity_interval=generation, custom_key_code=generation)
+    finally:
+        done.set()
+        for reader in readers:
+            reader.join()
+    assert errors[:5] == []
+    assert holder.current.activity_interval == ROUNDS - 1
+
+
+def test_concurrent_writers_do_not_lose_updates(fast_switching):
+    """Writers changing different fields each keep the other's latest change"""
+    holder = SettingsHolder(make_settings(activity_interval=0, custom_key_code=0, active=False))
+
+    def write(name):
+        for value in range(1, ROUNDS + 1):
+            holder.update(**{name: value})
+
+    writers = [threading.Thread(target=write, args=(name,)) for name in ("activity_interval", "custom_key_code")]
+    for writer in writers:
+        writer.start()
+    for _ in range(ROUNDS):
+        holder.update(active=not holder.current.active)
+    for writer in writers:
+        writer.join()
+    assert holder.current.activity_interval == ROUNDS
+    assert holder.current.custom_key_code == ROUNDS
+    assert holder.current.active is False
@@ -0,0 +1,15 @@
+"""Recognising command lines meant for the running instance"""
+from instance import is_control_command
+
+
+def test_control_flags_are_recognised_in_both_spellings():
+    assert is_control_command(["--status"])
+    assert is_control_command(["--watch-pid", "1234"])
+    assert is_control_command(["--watch-pid=1234"])
+    assert is_control_command(["--json", "--unwatch-pid=1234"])
+
+
+def test_other_arguments_start_the_app():
+    assert not is_control_command([])
+    assert not is_control_command(["--minimized"])
+    assert not is_control_command(["--watch-pidfile=x"])
@@ -0,0 +1,93 @@
+"""LeaseTable expiry with a fake clock"""
+import pytest
+
+from leases import LeaseTable
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 500.0
+
+    def __call__(self):
+        return self.now
+
+
+def make_table():
+    clock = FakeClock()
+    table = LeaseTable(clock)
+    changes = []
+    table.listeners.append(lambda: changes.append(len(table)))
+    return table, clock, changes
+
+
+def test_lease_expires_at_its_deadline():
+    table, clock, changes = make_table()
+    lease = table.acquire(10, "backup")
+    assert table.is_held()
+    assert table.next_deadline() == 510.0
+
+    clock.now += 9.9
+    assert table.expire() == []
+    assert table.is_held()
+    clock.now += 0.1
+    assert table.expire() == [lease]
+    assert not table.is_held()
+    assert table.next_deadline() is None
+    assert changes == [1, 0]
+
+
+def test_renewing_moves_the_deadline():
+    table, clock, _ = make_table()
+    lease = table.acquire(10)
+    clock.now += 5
+    table.renew(lease.id, 10)
+    # The heap entry of the old deadline is stale and must not expire the lease
+    clock.now += 5
+    assert table.expire() == []
+    assert table.is_held()
+    assert table.next_deadline() == 515.0
+    clock.now += 5
+    assert table.expire() == [lease]
+
+
+def test_released_lease_leaves_no_deadline():
+    table, clock, changes = make_table()
+    first = table.acquire(10)
+    second = table.acquire(30)
+    assert table.release(first.id)
+    assert not table.release(first.id)
+    assert table.next_deadline() == 530.0
+    clock.now += 10
+    assert table.expire() == []
+    clock.now += 20
+    assert table.expire() == [second]
+    assert changes == [1, 2, 1, 0]
+
+
+def test_expire_drops_every_lease_past_its_deadline():
+    table, clock, _ = make_table()
+    leases = [table.acquire(seconds) for seconds in (30, 10, 20)]
+    clock.now += 25
+    assert table.expire() == [leases[1], leases[2]]
+    assert [entry["lease"] for entry in table.snapshot()] == [leases[0].id]
+    assert table.snapshot()[0]["remaining"] == 5.0
+
+
+def test_renew_reason_notifies_listeners():
+    table, _, changes = make_table()
+    lease = table.acquire(10, "render")
+    table.renew(lease.id, 10)
+    assert changes == [1]
+    table.renew(lease.id, 10, "encode")
+    assert changes == [1, 1]
+    assert table.describe() == "Lease held (encode)"
+
+
+def test_invalid_requests():
+    table, _, _ = make_table()
+    with pytest.raises(KeyError):
+        table.renew(99, 10)
+    for seconds in (0, -1, LeaseTable.MAX_DURATION + 1):
+        with pytest.raises(ValueError):
+            table.acquire(seconds)
+    assert not table.is_held()
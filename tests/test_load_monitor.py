@@ -0,0 +1,110 @@
+"""LoadMonitor smoothing and hysteresis with a fake clock and FakeLoadSource"""
+import math
+
+import pytest
+
+from load_monitor import LoadMonitor, FakeLoadSource
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def make_monitor(**settings):
+    clock = FakeClock()
+    source = FakeLoadSource()
+    monitor = LoadMonitor(dict(settings, enabled=True), source, clock)
+    monitor.sample()  # Baseline
+    return monitor, source, clock
+
+
+def run(monitor, source, clock, samples, cpu_percent=0.0, disk_mb_per_second=0.0, seconds=10):
+    """Sample the given load the given number of times, returns the busy state after each"""
+    states = []
+    for _ in range(samples):
+        clock.now += seconds
+        source.advance(seconds, cpu_percent, disk_mb_per_second)
+        states.append(monitor.sample())
+    return states
+
+
+def test_first_sample_only_sets_the_baseline():
+    monitor = LoadMonitor(source=FakeLoadSource(), clock=FakeClock())
+    assert monitor.sample() is False
+    assert monitor.cpu_percent == 0.0
+
+
+def test_cpu_is_smoothed_with_an_ewma():
+    monitor, source, clock = make_monitor(smoothing=60)
+    run(monitor, source, clock, 1, cpu_percent=50)
+    assert monitor.cpu_percent == pytest.approx(50 * (1 - math.exp(-10 / 60)))
+    # A short spike does not make the machine busy
+    assert not monitor.busy
+
+
+def test_weight_depends_on_the_elapsed_time():
+    regular, regular_source, regular_clock = make_monitor(smoothing=60)
+    run(regular, regular_source, regular_clock, 6, cpu_percent=80)
+    irregular, irregular_source, irregular_clock = make_monitor(smoothing=60)
+    run(irregular, irregular_source, irregular_clock, 1, cpu_percent=80, seconds=60)
+    assert irregular.cpu_percent == pytest.approx(regular.cpu_percent)
+
+
+def test_hysteresis_between_the_thresholds():
+    monitor, source, clock = make_monitor(cpu_high=30, cpu_low=15, smoothing=60)
+    states = run(monitor, source, clock, 12, cpu_percent=50)
+    assert states[0] is False
+    assert states[-1] is True
+    # Crossing the high threshold is what flips it, not the raw load
+    first_busy = states.index(True)
+    assert all(states[first_busy:])
+
+    # Load between the thresholds keeps a busy machine busy indefinitely
+    assert all(run(monitor, source, clock, 60, cpu_percent=20))
+    assert monitor.cpu_percent == pytest.approx(20, abs=0.1)
+
+    # Only dropping below the low threshold makes it idle again
+    states = run(monitor, source, clock, 30, cpu_percent=0)
+    assert states[-1] is False
+    assert monitor.cpu_percent < 15
+
+
+def test_load_between_the_thresholds_does_not_make_an_idle_machine_busy():
+    monitor, source, clock = make_monitor(cpu_high=30, cpu_low=15)
+    assert not any(run(monitor, source, clock, 60, cpu_percent=25))
+
+
+def test_disk_load_alone_makes_the_machine_busy():
+    monitor, source, clock = make_monitor(disk_high=5, disk_low=1, smoothing=10)
+    assert run(monitor, source, clock, 5, disk_mb_per_second=20)[-1] is True
+    assert monitor.cpu_percent == 0.0
+    # CPU below its low threshold is not enough while the disk is still busy
+    assert run(monitor, source, clock, 1, disk_mb_per_second=3)[-1] is True
+    assert run(monitor, source, clock, 10)[-1] is False
+
+
+def test_maybe_sample_waits_for_the_interval():
+    monitor, source, clock = make_monitor(interval=10)
+    clock.now += 5
+    source.advance(5, 100)
+    monitor.maybe_sample()
+    assert monitor.sample_count == 1
+    clock.now += 5
+    source.advance(5, 100)
+    monitor.maybe_sample()
+    assert monitor.sample_count == 2
+    assert monitor.cpu_percent > 0
+
+
+def test_configure_keeps_the_smoothed_history():
+    monitor, source, clock = make_monitor(cpu_high=30, cpu_low=15)
+    run(monitor, source, clock, 20, cpu_percent=25)
+    assert not monitor.busy
+    smoothed = monitor.cpu_percent
+    monitor.configure({"cpu_high": 20})
+    assert monitor.cpu_percent == smoothed
+    assert run(monitor, source, clock, 1, cpu_percent=25)[-1] is True
@@ -0,0 +1,62 @@
+"""MeetingCalendar with malformed recurrence rules"""
+from datetime import datetime
+
+import pytest
+
+from meeting_calendar import MeetingCalendar, RecurrenceRule
+
+NOW = datetime(2026, 3, 2, 9, 0).timestamp()  # A Monday
+
+
+def write_calendar(path, *rules):
+    lines = ["BEGIN:VCALENDAR"]
+    for number, rule in enumerate(rules):
+        lines += ["BEGIN:VEVENT", f"UID:event{number}", f"SUMMARY:Event {number}",
+                  "DTSTART:20260302T100000", "DTEND:20260302T110000", f"RRULE:{rule}", "END:VEVENT"]
+    lines.append("END:VCALENDAR")
+    path.write_text("\r\n".join(lines) + "\r\n")
+
+
+def make_calendar(path):
+    return MeetingCalendar({"path": str(path), "before_minutes": 0, "after_minutes": 0}, clock=lambda: NOW)
+
+
+@pytest.mark.parametrize("rule", [
+    "FREQ=YEARLY;BYMONTH=13", "FREQ=YEARLY;BYMONTH=0", "FREQ=MONTHLY;BYMONTHDAY=32",
+    "FREQ=MONTHLY;BYMONTHDAY=0", "FREQ=MONTHLY;BYMONTHDAY=-32", "FREQ=MONTHLY;BYDAY=6MO",
+    "FREQ=MONTHLY;BYDAY=0FR", "FREQ=YEARLY;BYDAY=54MO", "FREQ=MONTHLY;BYDAY=XX",
+    "FREQ=MONTHLY;BYDAY=FR;BYSETPOS=0", "FREQ=DAILY;INTERVAL=0", "FREQ=DAILY;COUNT=0",
+    "FREQ=DAILY;BYHOUR=24"])
+def test_out_of_range_rule_parts_are_rejected(rule):
+    with pytest.raises(ValueError):
+        RecurrenceRule(rule, datetime(2026, 3, 2, 10, 0), None)
+
+
+def test_valid_rule_parts_are_accepted():
+    RecurrenceRule("FREQ=YEARLY;BYDAY=-53SU;BYMONTHDAY=-31,31;BYSETPOS=-366", datetime(2026, 3, 2), None)
+    RecurrenceRule("FREQ=MONTHLY;BYDAY=-5FR,+1MO;BYMONTH=1,12", datetime(2026, 3, 2), None)
+
+
+def test_bad_events_are_skipped_and_the_rest_indexed(tmp_path):
+    path = tmp_path / "calendar.ics"
+    write_calendar(path, "FREQ=YEARLY;BYMONTH=13", "FREQ=DAILY")
+    calendar = make_calendar(path)
+    assert calendar.maybe_reload()
+    assert calendar.errors == 1
+    assert calendar.in_meeting(datetime(2026, 3, 3, 10, 30).timestamp())
+
+
+def test_events_failing_to_expand_are_dropped(tmp_path, monkeypatch):
+    path = tmp_path / "calendar.ics"
+    write_calendar(path, "FREQ=WEEKLY", "FREQ=DAILY")
+    calendar = make_calendar(path)
+    calendar.maybe_reload()
+    broken = next(event for event in calendar.events.values() if event.uid == "event0")
+
+    def fail(*args):
+        raise ValueError("Cannot expand")
+
+    monkeypatch.setattr(broken, "occurrences", fail)
+    calendar.index(NOW)
+    assert broken not in calendar.events.values()
+    assert calendar.in_meeting(datetime(2026, 3, 3, 10, 30).timestamp())
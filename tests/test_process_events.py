@@ -0,0 +1,176 @@
+"""ProcessTracker driven by FakeProcessEventSource"""
+from app_matcher import AppMatcher
+from process_events import ProcessTracker, FakeProcessEventSource
+
+
+class UnavailableSource(FakeProcessEventSource):
+    name = "unavailable"
+
+    def start(self, on_start, on_exit, on_failure=None):
+        raise OSError("Not supported here")
+
+
+class RacingSource(FakeProcessEventSource):
+    """Delivers events while the tracker is still taking its snapshot"""
+
+    def __init__(self, processes, during_snapshot):
+        super().__init__(processes)
+        self.during_snapshot = during_snapshot
+
+    def snapshot(self):
+        processes = super().snapshot()
+        for emit in self.during_snapshot:
+            emit(self)
+        return processes
+
+
+class StopCountingSource(FakeProcessEventSource):
+    """Reports a failure without stopping itself, like the netlink and WMI threads"""
+
+    def __init__(self, processes=None):
+        super().__init__(processes)
+        self.stopped = 0
+
+    def stop(self):
+        self.stopped += 1
+        super().stop()
+
+    def fail_running(self, error="Lost events"):
+        self._on_failure(error)
+
+
+def make_tracker(sources, apps=("game.exe",)):
+    changes = []
+    tracker = ProcessTracker(AppMatcher(list(apps)), sources, on_change=lambda: changes.append(True))
+    return tracker, changes
+
+
+def test_snapshot_seeds_the_process_table():
+    source = FakeProcessEventSource({1: (0, "init"), 20: (1, "game.exe")})
+    tracker, _ = make_tracker([source])
+    assert tracker.start() is source
+    assert tracker.running
+    assert tracker.processes == {1: (0, "init"), 20: (1, "game.exe")}
+    assert tracker.is_matching_running()
+
+
+def test_start_and_exit_events_flip_the_matching_state():
+    source = FakeProcessEventSource({1: (0, "init")})
+    tracker, changes = make_tracker([source])
+    tracker.start()
+    assert not tracker.is_matching_running()
+
+    source.emit_start(30, "Game.EXE", ppid=1)
+    assert tracker.is_matching_running()
+    assert tracker.processes[30] == (1, "Game.EXE")
+    source.emit_start(31, "game.exe", ppid=1)
+    source.emit_start(32, "editor", ppid=1)
+    assert len(changes) == 1  # Only the flip to matching is reported
+
+    source.emit_exit(30)
+    assert tracker.is_matching_running()
+    source.emit_exit(31)
+    assert not tracker.is_matching_running()
+    assert len(changes) == 2
+    assert 31 not in tracker.processes
+
+
+def test_set_matcher_recounts_from_the_table():
+    source = FakeProcessEventSource({5: (1, "build.exe")})
+    tracker, changes = make_tracker([source])
+    tracker.start()
+    assert not tracker.is_matching_running()
+    tracker.set_matcher(AppMatcher(["build*"]))
+    assert tracker.is_matching_running()
+    assert changes == [True]
+
+
+def test_listeners_get_the_snapshot_and_events():
+    source = FakeProcessEventSource({1: (0, "init")})
+    tracker, _ = make_tracker([source])
+    seen = []
+    tracker.add_listener(lambda pid, ppid, name: seen.append(("start", pid, ppid, name)),
+                         lambda pid: seen.append(("exit", pid)),
+                         lambda processes: seen.append(("snapshot", processes)))
+    tracker.start()
+    source.emit_start(2, "sh", ppid=1)
+    source.emit_exit(2)
+    assert seen == [("snapshot", {1: (0, "init")}), ("start", 2, 1, "sh"), ("exit", 2)]
+
+
+def test_events_during_the_snapshot_are_replayed_after_it():
+    # The snapshot was taken before 40 started and after 1 exited
+    source = RacingSource({1: (0, "init")}, [lambda s: s.emit_start(40, "game.exe", ppid=1),
+                                             lambda s: s.emit_exit(1)])
+    tracker, changes = make_tracker([source])
+    seen = []
+    tracker.add_listener(lambda pid, ppid, name: seen.append(("start", pid)),
+                         lambda pid: seen.append(("exit", pid)),
+                         lambda processes: seen.append(("snapshot", sorted(processes))))
+    tracker.start()
+    assert tracker.processes == {40: (1, "game.exe")}
+    assert tracker.is_matching_running()
+    assert changes == [True]
+    assert seen == [("snapshot", [1]), ("start", 40), ("exit", 1)]
+
+
+def test_live_events_during_the_replay_queue_up_behind_it():
+    source = RacingSource({1: (0, "init")}, [lambda s: s.emit_start(40, "game.exe", ppid=1)])
+    tracker, _ = make_tracker([source])
+    # The game exits right after the snapshot, before its buffered start was replayed
+    tracker.add_listener(lambda pid, ppid, name: None, lambda pid: None,
+                         lambda processes: source.emit_exit(40) if processes else None)
+    tracker.start()
+    assert tracker.processes == {1: (0, "init")}
+    assert not tracker.is_matching_running()
+    # Afterwards events are applied directly again
+    source.emit_start(41, "game.exe", ppid=1)
+    assert tracker.is_matching_running()
+
+
+def test_unavailable_sources_are_skipped():
+    fallback = FakeProcessEventSource({7: (1, "game.exe")})
+    tracker, _ = make_tracker([UnavailableSource(), fallback])
+    assert tracker.start() is fallback
+    assert tracker.is_matching_running()
+
+
+def test_a_failing_source_falls_back_with_a_fresh_snapshot():
+    first = FakeProcessEventSource({1: (0, "init")})
+    second = FakeProcessEventSource({1: (0, "init"), 50: (1, "game.exe")})
+    tracker, changes = make_tracker([first, second])
+    tracker.start()
+    assert not tracker.is_matching_running()
+
+    first.fail("Buffer overrun")
+    assert tracker.source is second
+    assert tracker.is_matching_running()
+    assert changes == [True]
+    # The failed source no longer delivers events, the new one does
+    first.emit_start(60, "other.exe")
+    assert 60 not in tracker.processes
+    second.emit_exit(50)
+    assert not tracker.is_matching_running()
+
+
+def test_failing_last_source_stops_tracking():
+    source = FakeProcessEventSource({50: (1, "game.exe")})
+    tracker, _ = make_tracker([source])
+    snapshots = []
+    tracker.add_listener(lambda *args: None, lambda pid: None, snapshots.append)
+    tracker.start()
+    source.fail()
+    assert not tracker.running
+    assert tracker.processes == {}
+    assert not tracker.is_matching_running()
+    assert snapshots[-1] == {}
+
+
+def test_failed_source_is_stopped_before_falling_back():
+    first = StopCountingSource({1: (0, "init")})
+    second = FakeProcessEventSource({1: (0, "init")})
+    tracker, _ = make_tracker([first, second])
+    tracker.start()
+    first.fail_running()
+    assert first.stopped == 1
+    assert tracker.source is second
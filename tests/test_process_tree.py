@@ -0,0 +1,130 @@
+"""ProcessTreeWatcher fed by a ProcessTracker and FakeProcessEventSource"""
+from process_events import ProcessTracker, FakeProcessEventSource
+from process_tree import ProcessTreeWatcher
+
+
+def make_watcher(processes=None, patterns=("make",)):
+    source = FakeProcessEventSource(processes or {1: (0, "init")})
+    tracker = ProcessTracker(sources=[source])
+    watcher = ProcessTreeWatcher(list(patterns))
+    watcher.attach(tracker)
+    tracker.start()
+    return source, watcher
+
+
+def test_descendants_of_a_matching_process_are_held():
+    source, watcher = make_watcher()
+    assert not watcher.is_held()
+    source.emit_start(10, "make", ppid=1)
+    source.emit_start(11, "cc", ppid=10)
+    source.emit_start(12, "ld", ppid=11)
+    source.emit_start(13, "editor", ppid=1)
+    assert set(watcher.held) == {10, 11, 12}
+
+    source.emit_exit(10)
+    source.emit_exit(12)
+    assert watcher.is_held()
+    source.emit_exit(11)
+    assert not watcher.is_held()
+
+
+def test_reparented_children_stay_held():
+    source, watcher = make_watcher()
+    source.emit_start(10, "make", ppid=1)
+    source.emit_start(11, "daemon", ppid=10)
+    source.emit_exit(10)
+    # The orphan is reparented to init
+    source.emit_start(11, "daemon", ppid=1)
+    assert set(watcher.held) == {11}
+    assert watcher.parents[11] == 1
+    assert 11 in watcher.children[1]
+    assert 10 not in watcher.children
+
+    # Its own children still join the tree
+    source.emit_start(12, "worker", ppid=11)
+    assert set(watcher.held) == {11, 12}
+    source.emit_exit(12)
+    source.emit_exit(11)
+    assert not watcher.is_held()
+
+
+def test_reused_pid_is_not_held():
+    source, watcher = make_watcher()
+    source.emit_start(10, "make", ppid=1)
+    source.emit_exit(10)
+    source.emit_start(10, "editor", ppid=1)
+    assert not watcher.is_held()
+
+
+def test_snapshot_seeds_running_trees():
+    _, watcher = make_watcher({1: (0, "init"), 10: (1, "make"), 11: (10, "cc"), 20: (1, "editor")})
+    assert set(watcher.held) == {10, 11}
+
+
+def test_watch_and_unwatch_a_running_pid():
+    source, watcher = make_watcher({1: (0, "init"), 20: (1, "bash"), 21: (20, "python")}, patterns=())
+    assert not watcher.has_watches()
+    watcher.watch_pid(20)
+    assert watcher.has_watches()
+    assert set(watcher.held) == {20, 21}
+    source.emit_start(22, "sleep", ppid=21)
+    assert 22 in watcher.held
+
+    watcher.unwatch_pid(20)
+    assert not watcher.is_held()
+    assert not watcher.has_watches()
+
+
+def test_orphans_of_an_exited_root_count_as_watches():
+    source, watcher = make_watcher(patterns=())
+    source.emit_start(20, "bash", ppid=1)
+    watcher.watch_pid(20)
+    source.emit_start(21, "sleep", ppid=20)
+    source.emit_exit(20)
+    assert set(watcher.held) == {21}
+    assert watcher.has_watches()
+    watcher.unwatch_pid(20)
+    assert not watcher.is_held()
+
+
+def test_changing_watches_keeps_reparented_descendants_of_other_trees():
+    source, watcher = make_watcher(patterns=("make",))
+    source.emit_start(10, "make", ppid=1)
+    source.emit_start(11, "daemon", ppid=10)
+    source.emit_exit(10)
+    source.emit_start(11, "daemon", ppid=1)
+    source.emit_start(20, "bash", ppid=1)
+    source.emit_start(21, "python", ppid=20)
+    watcher.watch_pid(20)
+    assert set(watcher.held) == {11, 20, 21}
+
+    # Only the unwatched root's own subtree is released
+    watcher.unwatch_pid(20)
+    assert set(watcher.held) == {11}
+    watcher.set_patterns(["make", "ffmpeg"])
+    assert set(watcher.held) == {11}
+    # Dropping the pattern releases the orphans of its trees too
+    watcher.set_patterns(["ffmpeg"])
+    assert not watcher.is_held()
+
+
+def test_fresh_snapshot_keeps_running_members():
+    source, watcher = make_watcher(patterns=("make",))
+    source.emit_start(10, "make", ppid=1)
+    source.emit_start(11, "daemon", ppid=10)
+    source.emit_exit(10)
+    source.emit_start(11, "daemon", ppid=1)
+    source.emit_start(12, "cc", ppid=1)
+    # E.g. after a failover; 13 started while no events arrived, 12 exited and its pid
+    # was reused
+    watcher.on_snapshot({1: (0, "init"), 11: (1, "daemon"), 12: (1, "editor"), 13: (11, "worker")})
+    assert set(watcher.held) == {11, 13}
+    watcher.on_snapshot({})
+    assert not watcher.is_held()
+
+
+def test_changing_patterns_rebuilds_the_held_set():
+    _, watcher = make_watcher({1: (0, "init"), 10: (1, "make"), 30: (1, "ffmpeg"), 31: (30, "ffprobe")})
+    assert set(watcher.held) == {10}
+    watcher.set_patterns(["ffmpeg"])
+    assert set(watcher.held) == {30, 31}
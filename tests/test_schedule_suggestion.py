@@ -0,0 +1,58 @@
+"""Schedule suggestions for days with breaks and days without activity"""
+from datetime import date, timedelta
+
+from compiled_schedule import CompiledSchedule
+from schedule_suggestion import suggest, merge_periods
+
+FIRST = date(2026, 3, 2)  # A Monday
+
+
+def minutes(start, end):
+    return ((1 << (end - start)) - 1) << start
+
+
+def history(weeks, bitmap_for):
+    """Four weeks of history with the given kept-awake bitmap per weekday"""
+    days = {}
+    for offset in range(weeks * 7):
+        day = FIRST + timedelta(days=offset)
+        bitmap = bitmap_for(day.weekday())
+        if bitmap:
+            days[day] = (bitmap, 0, 0)
+    return days
+
+
+def work_with_lunch(weekday):
+    if weekday < 5:
+        return minutes(9 * 60, 12 * 60) | minutes(13 * 60, 17 * 60)
+    return 0
+
+
+def test_days_without_activity_are_enabled_without_periods():
+    suggestion = suggest(history(4, work_with_lunch), last=FIRST + timedelta(days=27))
+    saturday = suggestion.schedules["Saturday"]
+    assert saturday == {"enabled": True, "use_global": False, "periods": []}
+    compiled = CompiledSchedule(suggestion.schedules)
+    assert compiled.days[5] == ()  # Inactive all day, not unrestricted
+    assert "Saturday: off (4 days)" in suggestion.describe()
+
+
+def test_merge_periods_joins_breaks_into_one_period():
+    suggestion = suggest(history(4, work_with_lunch), last=FIRST + timedelta(days=27))
+    assert len(suggestion.schedules["Monday"]["periods"]) == 2
+    schedules, merged = merge_periods(suggestion)
+    period = {"enabled": True, "start_hour": 9, "start_minute": 0, "end_hour": 17, "end_minute": 0}
+    for name in ("Monday", "Friday", "global"):
+        assert schedules[name]["periods"] == [period]
+    assert schedules["Saturday"]["periods"] == []
+    assert merged[0] == "Monday: 09:00-12:00, 13:00-17:00 joined into 09:00-17:00"
+    assert len(merged) == 5
+    # The suggestion itself is left alone
+    assert len(suggestion.schedules["Monday"]["periods"]) == 2
+
+
+def test_merge_periods_leaves_single_periods_alone():
+    suggestion = suggest(history(4, lambda weekday: minutes(8 * 60, 16 * 60)), last=FIRST + timedelta(days=27))
+    schedules, merged = merge_periods(suggestion)
+    assert merged == []
+    assert schedules == suggestion.schedules
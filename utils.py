@@ -1,8 +1,14 @@
 import os
 import psutil
-import win32gui
-import win32process
+try:
+    import win32gui
+    import win32process
+except ImportError:
+    # Not available outside of Windows; window helpers return None there
+    win32gui = None
+    win32process = None
 from datetime import datetime, time as dt_time
+from app_matcher import AppMatcher
 
 def is_time_between(start_time, end_time, check_time=None):
     """Check if current time is between start and end time"""
@@ -15,30 +21,62 @@ def is_time_between(start_time, end_time, check_time=None):
     else:  # Over midnight
         return check_time >= start_time or check_time <= end_time
 
-def get_active_window_process():
-    """Get the process name of the currently active window"""
+def get_foreground_window():
+    """Get the handle of the currently active window, or None"""
+    if win32gui is None:
+        return None
+    try:
+        return win32gui.GetForegroundWindow() or None
+    except:
+        return None
+
+def get_window_process_id(hwnd):
+    """Get the PID of the process owning a window handle, or None"""
+    if win32process is None or not hwnd:
+        return None
     try:
-        # Get handle of active window
-        hwnd = win32gui.GetForegroundWindow()
-        
-        # Get PID from window handle
         _, pid = win32process.GetWindowThreadProcessId(hwnd)
-        
-        # Get process name from PID
-        process = psutil.Process(pid)
-        return process.name()
+        return pid
+    except:
+        return None
+
+def get_process_name(pid):
+    """Get the name of a process from its PID, or None"""
+    try:
+        return psutil.Process(pid).name()
     except:
         return None
 
+def get_active_window_process():
+    """Get the process name of the currently active window"""
+    # Get handle of active window
+    hwnd = get_foreground_window()
+    
+    # Get PID from window handle
+    pid = get_window_process_id(hwnd)
+    if pid is None:
+        return None
+    
+    # Get process name from PID
+    return get_process_name(pid)
+
 def is_app_running(app_names):
-    """Check if any of the specified apps are running"""
+    """Check if any of the specified apps are running
+
+    app_names can be a plain list of names or an AppMatcher with patterns.
+    """
     if not app_names:
         return False
+
+    if isinstance(app_names, AppMatcher):
+        matcher = app_names
+    else:
+        matcher = AppMatcher(app_names)
         
     try:
         # Get all running processes
         for proc in psutil.process_iter(['name']):
-            if proc.info['name'] in app_names:
+            if matcher.matches(proc.info['name']):
                 return True
         return False
     except:
@@ -1,70 +1,92 @@
 import sys
-from datetime import datetime, time
+import copy
+from datetime import datetime, time, date, timedelta
 from PyQt6.QtWidgets import (QDialog, QVBoxLayout, QHBoxLayout, QPushButton, 
                            QLabel, QTimeEdit, QCheckBox, QTabWidget, 
                            QWidget, QGridLayout, QGroupBox, QComboBox,
-                           QMessageBox)
-from PyQt6.QtCore import Qt, QTime
+                           QMessageBox, QListWidget, QListWidgetItem, QDateEdit,
+                           QLineEdit, QFileDialog)
+from PyQt6.QtCore import Qt, QTime, QDate, QRectF
+from PyQt6.QtGui import QPainter, QColor
+from config_schema import default_weekly_schedules
+from schedule_projection import ScheduleProjection, find_conflicts
+from schedule_suggestion import suggest_from_history, merge_periods, HISTORY_DAYS, MIN_DAYS
+import date_overrides
+
+
+class SchedulePreviewStrip(QWidget):
+    """The active periods of the coming days, one row per day"""
+    
+    LABEL_WIDTH = 60
+    
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.projection = None
+        self.setMinimumHeight(110)
+        
+    def set_projection(self, projection):
+        self.projection = projection
+        self.update()
+        
+    def paintEvent(self, event):
+        if self.projection is None:
+            return
+        painter = QPainter(self)
+        days = min(7, self.projection.days)
+        width = max(1, self.width() - self.LABEL_WIDTH)
+        row_height = self.height() / days
+        text_color = self.palette().color(self.foregroundRole())
+        active = QColor(46, 160, 67)
+        unrestricted = QColor(46, 160, 67, 70)
+        background = QColor(128, 128, 128, 40)
+        for day in range(days):
+            top = day * row_height
+            painter.setPen(text_color)
+            label = (self.projection.start + timedelta(days=day)).strftime("%a %d")
+            painter.drawText(QRectF(0, top, self.LABEL_WIDTH - 4, row_height),
+                             Qt.AlignmentFlag.AlignRight | Qt.AlignmentFlag.AlignVCenter, label)
+            painter.setPen(Qt.PenStyle.NoPen)
+            painter.setBrush(background)
+            painter.drawRect(QRectF(self.LABEL_WIDTH, top + 2, width, row_height - 4))
+            # Days without an opinion are drawn faded: the schedule does not restrict them
+            painter.setBrush(unrestricted if day in self.projection.unrestricted else active)
+            for start, end in self.projection.day_runs(day):
+                painter.drawRect(QRectF(self.LABEL_WIDTH + width * start / 1440, top + 2,
+                                        width * (end - start) / 1440, row_height - 4))
 
 class WeeklyScheduleDialog(QDialog):
     """Dialog to edit weekly schedules"""
     
     DAYS_OF_WEEK = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
     
-    def __init__(self, parent=None, current_schedules=None):
+    # Override modes in the order of the mode selector
+    OVERRIDE_MODES = [(date_overrides.MODE_OFF, "Off all day"), (date_overrides.MODE_ON, "On all day"),
+                      (date_overrides.MODE_CUSTOM, "Custom periods")]
+    
+    def __init__(self, parent=None, current_schedules=None, current_date_overrides=None, history=None):
         super().__init__(parent)
         self.setWindowTitle("Weekly Schedule")
         self.setMinimumSize(600, 400)
         
         # Initialize schedules with defaults or current values
         self.schedules = current_schedules or self._create_default_schedules()
+        self.date_overrides = current_date_overrides if current_date_overrides is not None else {}
+        self.history = history  # ActivityHistory to suggest a schedule from, if any
         
         # Initialize UI
         self.init_ui()
         
         # Load current schedules
         self.load_schedules()
+        self.load_overrides()
+        
+        # Recompute the preview on every edit from now on
+        self._connect_preview()
+        self.update_preview()
         
     def _create_default_schedules(self):
         """Create default schedules for each day"""
-        schedules = {}
-        
-        # Weekdays (Monday through Friday) should be enabled by default
-        weekdays = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday"]
-        
-        # For each day, create a default schedule
-        for day in self.DAYS_OF_WEEK:
-            # Enable weekdays by default, leave weekends disabled
-            is_weekday = day in weekdays
-            schedules[day] = {
-                "enabled": is_weekday,
-                "use_global": True,
-                "periods": [
-                    {
-                        "enabled": True,
-                        "start_hour": 9,
-                        "start_minute": 0,
-                        "end_hour": 17,
-                        "end_minute": 0
-                    }
-                ]
-            }
-            
-        # Add global schedule - enabled by default
-        schedules["global"] = {
-            "enabled": True,  # Global schedule is enabled by default
-            "periods": [
-                {
-                    "enabled": True,
-                    "start_hour": 9,
-                    "start_minute": 0,
-                    "end_hour": 17,
-                    "end_minute": 0
-                }
-            ]
-        }
-        
-        return schedules
+        return default_weekly_schedules()
         
     def init_ui(self):
         """Initialize the dialog UI"""
@@ -86,11 +108,37 @@ class WeeklyScheduleDialog(QDialog):
             self.tab_widget.addTab(day_tab, day)
             self.day_tabs[day] = day_tab
             
+        # Holidays and one-off days
+        dates_tab = QWidget()
+        self._setup_dates_tab(dates_tab)
+        self.tab_widget.addTab(dates_tab, "Dates")
+            
         layout.addWidget(self.tab_widget)
         
+        # Preview of what the edited schedule does over the coming days and the next year
+        preview_group = QGroupBox("Preview")
+        preview_layout = QVBoxLayout(preview_group)
+        self.preview_strip = SchedulePreviewStrip()
+        preview_layout.addWidget(self.preview_strip)
+        self.preview_label = QLabel()
+        self.preview_label.setWordWrap(True)
+        preview_layout.addWidget(self.preview_label)
+        self.problems_label = QLabel()
+        self.problems_label.setWordWrap(True)
+        self.problems_label.setStyleSheet("color: #b35c00;")
+        preview_layout.addWidget(self.problems_label)
+        layout.addWidget(preview_group)
+        
         # Buttons at the bottom
         button_layout = QHBoxLayout()
         
+        suggest_button = QPushButton("Suggest from History...")
+        suggest_button.setToolTip(f"Infer a schedule from when Stay Awake was engaged over the last {HISTORY_DAYS} days")
+        suggest_button.setEnabled(self.history is not None)
+        suggest_button.clicked.connect(self.suggest_schedule)
+        button_layout.addWidget(suggest_button)
+        button_layout.addStretch()
+        
         apply_button = QPushButton("Apply")
         apply_button.clicked.connect(self.apply_schedules)
         button_layout.addWidget(apply_button)
@@ -207,11 +255,17 @@ class WeeklyScheduleDialog(QDialog):
         end_time.setDisplayFormat("HH:mm")
         period_layout.addWidget(end_time)
         
+        # A custom schedule without any period keeps Stay Awake inactive all day
+        day_off = QCheckBox("Inactive all day")
+        day_off.toggled.connect(lambda checked, d=day: self._on_day_off_changed(checked, d))
+        
         # Store period widgets
         setattr(self, f"{day.lower()}_start_time", start_time)
         setattr(self, f"{day.lower()}_end_time", end_time)
+        setattr(self, f"{day.lower()}_off", day_off)
         
         custom_layout.addLayout(period_layout)
+        custom_layout.addWidget(day_off)
         layout.addWidget(custom_group)
         
         # Custom schedule group is the last widget in the layout
@@ -219,6 +273,144 @@ class WeeklyScheduleDialog(QDialog):
         
         layout.addStretch()
         
+    def _setup_dates_tab(self, tab):
+        """Setup the tab listing date overrides (holidays, leave and one-off days)"""
+        layout = QVBoxLayout(tab)
+        
+        description = QLabel(
+            "A date listed here replaces the weekly schedule on that day only, e.g. for holidays."
+        )
+        description.setWordWrap(True)
+        layout.addWidget(description)
+        
+        self.override_list = QListWidget()
+        self.override_list.currentItemChanged.connect(self._on_override_selected)
+        layout.addWidget(self.override_list)
+        
+        # Editor for the selected or a new date
+        editor_layout = QHBoxLayout()
+        self.override_date = QDateEdit(QDate.currentDate())
+        self.override_date.setCalendarPopup(True)
+        self.override_date.setDisplayFormat("yyyy-MM-dd")
+        editor_layout.addWidget(self.override_date)
+        
+        self.override_mode = QComboBox()
+        for _, label in self.OVERRIDE_MODES:
+            self.override_mode.addItem(label)
+        self.override_mode.currentIndexChanged.connect(
+            lambda index: self.override_periods.setEnabled(self.OVERRIDE_MODES[index][0] == date_overrides.MODE_CUSTOM))
+        editor_layout.addWidget(self.override_mode)
+        
+        self.override_periods = QLineEdit()
+        self.override_periods.setPlaceholderText("09:00-12:00;13:00-17:00")
+        self.override_periods.setEnabled(False)
+        editor_layout.addWidget(self.override_periods)
+        
+        self.override_note = QLineEdit()
+        self.override_note.setPlaceholderText("Note")
+        editor_layout.addWidget(self.override_note)
+        layout.addLayout(editor_layout)
+        
+        buttons_layout = QHBoxLayout()
+        set_button = QPushButton("Set Date")
+        set_button.clicked.connect(self.set_override)
+        buttons_layout.addWidget(set_button)
+        
+        remove_button = QPushButton("Remove")
+        remove_button.clicked.connect(self.remove_override)
+        buttons_layout.addWidget(remove_button)
+        
+        buttons_layout.addStretch()
+        
+        import_button = QPushButton("Import CSV...")
+        import_button.clicked.connect(self.import_overrides)
+        buttons_layout.addWidget(import_button)
+        
+        export_button = QPushButton("Export CSV...")
+        export_button.clicked.connect(self.export_overrides)
+        buttons_layout.addWidget(export_button)
+        layout.addLayout(buttons_layout)
+        
+    def load_overrides(self):
+        """Fill the date override list, in date order"""
+        self.override_list.blockSignals(True)
+        self.override_list.clear()
+        for key in sorted(self.date_overrides):
+            label = datetime.strptime(key, "%Y-%m-%d").strftime("%a %Y-%m-%d")
+            item = QListWidgetItem(f"{label}   {date_overrides.describe(self.date_overrides[key])}")
+            item.setData(Qt.ItemDataRole.UserRole, key)
+            self.override_list.addItem(item)
+        self.override_list.blockSignals(False)
+        
+    def _on_override_selected(self, item, previous=None):
+        """Show the selected override in the editor"""
+        if item is None:
+            return
+        key = item.data(Qt.ItemDataRole.UserRole)
+        override = self.date_overrides[key]
+        self.override_date.setDate(QDate.fromString(key, "yyyy-MM-dd"))
+        modes = [mode for mode, _ in self.OVERRIDE_MODES]
+        self.override_mode.setCurrentIndex(modes.index(override.get("mode", date_overrides.MODE_CUSTOM)))
+        self.override_periods.setText(date_overrides.format_periods(override.get("periods", [])))
+        self.override_note.setText(override.get("note", ""))
+        
+    def set_override(self):
+        """Add or replace the override of the date in the editor"""
+        mode = self.OVERRIDE_MODES[self.override_mode.currentIndex()][0]
+        override = {"mode": mode}
+        if mode == date_overrides.MODE_CUSTOM:
+            try:
+                override["periods"] = date_overrides.parse_periods(self.override_periods.text())
+            except ValueError as e:
+                QMessageBox.warning(self, "Invalid Periods", str(e))
+                return
+            if not override["periods"]:
+                QMessageBox.warning(self, "Invalid Periods", "Enter at least one period, e.g. 09:00-13:00")
+                return
+        note = self.override_note.text().strip()
+        if note:
+            override["note"] = note
+        self.date_overrides[self.override_date.date().toString("yyyy-MM-dd")] = override
+        self.load_overrides()
+        self.update_preview()
+        
+    def remove_override(self):
+        item = self.override_list.currentItem()
+        if item is None:
+            return
+        self.date_overrides.pop(item.data(Qt.ItemDataRole.UserRole), None)
+        self.load_overrides()
+        self.update_preview()
+        
+    def import_overrides(self):
+        """Merge date overrides from a CSV file (date,mode,periods,note)"""
+        path, _ = QFileDialog.getOpenFileName(self, "Import Dates", "", "CSV files (*.csv);;All files (*)")
+        if not path:
+            return
+        try:
+            with open(path, "r", encoding="utf-8-sig", newline="") as f:
+                imported, errors = date_overrides.import_csv(f)
+        except (OSError, UnicodeDecodeError) as e:
+            QMessageBox.warning(self, "Import Failed", f"Could not read {path}: {str(e)}")
+            return
+        self.date_overrides.update(imported)
+        self.load_overrides()
+        self.update_preview()
+        message = f"Imported {len(imported)} dates."
+        if errors:
+            message += f"\n\n{len(errors)} lines were skipped:\n" + "\n".join(errors[:10])
+        QMessageBox.information(self, "Import Dates", message)
+        
+    def export_overrides(self):
+        path, _ = QFileDialog.getSaveFileName(self, "Export Dates", "dates.csv", "CSV files (*.csv)")
+        if not path:
+            return
+        try:
+            with open(path, "w", encoding="utf-8", newline="") as f:
+                date_overrides.export_csv(self.date_overrides, f)
+        except OSError as e:
+            QMessageBox.warning(self, "Export Failed", f"Could not write {path}: {str(e)}")
+        
     def _on_global_enabled_changed(self, state):
         """Handle global schedule enable/disable"""
         is_enabled = bool(state)
@@ -253,6 +445,11 @@ class WeeklyScheduleDialog(QDialog):
         # Update custom group based on both day enabled and use global
         custom_group.setEnabled(is_enabled and not use_global.isChecked())
     
+    def _on_day_off_changed(self, checked, day):
+        """Handle the inactive all day toggle of a custom day schedule"""
+        getattr(self, f"{day.lower()}_start_time").setEnabled(not checked)
+        getattr(self, f"{day.lower()}_end_time").setEnabled(not checked)
+    
     def _on_use_global_changed(self, state, day):
         """Handle use global schedule toggle"""
         use_global = bool(state)
@@ -320,10 +517,12 @@ class WeeklyScheduleDialog(QDialog):
             use_global = getattr(self, f"{day.lower()}_use_global")
             start_time = getattr(self, f"{day.lower()}_start_time")
             end_time = getattr(self, f"{day.lower()}_end_time")
+            day_off = getattr(self, f"{day.lower()}_off")
             
             # Set values
             day_enabled.setChecked(day_schedule.get("enabled", False))
             use_global.setChecked(day_schedule.get("use_global", True))
+            day_off.setChecked(not any(period.get("enabled") for period in day_schedule.get("periods", [])))
             
             # Set time if periods exist
             if day_schedule.get("periods"):
@@ -345,16 +544,94 @@ class WeeklyScheduleDialog(QDialog):
                 else:
                     self.tab_widget.setTabText(tab_index, day)
     
+    def _connect_preview(self):
+        """Update the preview whenever a checkbox or time changes"""
+        self.global_enabled.stateChanged.connect(self.update_preview)
+        for period_widgets in self.global_period_widgets:
+            period_widgets["start_time"].timeChanged.connect(self.update_preview)
+            period_widgets["end_time"].timeChanged.connect(self.update_preview)
+        for day in self.DAYS_OF_WEEK:
+            getattr(self, f"{day.lower()}_enabled").stateChanged.connect(self.update_preview)
+            getattr(self, f"{day.lower()}_use_global").stateChanged.connect(self.update_preview)
+            getattr(self, f"{day.lower()}_start_time").timeChanged.connect(self.update_preview)
+            getattr(self, f"{day.lower()}_end_time").timeChanged.connect(self.update_preview)
+            getattr(self, f"{day.lower()}_off").toggled.connect(self.update_preview)
+            
+    def update_preview(self, *args):
+        """Project the schedule as currently edited and show its effect and problems"""
+        schedules = copy.deepcopy(self.schedules)
+        self._read_ui(schedules)
+        projection = ScheduleProjection(schedules, start=date.today(), days=365,
+                                        date_overrides=self.date_overrides)
+        self.preview_strip.set_projection(projection)
+        
+        hours = projection.active_hours()
+        text = f"Active {hours / projection.days * 7:.1f} h a week, {hours:.0f} h over the next year."
+        upcoming = projection.transitions(2, after=datetime.now())
+        if upcoming:
+            changes = ", ".join(f"{'on' if active else 'off'} {moment.strftime('%a %H:%M')}"
+                                for moment, active in upcoming)
+            text += f" Next: {changes}."
+        if len(projection.unrestricted) == projection.days:
+            text += " No day is restricted by the schedule."
+        upcoming_dates = date_overrides.upcoming(self.date_overrides)
+        if upcoming_dates:
+            day, override = upcoming_dates[0]
+            text += f" Next date: {day.strftime('%a %d %b')}, {date_overrides.describe(override)}."
+        self.preview_label.setText(text)
+        problems = find_conflicts(schedules, self.date_overrides)
+        self.problems_label.setText("\n".join(problems))
+        self.problems_label.setVisible(bool(problems))
+        
+    def suggest_schedule(self):
+        """Suggest a schedule from the recorded history and apply it in one click"""
+        current = copy.deepcopy(self.schedules)
+        self._read_ui(current)
+        suggestion = suggest_from_history(self.history, current=current)
+        if suggestion.is_empty():
+            QMessageBox.information(self, "Suggest Schedule",
+                                    f"Not enough history yet: a weekday needs {MIN_DAYS} recorded days "
+                                    f"within the last {HISTORY_DAYS} days.")
+            return
+        
+        # This dialog shows one period per day, so days with breaks are joined into one
+        schedules, merged = merge_periods(suggestion)
+        lines = suggestion.describe()
+        if merged:
+            lines += ["", "This dialog edits one period per day, so these are joined:"] + merged
+        
+        box = QMessageBox(self)
+        box.setWindowTitle("Suggest Schedule")
+        box.setText(f"Suggested from the last {HISTORY_DAYS} days of activity:")
+        box.setInformativeText("\n".join(lines))
+        apply_button = box.addButton("Apply and Save", QMessageBox.ButtonRole.AcceptRole)
+        edit_button = box.addButton("Edit First", QMessageBox.ButtonRole.ActionRole)
+        box.addButton(QMessageBox.StandardButton.Cancel)
+        box.exec()
+        
+        if box.clickedButton() not in (apply_button, edit_button):
+            return
+        self.schedules = schedules
+        self.load_schedules()
+        self.update_preview()
+        if box.clickedButton() == apply_button:
+            self.apply_schedules()
+        
     def apply_schedules(self):
         """Save the current UI state to the schedules dict"""
+        self._read_ui(self.schedules)
+        self.accept()
+        
+    def _read_ui(self, schedules):
+        """Write the values of the widgets into a schedules dict"""
         # Save global schedule
-        self.schedules["global"]["enabled"] = self.global_enabled.isChecked()
+        schedules["global"]["enabled"] = self.global_enabled.isChecked()
         
         # Save global periods
         global_start_time = self.global_period_widgets[0]["start_time"].time()
         global_end_time = self.global_period_widgets[0]["end_time"].time()
         
-        self.schedules["global"]["periods"][0].update({
+        schedules["global"]["periods"][0].update({
             "start_hour": global_start_time.hour(),
             "start_minute": global_start_time.minute(),
             "end_hour": global_end_time.hour(),
@@ -368,21 +645,31 @@ class WeeklyScheduleDialog(QDialog):
             use_global = getattr(self, f"{day.lower()}_use_global")
             start_time = getattr(self, f"{day.lower()}_start_time")
             end_time = getattr(self, f"{day.lower()}_end_time")
+            day_off = getattr(self, f"{day.lower()}_off")
             
             # Update schedule
-            self.schedules[day]["enabled"] = day_enabled.isChecked()
-            self.schedules[day]["use_global"] = use_global.isChecked()
+            schedules[day]["enabled"] = day_enabled.isChecked()
+            schedules[day]["use_global"] = use_global.isChecked()
             
-            # Update period
-            self.schedules[day]["periods"][0].update({
+            if day_off.isChecked():
+                schedules[day]["periods"] = []
+                continue
+            if not schedules[day]["periods"]:
+                schedules[day]["periods"].append({})
+            
+            # Update period; the one period shown is always in effect
+            schedules[day]["periods"][0].update({
+                "enabled": True,
                 "start_hour": start_time.time().hour(),
                 "start_minute": start_time.time().minute(),
                 "end_hour": end_time.time().hour(),
                 "end_minute": end_time.time().minute()
             })
         
-        self.accept()
-        
     def get_schedules(self):
         """Return the current schedules"""
         return self.schedules
+        
+    def get_date_overrides(self):
+        """Return the current date overrides"""
+        return self.date_overrides